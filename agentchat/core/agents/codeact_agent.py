@@ -1,32 +1,45 @@
 import inspect
-from typing import List
+import zlib
+from typing import AsyncGenerator, List
 from typing import Any, Awaitable, Callable, Optional, Sequence, Type, TypeVar, Union, Dict
 from langgraph.types import Command
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
 from langchain_core.language_models import BaseChatModel
 from langchain_core.tools import StructuredTool, BaseTool
 from langchain_core.tools import tool as create_tool
 from langgraph.graph import END, START, MessagesState, StateGraph
+from loguru import logger
 
+from agentchat.core.callbacks.events import AgentEvent, emit_agent_event, preview, stream_agent_events
 from agentchat.core.models.manager import ModelManager
-from agentchat.services.sandbox import PyodideSandbox
+from agentchat.services.sandbox import PyodideSandbox, SandboxPoolConfig, create_sandbox
+from agentchat.settings import app_settings
 from agentchat.services.mcp.manager import MCPManager
 from agentchat.utils.convert import convert_mcp_config
 from agentchat.utils.extract import extract_and_combine_codeblocks
 
 # 定义评估函数类型别名
-# EvalFunction: 同步函数，接收代码字符串和本地变量字典，返回 (执行输出, 新增变量字典)
-EvalFunction = Callable[[str, dict[str, Any]], tuple[str, dict[str, Any]]]
-# EvalCoroutine: 异步函数版本，接收代码字符串和本地变量字典，返回 (执行输出, 新增变量字典)
-EvalCoroutine = Callable[[str, dict[str, Any]], Awaitable[tuple[str, dict[str, Any]]]]
+# EvalFunction: 同步函数，接收代码字符串和会话快照（None 表示新会话），返回 (执行输出, 新的会话快照)
+EvalFunction = Callable[[str, Optional[bytes]], tuple[str, Optional[bytes]]]
+# EvalCoroutine: 异步函数版本，接收代码字符串和会话快照，返回 (执行输出, 新的会话快照)
+EvalCoroutine = Callable[[str, Optional[bytes]], Awaitable[tuple[str, Optional[bytes]]]]
+
+# 压缩后会话快照的大小上限，超出后重置会话，避免状态随对话无限膨胀
+DEFAULT_MAX_SESSION_BYTES = 4 * 1024 * 1024
+
+SESSION_RESET_NOTE = (
+    "\n\n[Note: the sandbox session snapshot exceeded {limit} bytes and was reset. "
+    "Variables from previous code snippets are no longer available; recompute what you need.]"
+)
+
 
 class CodeActState(MessagesState):
     """CodeAct 智能体的状态定义。"""
 
     script: Optional[str]
     """即将被执行的 Python 代码脚本。"""
-    context: dict[str, Any]
-    """包含执行上下文的字典，存储可用的工具函数和执行过程中定义的变量。"""
+    session: Optional[bytes]
+    """zlib 压缩后的沙箱会话快照（已定义的顶层变量、函数与导入），None 表示尚未建立会话。"""
 
 
 StateSchema = TypeVar("StateSchema", bound=CodeActState)
@@ -64,6 +77,15 @@ Reminder: use Python code snippets to call tools"""
     return prompt
 
 
+def _tool_source(tool: StructuredTool) -> str:
+    """获取工具函数的源码，用于在沙箱中定义同名函数；无法获取源码时跳过。"""
+    try:
+        return inspect.getsource(tool.func)
+    except (OSError, TypeError):
+        logger.warning(f"Source of tool {tool.name} is unavailable, it will not be defined in the sandbox")
+        return ""
+
+
 class CodeActAgent:
     """CodeActAgent 类实现了 CodeAct (Code Action) 智能体逻辑。
     它采用 LangGraph 管理 '模型生成代码 -> 沙箱执行代码 -> 结果反馈模型' 的循环流程。
@@ -74,7 +96,9 @@ class CodeActAgent:
         tools,
         user_id,
         mcp_servers: Optional[List[Dict[str, Any]]] = None,
-        user_config_provider: Optional[Callable] = None
+        user_config_provider: Optional[Callable] = None,
+        sandbox_mode: Optional[str] = None,
+        max_session_bytes: int = DEFAULT_MAX_SESSION_BYTES
     ):
         """初始化智能体。
 
@@ -83,15 +107,18 @@ class CodeActAgent:
             user_id: 当前用户的唯一标识符。
             mcp_servers: MCP 服务器配置列表。
             user_config_provider: 用户配置提供函数，用于 MCP 工具鉴权。
+            sandbox_mode: 沙箱执行模式（subprocess / pool），默认取配置中的 sandbox.mode。
+            max_session_bytes: 压缩后会话快照的大小上限（字节），超出后重置会话。
         """
         self.tools = tools
         self.user_id = user_id
         self.mcp_servers = mcp_servers or []
         self.user_config_provider = user_config_provider
+        self.sandbox_mode = sandbox_mode or app_settings.sandbox.mode
+        self.max_session_bytes = max_session_bytes
 
-        # MCP 管理器和工具
+        # MCP 管理器；加载的 MCP 工具不保存在（可能被多个请求共享的）实例上
         self.mcp_manager: Optional[MCPManager] = None
-        self.mcp_tools: List[BaseTool] = []
 
         # 获取预配置的代码生成模型
         self.coder_model = ModelManager.get_conversation_model()
@@ -107,23 +134,33 @@ class CodeActAgent:
         if self.mcp_servers and not self.mcp_manager:
             self.mcp_manager = MCPManager(convert_mcp_config(self.mcp_servers))
 
-        if self.mcp_manager:
-            self.mcp_tools = await self.mcp_manager.get_mcp_tools()
-        else:
-            self.mcp_tools = []
-
-        return self.mcp_tools
+        return await self.mcp_manager.get_mcp_tools() if self.mcp_manager else []
 
     def setup_codeact_agent(self):
         """配置底层的沙箱环境和编译 LangGraph 流程。"""
-        # 初始化沙箱环境，并允许其进行网络请求
-        sandbox = PyodideSandbox(allow_net=True)
+        # 初始化有状态沙箱环境（变量通过会话快照在多次执行间保留），并允许其进行网络请求
+        sandbox_config = app_settings.sandbox
+        self.sandbox = create_sandbox(
+            self.sandbox_mode,
+            pool_config=SandboxPoolConfig(
+                size=sandbox_config.pool_size,
+                max_executions=sandbox_config.max_executions,
+                max_memory_mb=sandbox_config.max_memory_mb,
+            ),
+            stateful=True,
+            allow_net=True,
+        )
         # 创建基于 Pyodide 的评估函数
-        eval_fn = self.create_pyodide_eval_fn(sandbox)
+        eval_fn = self.create_pyodide_eval_fn(self.sandbox)
         # 构建并编译状态机图 (StateGraph)
         self.codeact_agent = self.create_codeact_agent(self.coder_model, self.tools, eval_fn)
 
 
+    async def warm_up(self):
+        """pool 模式下预先启动沙箱工作进程，避免首次执行承担 Pyodide 加载开销。"""
+        if hasattr(self.sandbox, "warm_up"):
+            await self.sandbox.warm_up()
+
     async def astream(self, messages: List[BaseMessage]):
         """异步流式输出智能体生成的响应和过程消息。
 
@@ -144,6 +181,29 @@ class CodeActAgent:
                 # 返回当前的状态更新
                 yield chunk
 
+    async def astream_events(self, messages: List[BaseMessage]) -> AsyncGenerator[AgentEvent, None]:
+        """结构化事件流：模型输出片段（token）与每次沙箱执行的代码和输出（sandbox_output），最后是 done。
+
+        参数:
+            messages: 初始对话历史消息。
+        """
+
+        async def run():
+            # 自动加载 MCP 工具
+            await self.setup_mcp_tools()
+
+            async for message, metadata in self.codeact_agent.astream(
+                    {"messages": messages},
+                    stream_mode="messages",
+            ):
+                # 只转发模型输出；沙箱输出由 sandbox 节点以 sandbox_output 事件发出
+                if metadata.get("langgraph_node") == "call_model" and isinstance(message, (AIMessageChunk, AIMessage)):
+                    if message.content:
+                        emit_agent_event("token", content=message.content)
+
+        async for event in stream_agent_events(run):
+            yield event
+
     async def ainvoke(self, messages: List[BaseMessage]) -> str:
         """一次性执行完整的 CodeAct 流程并返回最终回复。
 
@@ -172,49 +232,21 @@ class CodeActAgent:
         return result if result else "代码执行完成，无输出内容。"
 
     def create_pyodide_eval_fn(self, sandbox: PyodideSandbox) -> EvalCoroutine:
-        """创建一个评估函数，用于在 PyodideSandbox 中安全地执行生成的 Python 代码。
+        """创建一个评估函数，用于在有状态的 PyodideSandbox 中安全地执行生成的 Python 代码。
         
-        该函数负责：
-        1. 注入现有的上下文变量和工具函数。
-        2. 将生成的代码块包装在 execute() 函数中运行，以捕获局部变量。
-        3. 提取执行结果中的标准输出 (stdout) 和新增变量。
+        代码直接在顶层执行，之前定义的变量通过会话快照（session bytes）恢复，
+        不再把上下文变量 repr 成源码拼接进脚本重复执行。
+        执行失败时保留原有会话，返回错误信息。
         """
 
         async def async_eval_fn(
-                code: str, _locals: dict[str, Any]
-        ) -> tuple[str, dict[str, Any]]:
-            # 构造包装代码，将模型生成的代码放入 try-except 块中运行
-            # 缩进处理：将传入的代码每一行都进行 8 空格缩进，以符合 Python 的缩进规范
-            wrapper_code = f"""
-def execute():
-    try:
-        # 运行 LLM 提供的代码
-{"\n".join(" " * 8 + line for line in code.strip().split("\n"))}
-        return locals()
-    except Exception as e:
-        return {{"error": str(e)}}
-
-execute()
-    """
-            # 初始化运行环境的内容
-            context_setup = ""
-            for key, value in _locals.items():
-                if callable(value):
-                    # 如果是工具函数，通过 inspect 获取其源代码以便在沙箱内定义
-                    src = inspect.getsource(value)
-                    context_setup += f"\n{src}"
-                else:
-                    # 如果是普通变量，使用 repr 进行序列化
-                    context_setup += f"\n{key} = {repr(value)}"
-
+                code: str, session_bytes: Optional[bytes]
+        ) -> tuple[str, Optional[bytes]]:
             try:
-                # 在沙箱中执行完整代码
-                response = await sandbox.execute(
-                    code=context_setup + "\n\n" + wrapper_code,
-                )
-                # 检查沙箱执行的 stderr (通常指示环境或沙箱层面的错误)
-                if response.stderr:
-                    return f"Error during execution: {response.stderr}", {}
+                response = await sandbox.execute(code=code, session_bytes=session_bytes)
+                # 检查沙箱执行的 stderr（Python 异常或沙箱层面的错误）
+                if response.status == "error" or response.stderr:
+                    return f"Error during execution: {response.stderr}", session_bytes
 
                 # 提取标准输出流的内容
                 output = (
@@ -222,25 +254,22 @@ execute()
                     if response.stdout
                     else "<Code ran, no output printed to stdout>"
                 )
-                result = response.result
-
-                # 检查执行结果中是否包含由 wrapper_code 捕获的运行错误
-                if isinstance(result, dict) and "error" in result:
-                    return f"Error during execution: {result['error']}", {}
-
-                # 对比执行前后的局部变量，提取出 LLM 新定义的变量（排除私有变量）
-                new_vars = {
-                    k: v
-                    for k, v in result.items()
-                    if k not in _locals and not k.startswith("_")
-                }
-                return output, new_vars
+                return output, response.session_bytes or session_bytes
 
             except Exception as e:
-                return f"Error during PyodideSandbox execution: {repr(e)}", {}
+                return f"Error during PyodideSandbox execution: {repr(e)}", session_bytes
 
         return async_eval_fn
 
+    def _pack_session(self, session_bytes: Optional[bytes]) -> tuple[Optional[bytes], str]:
+        """压缩会话快照；超过大小上限时丢弃并返回提示模型的说明。"""
+        if not session_bytes:
+            return None, ""
+        packed = zlib.compress(session_bytes)
+        if len(packed) > self.max_session_bytes:
+            logger.warning(f"CodeAct session snapshot too large ({len(packed)} bytes), resetting session")
+            return None, SESSION_RESET_NOTE.format(limit=self.max_session_bytes)
+        return packed, ""
 
     def create_codeact_agent(
         self,
@@ -268,14 +297,14 @@ execute()
         if prompt is None:
             prompt = create_default_prompt(tools)
 
-        # 准备沙箱上下文中可调用的工具函数
-        tools_context = {tool.name: tool.func for tool in tools}
+        # 工具函数源码只在会话首次执行时注入，之后随会话快照保留
+        tools_setup = "\n".join(_tool_source(tool) for tool in tools)
 
-        def call_model(state: StateSchema) -> Command:
+        async def call_model(state: StateSchema) -> Command:
             """调用语言模型来决定下一步操作：是编写代码还是直接回答。"""
             # 构建消息序列，包含系统角色提示词
             messages = [{"role": "system", "content": prompt}] + state["messages"]
-            response = model.invoke(messages)
+            response = await model.ainvoke(messages)
             # 从模型返回的内容中提取所有的 Python 代码块并合并为一个脚本
             code = extract_and_combine_codeblocks(response.content)
             if code:
@@ -285,36 +314,39 @@ execute()
                 # 如果没有代码块，模型可能已经给出了最终答案或正在对话，此时退出循环
                 return Command(update={"messages": [response], "script": None})
 
+        def prepare_script(state: StateSchema) -> tuple[str, Optional[bytes]]:
+            """解压会话快照；新会话时在脚本前注入工具函数定义。"""
+            packed = state.get("session")
+            if packed:
+                return state["script"], zlib.decompress(packed)
+            return f"{tools_setup}\n\n{state['script']}", None
+
+        def finish(output: str, session_bytes: Optional[bytes]) -> dict[str, Any]:
+            session, note = self._pack_session(session_bytes)
+            # 将代码输出结果包装成 user 消息，作为 LLM 的下一步观测输入
+            return {
+                "messages": [{"role": "user", "content": output + note}],
+                "session": session,
+            }
+
         # 判断评估函数是否为异步函数，从而定义相应的图节点逻辑
         if inspect.iscoroutinefunction(eval_fn):
 
             async def sandbox(state: StateSchema):
                 """异步沙箱节点：负责代码执行并将结果反馈回模型。"""
-                existing_context = state.get("context", {})
-                # 合并现有上下文和预定义工具函数
-                context = {**existing_context, **tools_context}
-                # 在沙箱中执行脚本
-                output, new_vars = await eval_fn(state["script"], context)
-                # 更新上下文，包含执行后新定义的变量
-                new_context = {**existing_context, **new_vars}
-                # 将代码输出结果包装成 user 消息，作为 LLM 的下一步观测输入
-                return {
-                    "messages": [{"role": "user", "content": output}],
-                    "context": new_context,
-                }
+                script, session_bytes = prepare_script(state)
+                # 在沙箱中执行脚本，得到输出与更新后的会话快照
+                output, session_bytes = await eval_fn(script, session_bytes)
+                emit_agent_event("sandbox_output", code=state["script"], output=preview(output))
+                return finish(output, session_bytes)
         else:
 
             def sandbox(state: StateSchema):
                 """同步沙箱节点逻辑。"""
-                existing_context = state.get("context", {})
-                context = {**existing_context, **tools_context}
-                # 在沙箱中执行脚本
-                output, new_vars = eval_fn(state["script"], context)
-                new_context = {**existing_context, **new_vars}
-                return {
-                    "messages": [{"role": "user", "content": output}],
-                    "context": new_context,
-                }
+                script, session_bytes = prepare_script(state)
+                output, session_bytes = eval_fn(script, session_bytes)
+                emit_agent_event("sandbox_output", code=state["script"], output=preview(output))
+                return finish(output, session_bytes)
 
         # 初始化图
         agent = StateGraph(state_schema)
@@ -1,4 +1,4 @@
-from typing import Any, Awaitable, Callable, Dict, List, Optional
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -7,8 +7,10 @@ from langchain.agents import create_agent
 from langgraph.config import get_stream_writer
 from langgraph.prebuilt.tool_node import ToolCallRequest
 from langchain.agents.middleware import wrap_tool_call
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.messages import AIMessageChunk, BaseMessage, HumanMessage, SystemMessage
 
+from agentchat.core.callbacks.events import AgentEvent, emit_agent_event, preview, stream_agent_events
+from agentchat.core.context import current_user_id
 from agentchat.core.models.manager import ModelManager
 from agentchat.prompts.chat import CALL_END_PROMPT
 from agentchat.services.mcp.manager import MCPManager
@@ -95,16 +97,25 @@ class MCPAgent:
                 }
             )
 
-            # 针对鉴权的MCP Server需要用户的单独配置，例如飞书、邮箱
+            # 针对鉴权的MCP Server需要用户的单独配置，例如飞书、邮箱（用户为发起本次运行的用户）
             personal_config = self.user_config
             if self.user_config_provider:
                 personal_config = await self.user_config_provider(
-                    self.user_id, self.mcp_config.mcp_server_id
+                    current_user_id(self.user_id), self.mcp_config.mcp_server_id
                 )
 
             request.tool_call["args"].update(personal_config or {})
 
+            tool_call = request.tool_call
+            emit_agent_event("tool_start", id=tool_call["id"], name=tool_call["name"], args=tool_call["args"])
             tool_result = await handler(request)
+            emit_agent_event(
+                "tool_end",
+                id=tool_call["id"],
+                name=tool_call["name"],
+                status="error" if getattr(tool_result, "status", None) == "error" else "success",
+                output=preview(getattr(tool_result, "content", tool_result)),
+            )
 
             await self.emit_event(
                 {
@@ -127,12 +138,24 @@ class MCPAgent:
         )
 
 
+    async def astream_events(self, messages: List[BaseMessage]) -> AsyncGenerator[AgentEvent, None]:
+        """结构化事件流：模型输出片段（token）与 MCP 工具执行进度（tool_start / tool_end），最后是 done。"""
+
+        async def run():
+            async for message, _ in self.react_agent.astream({"messages": messages}, stream_mode="messages"):
+                if isinstance(message, AIMessageChunk) and message.content:
+                    emit_agent_event("token", content=message.content)
+
+        async for event in stream_agent_events(run):
+            yield event
+
     async def ainvoke(self, messages: List[BaseMessage]) -> List[BaseMessage] | str:
         """非流式版本"""
         result = await self.react_agent.ainvoke({"messages": messages})
-        messages = []
+        new_messages = []
 
-        for message in result["messages"][:-1]:
+        # 跳过传入的历史消息，只返回本次执行产生的消息
+        for message in result["messages"][len(messages):-1]:
             if not isinstance(message, HumanMessage) and not isinstance(message, SystemMessage):
-                messages.append(message)
-        return messages
+                new_messages.append(message)
+        return new_messages
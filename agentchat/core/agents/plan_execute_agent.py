@@ -1,19 +1,38 @@
 import asyncio
 import json
-from typing import Any, Awaitable, Callable, Dict, List, Optional
+import re
+from uuid import uuid4
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
 
 from loguru import logger
-from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, SystemMessage, ToolMessage
 from langchain_core.tools import BaseTool
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
 from agentchat.core.agents.structured_response_agent import StructuredResponseAgent
+from agentchat.core.callbacks.events import AgentEvent, emit_agent_event, preview, stream_agent_events
+from agentchat.core.context import current_user_id
 from agentchat.core.models.manager import ModelManager
+from agentchat.core.tools.index import TOOL_RETRIEVAL_TOP_K, ToolSelection, latest_user_query, tool_selection_stats
+from agentchat.core.tools.registry import ToolRegistry
+from agentchat.core.tools.schema_render import render_tool_schema
 from agentchat.prompts.chat import FIX_JSON_PROMPT, PLAN_CALL_TOOL_PROMPT, SINGLE_PLAN_CALL_PROMPT
 from agentchat.schema.chat import PlanToolFlow
 from agentchat.services.mcp.manager import MCPManager
 from agentchat.utils.convert import convert_mcp_config
 
+DEFAULT_MAX_FAN_OUT = 4
+DEFAULT_PLAN_TIMEOUT = 120.0
+
+# 规划参数中出现这些措辞时，说明参数需要引用前序步骤的输出，不能直接调用工具
+STEP_OUTPUT_REFERENCE_PATTERN = re.compile(
+    r"\bstep[ _]?\d+\b|\bprocess \d+\b|\bresults? of\b|\boutput of\b|\bprevious\b|\{[^{}]+\}"
+    r"|步骤\s*[\d一二三四五六七八九十]+|第\s*[\d一二三四五六七八九十]+\s*步|上一步|前一步|前序|上述|之前"
+    r"|结果|输出|返回值|查询到的",
+    re.IGNORECASE,
+)
+
+
 class PlanExecuteAgent:
     """
     基于“规划-执行”范式的对话式代理：先生成计划，再按计划调用工具或函数。
@@ -22,6 +41,9 @@ class PlanExecuteAgent:
 
     主要特性：
         - 先规划后执行：减少盲目调用工具
+        - 计划按步骤依赖构成 DAG 执行：互不依赖的步骤与同一步骤内的工具调用并发执行
+        - 规划中已给出完整参数的步骤直接调用工具，省去一次工具调用模型的往返
+        - 工具较多时按用户问题检索相关工具，只把这些工具的 Schema 放进规划提示词并绑定到工具调用模型
         - 同时支持同步/异步函数工具
         - MCP 工具集成，运行时动态装载
         - 流式输出，便于前端实时展示
@@ -29,12 +51,16 @@ class PlanExecuteAgent:
         - 详细日志与错误兜底
 
     关键属性：
-        user_id: 用户标识，用于个性化配置
+        user_id: 用户标识，用于个性化配置；运行时以 current_user_id() 为准（共享实例为 None）
         tools: 预置的工具列表（BaseTool 子类或 LangChain 工具）
         mcp_servers: MCP 服务器配置，动态加载远端工具
-        mcp_manager/mcp_tools: MCP 管理器与运行时加载的工具
+        mcp_manager: MCP 管理器；每次运行加载的 MCP 工具只同步到 tool_registry，不保存在实例上
         conversation_model: 用于纯对话回复的模型
         tool_call_model: 用于发起工具调用的模型
+        max_fan_out: 计划执行时同时进行的模型调用/工具调用上限
+        plan_timeout: 单个计划执行的总时限（秒），超时未完成的步骤会被取消
+        direct_dispatch: 是否对参数完整、通过 args_schema 校验的步骤跳过模型直接调用工具
+        tool_top_k: 每次规划按用户问题检索的工具数上限，0 表示始终使用全部工具
 
     使用示例（伪代码）：
         ```python
@@ -57,43 +83,72 @@ class PlanExecuteAgent:
                  user_id: str,
                  tools: List[BaseTool],
                  mcp_servers: Optional[List[Dict[str, Any]]] = None,
-                 user_config_provider: Optional[Callable[[str, Optional[str]], Awaitable[Dict[str, Any]]]] = None):
+                 user_config_provider: Optional[Callable[[str, Optional[str]], Awaitable[Dict[str, Any]]]] = None,
+                 max_fan_out: int = DEFAULT_MAX_FAN_OUT,
+                 plan_timeout: Optional[float] = DEFAULT_PLAN_TIMEOUT,
+                 direct_dispatch: bool = True,
+                 tool_top_k: int = TOOL_RETRIEVAL_TOP_K):
         self.tools = tools
         self.user_id = user_id
         self.mcp_servers = mcp_servers or []
         self.user_config_provider = user_config_provider
+        self.max_fan_out = max(1, max_fan_out)
+        self.plan_timeout = plan_timeout
+        self.direct_dispatch = direct_dispatch
+        self.tool_top_k = max(0, tool_top_k)
         self.mcp_manager: Optional[MCPManager] = None
 
-        self.mcp_tools: List[BaseTool] = []
         self.conversation_model = ModelManager.get_conversation_model()
         self.tool_call_model = ModelManager.get_tool_invocation_model()
+        # 规划用的结构化输出代理只依赖输出格式，构建一次后复用
+        self.structured_response_agent = StructuredResponseAgent(response_format=PlanToolFlow)
+        # 本地工具与 MCP 工具的检索索引及绑定了工具的模型，工具集变化时重建
+        self.tool_registry = ToolRegistry()
+
+    async def setup_mcp_tools(self) -> List[BaseTool]:
+        """加载 MCP 工具：按需创建管理器并异步拉取远端工具列表，同步到工具注册表后返回。
 
-    async def setup_mcp_tools(self):
-        """加载 MCP 工具：按需创建管理器并异步拉取远端工具列表。"""
+        实例由多个请求共享，工具列表不保存在实例上；本次运行经 tool_registry 查找工具。
+        """
         if self.mcp_servers and not self.mcp_manager:
             self.mcp_manager = MCPManager(convert_mcp_config(self.mcp_servers))
 
-        if self.mcp_manager:
-            self.mcp_tools = await self.mcp_manager.get_mcp_tools()
-        else:
-            self.mcp_tools = []
+        mcp_tools = await self.mcp_manager.get_mcp_tools() if self.mcp_manager else []
+        self._sync_tool_registry(mcp_tools)
+        return mcp_tools
 
-        return self.mcp_tools
+    def _sync_tool_registry(self, mcp_tools: Optional[Sequence[BaseTool]] = None) -> ToolRegistry:
+        """按当前的工具调用模型、本地工具与 mcp_tools 同步注册表；同名工具以本地工具为准。
 
-    async def _plan_agent_actions(self, messages: List[BaseMessage]):
+        mcp_tools 为 None 时沿用注册表当前的工具集，注册表尚未同步过时视为没有 MCP 工具。
+        """
+        if mcp_tools is None:
+            if self.tool_registry.synced:
+                return self.tool_registry
+            mcp_tools = []
+        self.tool_registry.sync(self.tool_call_model, self.tools, mcp_tools)
+        return self.tool_registry
+
+    def _select_tools(self, messages: List[BaseMessage]) -> ToolSelection:
+        """按用户问题检索本次规划可用的工具（工具数不超过 tool_top_k 时为全部工具）。"""
+        selection = self._sync_tool_registry().select(latest_user_query(messages), self.tool_top_k)
+        tool_selection_stats.record(selection)
+        return selection
+
+    async def _plan_agent_actions(self, messages: List[BaseMessage], tools: Optional[List[BaseTool]] = None):
         """
         规划阶段：
-        1) 把可用工具的参数信息注入提示，便于模型挑选。
+        1) 把检索出的工具的参数信息注入提示，便于模型挑选。
         2) 调用 StructuredResponseAgent 生成结构化计划 JSON。
         3) 若返回的 JSON 畸形，尝试通过对话模型修复。
         """
-        structured_response_agent = StructuredResponseAgent(response_format=PlanToolFlow)
-
         call_messages: List[BaseMessage] = []
         call_messages.extend(messages)
 
-        # 将所有工具的参数模式拼接，供规划提示词参考
-        tools_info = "\n\n".join(self._format_tool_schema(tool) for tool in (self.tools + self.mcp_tools))
+        # 将工具的参数模式拼接，供规划提示词参考
+        if tools is None:
+            tools = self._sync_tool_registry().tools
+        tools_info = "\n\n".join(self._format_tool_schema(tool) for tool in tools)
         prompt_text = PLAN_CALL_TOOL_PROMPT.replace("{user_query}", messages[-1].content).replace(
             "{tools_info}", tools_info
         )
@@ -104,7 +159,7 @@ class PlanExecuteAgent:
             call_messages.insert(0, SystemMessage(content=prompt_text))
 
         # 规划阶段：生成结构化的计划 JSON
-        response = structured_response_agent.get_structured_response(call_messages)
+        response = await self.structured_response_agent.aget_structured_response(call_messages)
 
         # response may already be a dict/BaseModel per ToolStrategy
         if isinstance(response, BaseModel):
@@ -123,30 +178,104 @@ class PlanExecuteAgent:
                 except Exception as fix_err:
                     raise ValueError(fix_err)
 
-        self.agent_plans = content
         return content
 
-    async def _execute_agent_actions(self, agent_plans):
+    async def _execute_agent_actions(self, agent_plans, selection: Optional[ToolSelection] = None):
         """
-        执行阶段（按规划逐步推进）：
-        1) 为工具调用模型绑定所有工具（本地 + MCP）。
-        2) 遍历规划步骤，逐步把已执行结果作为上下文喂给模型。
-        3) 如果当前步骤产生 tool_calls，交给上层继续执行；否则给出占位反馈并进入下一步。
+        执行阶段（按步骤依赖构成的 DAG 调度）：
+        1) 为工具调用模型绑定规划时提供的工具；计划用到了其他工具时绑定全部工具（本地 + MCP）。
+        2) 每个步骤只等待其依赖的步骤完成，并以这些步骤的结果作为上下文调用模型；
+           互不依赖的步骤并发执行，同一步骤产生的多个 tool_calls 也并发执行。
+        3) 并发量受 max_fan_out 限制，整个计划受 plan_timeout 限制，超时未完成的步骤被取消。
+        4) 遇到 call_user 步骤时，其后的步骤不再执行，需要先向用户补充信息。
         """
-        # 兼容不同格式的计划：可能包含 root，或直接是步骤字典。
+        # 兼容不同格式的计划：可能包含 root，或直接是步骤字典；
+        # dependencies 在两种格式中都与步骤并列，不是计划步骤。
         if isinstance(agent_plans, BaseModel):
             plans = agent_plans.model_dump()
         else:
             plans = agent_plans
 
-        plans = plans.get("root", plans) if isinstance(plans, dict) else plans
+        dependencies = None
+        if isinstance(plans, dict):
+            plans = dict(plans)
+            dependencies = plans.pop("dependencies", None)
+            plans = plans.get("root", plans)
+        if not isinstance(dependencies, dict):
+            dependencies = None
         if not isinstance(plans, dict):
             logger.error(f"Invalid plans format: {plans}")
             return []
 
-        tool_call_model = self.tool_call_model.bind_tools(self.tools + self.mcp_tools)
+        steps, call_user_message = self._normalize_plan_steps(plans)
+        step_dependencies = self._resolve_step_dependencies(list(steps), dependencies or {})
+
+        tool_call_model = self._sync_tool_registry().bound_model(self._execution_tools(steps, selection))
+        semaphore = asyncio.Semaphore(self.max_fan_out)
+        step_tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_step(step: str) -> List[BaseMessage]:
+            if step_dependencies[step]:
+                await asyncio.gather(*(step_tasks[dependency] for dependency in step_dependencies[step]))
+            # 上下文按计划顺序拼接依赖步骤的结果，保证 tool_calls 与 ToolMessage 成对出现
+            context: List[BaseMessage] = []
+            for dependency in step_dependencies[step]:
+                context.extend(step_tasks[dependency].result())
+            return await self._execute_plan_step(
+                tool_call_model, steps[step], context, semaphore, step_dependencies[step]
+            )
+
+        try:
+            for step in steps:
+                step_tasks[step] = asyncio.create_task(run_step(step))
+
+            if step_tasks:
+                _, pending = await asyncio.wait(step_tasks.values(), timeout=self.plan_timeout)
+                if pending:
+                    logger.warning(f"Plan execution exceeded {self.plan_timeout}s, {len(pending)} step(s) cancelled")
+        finally:
+            # 超时或外层运行被取消（如客户端断开）时，取消尚未完成的步骤，不再继续调用模型与工具
+            unfinished = [task for task in step_tasks.values() if not task.done()]
+            for task in unfinished:
+                task.cancel()
+            if unfinished:
+                await asyncio.gather(*unfinished, return_exceptions=True)
 
         tool_results: List[BaseMessage] = []
+        for step, task in step_tasks.items():
+            if task.cancelled():
+                tool_results.append(AIMessage(content=f"{step} was not finished within the time limit"))
+            elif task.exception() is not None:
+                # 依赖步骤失败时，后续步骤 gather 会抛出同一异常，这里统一记录
+                logger.error(f"Plan step {step} failed: {task.exception()}")
+                tool_results.append(AIMessage(content=f"{step} failed: {task.exception()}"))
+            else:
+                tool_results.extend(task.result())
+
+        if call_user_message is not None:
+            tool_results.append(call_user_message)
+        return tool_results
+
+    def _execution_tools(
+        self, steps: Dict[str, List[Dict[str, Any]]], selection: Optional[ToolSelection]
+    ) -> Optional[List[BaseTool]]:
+        """执行阶段绑定的工具：计划只用到规划时提供的工具时沿用检索结果，否则返回 None（全部工具）。"""
+        if selection is None or not selection.filtered:
+            return None
+        planned = {planned.get("tool_name") for plan_list in steps.values() for planned in plan_list}
+        unknown = planned - set(selection.names)
+        if unknown:
+            logger.info(
+                f"Plan uses tools outside the retrieved set ({', '.join(sorted(map(str, unknown)))}), binding all tools"
+            )
+            tool_selection_stats.expansions += 1
+            return None
+        return selection.tools
+
+    @staticmethod
+    def _normalize_plan_steps(plans: Dict[str, Any]) -> Tuple[Dict[str, List[Dict[str, Any]]], Optional[AIMessage]]:
+        """把每个步骤统一成调用列表，并在第一个 call_user 步骤处截断计划。"""
+        steps: Dict[str, List[Dict[str, Any]]] = {}
         for step, plan in plans.items():
             # plan 可能是列表或单个 dict，统一成列表
             if isinstance(plan, dict):
@@ -155,80 +284,192 @@ class PlanExecuteAgent:
                 plan_list = plan or []
 
             if plan_list and plan_list[0].get("tool_name") == "call_user":
-                tool_results.append(AIMessage(content=str(plan_list)))
-                break
+                return steps, AIMessage(content=str(plan_list))
+            steps[step] = plan_list
+        return steps, None
 
-            # 针对当前步骤构造一次性的调用提示
-            call_tool_messages = []
-            system_message = HumanMessage(content=SINGLE_PLAN_CALL_PROMPT.format(plan_actions=str(plan_list)))
-            call_tool_messages.append(system_message)
-            call_tool_messages.extend(tool_results)
+    @staticmethod
+    def _resolve_step_dependencies(steps: List[str], dependencies: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """确定每个步骤需要等待的前置步骤（含间接依赖，按计划顺序排列）。
 
-            response = await tool_call_model.ainvoke(call_tool_messages)
-            if response.tool_calls:
-                # 直接执行工具，并把模型回复和工具结果都纳入上下文
-                tool_messages = await self._execute_tool(response)
-                tool_results.append(response)
-                tool_results.extend(tool_messages)
-                continue
+        只允许依赖计划中排在前面的步骤，保证调度图无环；规划结果中未给出依赖信息的步骤
+        保守地视为依赖之前的全部步骤，与串行执行的语义一致。
+        """
+        resolved: Dict[str, List[str]] = {}
+        for index, step in enumerate(steps):
+            previous = steps[:index]
+            if step in dependencies:
+                direct = {dependency for dependency in dependencies[step] or [] if dependency in previous}
             else:
-                # 没有可用工具时给出占位回复，继续后续步骤
-                ai_message = AIMessage(content="No available tools found")
-                tool_messages = await self._execute_tool(ai_message)
-                tool_results.append(ai_message)
-                tool_results.extend(tool_messages)
+                direct = set(previous)
+            ancestors = set(direct)
+            for dependency in direct:
+                ancestors.update(resolved[dependency])
+            resolved[step] = [candidate for candidate in previous if candidate in ancestors]
+        return resolved
+
+    async def _execute_plan_step(
+        self,
+        tool_call_model,
+        plan_list: List[Dict[str, Any]],
+        context: List[BaseMessage],
+        semaphore: asyncio.Semaphore,
+        dependencies: Optional[List[str]] = None,
+    ) -> List[BaseMessage]:
+        """执行计划中的单个步骤：以依赖步骤的结果为上下文让模型生成工具调用并执行。
+
+        若规划已给出可直接使用的参数（见 _build_direct_tool_calls），则跳过模型，
+        用合成的 AIMessage 承载工具调用，保持与模型生成时相同的消息结构。
+        """
+        direct_tool_calls = (
+            self._build_direct_tool_calls(plan_list, dependencies or []) if self.direct_dispatch else None
+        )
+        if direct_tool_calls:
+            logger.info(f"Direct dispatch: {', '.join(tool_call['name'] for tool_call in direct_tool_calls)}")
+            response = AIMessage(content="", tool_calls=direct_tool_calls)
+            tool_messages = await self._execute_tool(response, semaphore)
+            return [response, *tool_messages]
+
+        # 针对当前步骤构造一次性的调用提示
+        call_tool_messages = []
+        system_message = HumanMessage(content=SINGLE_PLAN_CALL_PROMPT.format(plan_actions=str(plan_list)))
+        call_tool_messages.append(system_message)
+        call_tool_messages.extend(context)
+
+        async with semaphore:
+            response = await tool_call_model.ainvoke(call_tool_messages)
 
-        return tool_results
+        if not response.tool_calls:
+            # 没有可用工具时给出占位回复，继续后续步骤
+            response = AIMessage(content="No available tools found")
 
-    async def _execute_tool(self, message: AIMessage):
-        """具体工具执行子流程：遍历 tool_calls，按名称找到对应工具并执行。"""
-        tool_calls = message.tool_calls
-        tool_messages: List[BaseMessage] = []
+        # 直接执行工具，并把模型回复和工具结果都纳入上下文
+        tool_messages = await self._execute_tool(response, semaphore)
+        return [response, *tool_messages]
 
-        for tool_call in tool_calls:
-            is_mcp_tool, use_tool = self._find_tool_use(tool_call["name"])
-            tool_name = tool_call["name"]
-            tool_args = tool_call["args"]
-            tool_call_id = tool_call["id"]
+    def _build_direct_tool_calls(
+        self, plan_list: List[Dict[str, Any]], dependencies: List[str]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """把步骤中的规划调用转换为可直接执行的 tool_calls，任一调用不满足条件时返回 None。
 
+        直接调用的条件：步骤不依赖其他步骤（dependencies 为解析后的前置步骤）；工具存在；
+        tool_args 为字典且不含引用前序步骤输出的措辞；参数能通过工具 args_schema 的校验。
+        否则整个步骤回退到模型生成调用。调用使用校验后的参数（已做类型转换并补齐默认值）。
+        """
+        if dependencies:
+            return None
+        tool_calls: List[Dict[str, Any]] = []
+        for planned in plan_list:
+            tool_name = planned.get("tool_name")
+            tool_args = planned.get("tool_args")
+            _, use_tool = self._find_tool_use(tool_name)
+            if use_tool is None or not isinstance(tool_args, dict):
+                return None
+            if self._references_step_output(tool_args):
+                return None
+            validated_args = self._validate_tool_args(use_tool, tool_args)
+            if validated_args is None:
+                return None
+            tool_calls.append({"name": tool_name, "args": validated_args, "id": f"call_{uuid4().hex[:24]}"})
+        return tool_calls or None
+
+    @classmethod
+    def _references_step_output(cls, value: Any) -> bool:
+        """递归检查参数值中是否有引用前序步骤输出的措辞或占位符。"""
+        if isinstance(value, str):
+            return STEP_OUTPUT_REFERENCE_PATTERN.search(value) is not None
+        if isinstance(value, dict):
+            return any(cls._references_step_output(item) for item in value.values())
+        if isinstance(value, (list, tuple)):
+            return any(cls._references_step_output(item) for item in value)
+        return False
+
+    @staticmethod
+    def _validate_tool_args(tool: BaseTool, tool_args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """按工具的 args_schema 校验参数，返回可直接用于调用的参数，校验不通过时返回 None。
+
+        Pydantic 模型返回校验后的 model_dump()（如 "3" 转为 int，并补齐默认值）；
+        JSON Schema（MCP 工具）只检查必填与未知字段，参数原样返回，由 MCP 服务端转换。
+        """
+        schema = getattr(tool, "args_schema", None)
+        if isinstance(schema, type) and issubclass(schema, BaseModel):
             try:
-                if use_tool is None:
-                    raise ValueError(f"Tool {tool_name} not found")
-
-                # 优先使用工具的异步协程接口（MCP 工具多为异步）
-                if hasattr(use_tool, "coroutine") and use_tool.coroutine is not None:
-                    if is_mcp_tool and self.user_config_provider:
-                        # MCP 工具可按用户注入个性化参数
-                        personal_config = await self.user_config_provider(
-                            self.user_id, self._get_mcp_id_by_tool(tool_name)
-                        )
-                        tool_args.update(personal_config or {})
-
-                    tool_result, _ = await use_tool.coroutine(**tool_args)
-                else:
-                    # 普通函数工具用线程池避免阻塞事件循环
-                    tool_result = await asyncio.to_thread(use_tool.func, **tool_args)
-
-                tool_messages.append(
-                    ToolMessage(content=tool_result, name=tool_name, tool_call_id=tool_call_id))
-                logger.info(f"Plugin Tool {tool_name}, Args: {tool_args}, Result: {tool_result}")
+                return schema.model_validate(tool_args).model_dump()
+            except ValidationError:
+                return None
+        if isinstance(schema, dict):
+            properties = schema.get("properties") or {}
+            if any(name not in tool_args for name in schema.get("required") or []):
+                return None
+            if properties and any(name not in properties for name in tool_args):
+                return None
+            return dict(tool_args)
+        return None
 
-            except Exception as err:
-                logger.error(f"Plugin Tool {tool_name} Error: {str(err)}")
-                tool_messages.append(
-                    ToolMessage(content=str(err), name=tool_name, tool_call_id=tool_call_id))
+    async def _execute_tool(self, message: AIMessage, semaphore: Optional[asyncio.Semaphore] = None):
+        """具体工具执行子流程：并发执行 tool_calls，结果顺序与 tool_calls 一致。"""
+        semaphore = semaphore or asyncio.Semaphore(self.max_fan_out)
 
-        return tool_messages
+        async def run_tool_call(tool_call) -> BaseMessage:
+            async with semaphore:
+                return await self._execute_single_tool(tool_call)
 
-    async def astream(self, messages: List[BaseMessage]):
-        """流式调用：先装载 MCP 工具 -> 规划 -> 执行 -> 对话流式输出。"""
+        return list(await asyncio.gather(*(run_tool_call(tool_call) for tool_call in message.tool_calls)))
+
+    async def _execute_single_tool(self, tool_call) -> BaseMessage:
+        """按名称找到对应工具并执行，异常转换为 ToolMessage 返回给模型。"""
+        is_mcp_tool, use_tool = self._find_tool_use(tool_call["name"])
+        tool_name = tool_call["name"]
+        tool_args = tool_call["args"]
+        tool_call_id = tool_call["id"]
+
+        try:
+            if use_tool is None:
+                raise ValueError(f"Tool {tool_name} not found")
+
+            emit_agent_event("tool_start", id=tool_call_id, name=tool_name, args=tool_args)
+            # 优先使用工具的异步协程接口（MCP 工具多为异步）
+            if hasattr(use_tool, "coroutine") and use_tool.coroutine is not None:
+                if is_mcp_tool and self.user_config_provider:
+                    # MCP 工具可按用户注入个性化参数（用户为发起本次运行的用户）
+                    personal_config = await self.user_config_provider(
+                        current_user_id(self.user_id), self._get_mcp_id_by_tool(tool_name)
+                    )
+                    tool_args.update(personal_config or {})
+
+                tool_result, _ = await use_tool.coroutine(**tool_args)
+            else:
+                # 普通函数工具用线程池避免阻塞事件循环
+                tool_result = await asyncio.to_thread(use_tool.func, **tool_args)
+
+            logger.info(f"Plugin Tool {tool_name}, Args: {tool_args}, Result: {tool_result}")
+            emit_agent_event(
+                "tool_end", id=tool_call_id, name=tool_name, status="success", output=preview(tool_result)
+            )
+            return ToolMessage(content=tool_result, name=tool_name, tool_call_id=tool_call_id)
+
+        except Exception as err:
+            logger.error(f"Plugin Tool {tool_name} Error: {str(err)}")
+            emit_agent_event("tool_end", id=tool_call_id, name=tool_name, status="error", output=str(err))
+            return ToolMessage(content=str(err), name=tool_name, tool_call_id=tool_call_id)
+
+    async def _plan_and_execute(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        """装载 MCP 工具 -> 规划 -> 执行计划，返回需要追加到对话上下文的执行结果。"""
         await self.setup_mcp_tools()
 
-        agent_plans = await self._plan_agent_actions(messages)
-        if agent_plans:
-            tool_results = await self._execute_agent_actions(agent_plans)
-        else:
-            tool_results = []
+        selection = self._select_tools(messages)
+        agent_plans = await self._plan_agent_actions(messages, selection.tools)
+        if not agent_plans:
+            return []
+
+        emit_agent_event(
+            "plan", plan=agent_plans.model_dump() if isinstance(agent_plans, BaseModel) else agent_plans
+        )
+        return await self._execute_agent_actions(agent_plans, selection)
+
+    async def astream(self, messages: List[BaseMessage]):
+        """流式调用：先装载 MCP 工具 -> 规划 -> 执行 -> 对话流式输出。"""
+        tool_results = await self._plan_and_execute(messages)
 
         messages.extend(tool_results)
         try:
@@ -243,26 +484,35 @@ class PlanExecuteAgent:
             logger.error(f"LLM stream error: {err}")
 
 
+    async def astream_events(self, messages: List[BaseMessage]) -> AsyncGenerator[AgentEvent, None]:
+        """结构化事件流：plan -> 工具执行进度（tool_start / tool_end）-> 回复片段（token）-> done。"""
+
+        async def run():
+            tool_results = await self._plan_and_execute(messages)
+            async for chunk in self.conversation_model.astream(self._safe_messages(messages, tool_results)):
+                if isinstance(chunk, AIMessageChunk) and chunk.content:
+                    emit_agent_event("token", content=chunk.content)
+
+        async for event in stream_agent_events(run):
+            yield event
+
     async def ainvoke(self, messages: List[BaseMessage]):
         """一次性调用：同样先规划后执行，最后返回完整回复文本。"""
-        await self.setup_mcp_tools()
+        tool_results = await self._plan_and_execute(messages)
 
-        agent_plans = await self._plan_agent_actions(messages)
-        if agent_plans:
-            tool_results = await self._execute_agent_actions(agent_plans)
-        else:
-            tool_results = []
+        response = await self.conversation_model.ainvoke(self._safe_messages(messages, tool_results))
+        return response.content
 
-        # 确保所有消息都是 BaseMessage，否则转为 HumanMessage
+    @staticmethod
+    def _safe_messages(messages: List[BaseMessage], tool_results: List[BaseMessage]) -> List[BaseMessage]:
+        """确保所有消息都是 BaseMessage，否则转为 HumanMessage。"""
         safe_messages: List[BaseMessage] = []
         for m in list(messages) + list(tool_results):
             if isinstance(m, BaseMessage):
                 safe_messages.append(m)
             else:
                 safe_messages.append(HumanMessage(content=str(m)))
-
-        response = await self.conversation_model.ainvoke(safe_messages)
-        return response.content
+        return safe_messages
 
     def _get_mcp_id_by_tool(self, tool_name):
         """根据工具名查找其所属的 MCP 服务 ID（用于注入个性化配置）。"""
@@ -274,33 +524,12 @@ class PlanExecuteAgent:
         return None
 
     def _find_tool_use(self, tool_name):
-        """在本地工具与 MCP 工具中按名称查找，返回 (是否MCP, 工具实例或 None)。"""
-        for tool in self.tools:
-            if tool.name == tool_name:
-                return False, tool
-        for tool in self.mcp_tools:
-            if tool.name == tool_name:
-                return True, tool
-        return False, None
+        """在工具注册表（本地工具 + 本次运行加载的 MCP 工具）中按名称查找，返回 (是否MCP, 工具实例或 None)。"""
+        tool = self._sync_tool_registry().get(tool_name)
+        if tool is None:
+            return False, None
+        return not any(local_tool is tool for local_tool in self.tools), tool
 
     def _format_tool_schema(self, tool: BaseTool) -> str:
-        """Return a readable schema string for a tool's args."""
-        schema = getattr(tool, "args_schema", None)
-        if schema is None:
-            return tool.name
-
-        # args_schema can be a BaseModel subclass or instance
-        if isinstance(schema, type) and issubclass(schema, BaseModel):
-            try:
-                return str(schema.model_json_schema())
-            except Exception:
-                try:
-                    return str(schema.model_fields)
-                except Exception:
-                    return tool.name
-        if isinstance(schema, BaseModel):
-            try:
-                return str(schema.model_dump())
-            except Exception:
-                return str(schema)
-        return str(schema)
+        """Return a compact signature for a tool (name, typed params, short description), cached per tool."""
+        return render_tool_schema(tool)
@@ -1,36 +1,126 @@
+import asyncio
+import contextvars
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
 from loguru import logger
-from typing import List, Dict, Any, AsyncGenerator, NotRequired, Union, Optional, Callable, Awaitable
+from typing import List, Dict, Any, AsyncGenerator, Annotated, NotRequired, TypedDict, Union, Optional, Callable, Awaitable, Sequence
 from langchain_core.language_models import BaseChatModel
 from langgraph.constants import START, END
-from langgraph.graph import MessagesState, StateGraph
+from langgraph.graph import StateGraph
+from langgraph.graph.message import Messages, add_messages
 from langchain_core.tools import BaseTool
-from langchain_core.messages import BaseMessage, SystemMessage, ToolMessage, AIMessageChunk, AIMessage, HumanMessage
-
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    AnyMessage,
+    BaseMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+    ToolMessage,
+    message_chunk_to_message,
+)
+
+from agentchat.core.callbacks.events import AgentEvent, emit_agent_event, preview, stream_agent_events
+from agentchat.core.tools.index import TOOL_RETRIEVAL_TOP_K, latest_user_query, tool_selection_stats
+from agentchat.core.tools.registry import ToolRegistry
 from agentchat.prompts.chat import DEFAULT_CALL_PROMPT
 from agentchat.services.mcp.manager import MCPManager
 from agentchat.utils.convert import convert_mcp_config
 
+DEFAULT_TOOL_TIMEOUT = 60.0
+DEFAULT_MAX_TOOL_CONCURRENCY = 4
+
+# 同步工具（requests 等阻塞调用）统一在有界线程池中执行，避免阻塞事件循环
+_tool_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TOOL_THREAD_POOL_SIZE", "16")), thread_name_prefix="react-tool"
+)
+
+
+class _MessageList(list):
+    """append_messages 产出的消息列表，附带「消息 id -> 位置」索引，合并时不必每次按历史重建。
+
+    追加时新列表与旧列表共享同一个索引并原地登记新消息，索引因此可能含有旧列表之外的 id
+    （LangGraph 为条件边读取最新状态时会把同一批写入在状态副本上先合并一次；分支或重试的
+    写入也会合并到较旧的状态上）。命中时核对该位置上确为同一 id 才视为重复，多出的登记
+    不会造成误判。已登记的条目从不改写：新消息的 id 在索引中已指向别的位置时（另一个
+    合并结果在该位置登记过它），先复制索引再登记，共享同一索引的其他列表不受影响。
+    """
+
+    __slots__ = ("positions",)
 
-class ReactAgentState(MessagesState):
+
+def append_messages(left: Messages, right: Messages) -> Messages:
+    """messages 通道的 reducer：把节点返回的新消息追加到历史末尾。
+
+    add_messages 每次合并都会把完整历史重新转换一遍并重建 id 索引，工具循环每一步
+    （包括条件边读取状态）的开销都随历史长度线性增长。节点只返回新增消息时直接追加即可，
+    id 查重使用随列表维护的索引（见 _MessageList），只在首次合并时按历史构建一次；
+    首次写入、右侧包含 RemoveMessage / 非消息对象，或 id 与已有消息或同批消息重复（替换语义）时
+    回退到 add_messages，保持其原有行为。
     """
-    LangGraph 状态定义，继承自 MessagesState，扩展了额外的跟踪字段。
+    if not isinstance(right, list):
+        right = [right]
+    if not left or not all(isinstance(m, BaseMessage) and not isinstance(m, RemoveMessage) for m in right):
+        return add_messages(left, right)
+
+    new_messages = [message_chunk_to_message(m) for m in right]
+    if isinstance(left, _MessageList):
+        positions = left.positions
+    else:
+        positions = {m.id: i for i, m in enumerate(left) if m.id is not None}
+    seen_ids = set()
+    for m in new_messages:
+        if m.id is None:
+            continue
+        position = positions.get(m.id)
+        if m.id in seen_ids or (position is not None and position < len(left) and left[position].id == m.id):
+            return add_messages(left, right)
+        seen_ids.add(m.id)
+    for m in new_messages:
+        if m.id is None:
+            m.id = str(uuid.uuid4())
+
+    merged = _MessageList(left)
+    merged.extend(new_messages)
+    registrations = list(enumerate(new_messages, start=len(left)))
+    if any(positions.get(m.id, position) != position for position, m in registrations):
+        positions = dict(positions)
+    for position, m in registrations:
+        positions[m.id] = position
+    merged.positions = positions
+    return merged
+
+
+class ReactAgentState(TypedDict):
+    """
+    LangGraph 状态定义：对应 MessagesState 的 messages 字段，扩展了额外的跟踪字段。
     
-    继承字段 (来自 MessagesState):
-        messages (List[BaseMessage]): 完整的对话历史，包括 HumanMessage、AIMessage、ToolMessage 等
+    消息字段：
+        messages (List[BaseMessage]): 完整的对话历史，包括 HumanMessage、AIMessage、ToolMessage 等。
+                                      使用 append_messages 合并，节点只需返回本轮新增的消息。
     
     扩展字段：
         tool_call_count (NotRequired[int]): 工具被调用的总次数计数器，用于追踪迭代轮次。
                                             初始值为 0，每当 execute_tool_node 完成一次工具执行后就增加 1。
                                             这个计数器帮助 Agent 识别当前是第几轮推理-行动循环。
-        model_call_count (NotRequired[int]): 模型被调用的总次数计数器（目前在代码中定义但未被显式使用）。
+        model_call_count (NotRequired[int]): 模型被调用的总次数计数器，每当 call_tool_node 调用一次模型后增加 1。
                                              可用于未来的优化和限制（如防止无限循环）。
+        selected_tools (NotRequired[Optional[List[str]]]): 最近一次模型调用绑定的工具名称，None 表示绑定了全部工具。
+        expand_tools (NotRequired[bool]): 模型请求了未绑定的工具后置为 True，之后的模型调用绑定全部工具。
     
     设计目的：
         通过扩展状态，将额外的元数据（如循环计数）集成到 LangGraph 的状态管理中，
         允许节点函数根据这些信息做出更智能的决策（如显示不同的提示文本）。
     """
+    messages: Annotated[List[AnyMessage], append_messages]
     tool_call_count: NotRequired[int]
     model_call_count: NotRequired[int]
+    selected_tools: NotRequired[Optional[List[str]]]
+    expand_tools: NotRequired[bool]
 
 
 class ReactAgent:
@@ -55,7 +145,10 @@ class ReactAgent:
                  system_prompt: Optional[str] = None,
                  tools: List[BaseTool] = [],
                  mcp_servers: Optional[List[Dict[str, Any]]] = None,
-                 user_config_provider: Optional[Callable[[str, Optional[str]], Awaitable[Dict[str, Any]]]] = None):
+                 user_config_provider: Optional[Callable[[str, Optional[str]], Awaitable[Dict[str, Any]]]] = None,
+                 tool_timeout: Optional[float] = DEFAULT_TOOL_TIMEOUT,
+                 max_tool_concurrency: int = DEFAULT_MAX_TOOL_CONCURRENCY,
+                 tool_top_k: int = TOOL_RETRIEVAL_TOP_K):
         """
         初始化 ReactAgent。
 
@@ -69,10 +162,14 @@ class ReactAgent:
                                     默认为空列表。
             mcp_servers (Optional[List[Dict[str, Any]]]): MCP 服务器配置列表。
             user_config_provider (Optional[Callable]): 用户配置提供函数，用于 MCP 工具鉴权。
+            tool_timeout (Optional[float]): 单个工具调用的超时时间（秒），None 表示不限制。
+            max_tool_concurrency (int): 同一轮工具调用中最多同时执行的工具数。
+            tool_top_k (int): 每次模型调用按用户问题检索并绑定的工具数上限，0 表示始终绑定全部工具。
 
         初始化过程：
             - 保存模型、提示词和工具列表
             - 创建 mcp_agent_as_tools 列表，用于后续动态添加 MCP 代理作为工具
+            - 创建工具注册表，缓存合并后的工具索引与绑定了工具的模型
             - 设置 self.graph 为 None，采用延迟初始化模式（在首次 astream 时初始化）
         """
         self.model = model
@@ -81,32 +178,47 @@ class ReactAgent:
         self.mcp_servers = mcp_servers or []
         self.user_config_provider = user_config_provider
         self.user_id: Optional[str] = None  # 可选的用户标识
+        self.tool_timeout = tool_timeout
+        self.max_tool_concurrency = max(1, max_tool_concurrency)
+        self.tool_top_k = max(0, tool_top_k)
 
-        # MCP 管理器和工具
+        # MCP 管理器；每次运行加载的 MCP 工具只同步到工具注册表，不保存在（可能被多个请求共享的）实例上
         self.mcp_manager: Optional[MCPManager] = None
-        self.mcp_tools: List[BaseTool] = []
 
         # 用于集成其他代理作为工具，支持 Agent 的递归组合
         self.mcp_agent_as_tools: List[BaseTool] = []
 
+        # 本地工具、MCP 工具与代理工具的合并索引及绑定了工具的模型，工具集变化时重建
+        self.tool_registry = ToolRegistry()
+
         # LangGraph 实例，采用延迟初始化以提高启动速度
         self.graph: Optional[StateGraph] = None
 
     async def setup_mcp_tools(self) -> List[BaseTool]:
-        """加载 MCP 工具：按需创建管理器并异步拉取远端工具列表。
+        """加载 MCP 工具：按需创建管理器并异步拉取远端工具列表，同步到工具注册表。
 
         返回:
-            List[BaseTool]: 加载的 MCP 工具列表
+            List[BaseTool]: 加载的 MCP 工具列表（本次运行使用，不保存在实例上）
         """
         if self.mcp_servers and not self.mcp_manager:
             self.mcp_manager = MCPManager(convert_mcp_config(self.mcp_servers))
 
-        if self.mcp_manager:
-            self.mcp_tools = await self.mcp_manager.get_mcp_tools()
-        else:
-            self.mcp_tools = []
+        mcp_tools = await self.mcp_manager.get_mcp_tools() if self.mcp_manager else []
+        self._sync_tool_registry(mcp_tools)
+        return mcp_tools
 
-        return self.mcp_tools
+    def _sync_tool_registry(self, mcp_tools: Optional[Sequence[BaseTool]] = None) -> ToolRegistry:
+        """按当前的模型与工具列表同步注册表；同名工具依次以本地工具、MCP 工具、代理工具为准。
+
+        mcp_tools 为本次运行加载的 MCP 工具（见 setup_mcp_tools）；为 None 时沿用注册表当前的
+        工具集，注册表尚未同步过时视为没有 MCP 工具。
+        """
+        if mcp_tools is None:
+            if self.tool_registry.synced:
+                return self.tool_registry
+            mcp_tools = []
+        self.tool_registry.sync(self.model, self.tools, mcp_tools, self.mcp_agent_as_tools)
+        return self.tool_registry
 
     def _prepare_messages(self, messages: List[BaseMessage]) -> List[BaseMessage]:
         """Ensure we have a SystemMessage and a copy of the history to work with."""
@@ -147,6 +259,7 @@ class ReactAgent:
         
         查找范围：
             - self.tools: 初始化时传入的标准工具列表
+            - MCP 工具: 本次运行 setup_mcp_tools 加载的 MCP 工具列表
             - self.mcp_agent_as_tools: 动态添加的 MCP 代理工具列表
         
         用途：
@@ -154,13 +267,10 @@ class ReactAgent:
             查找实际的工具实现，以便执行工具。
         
         注意：
-            如果同一个名称的工具同时存在于 self.tools 和 self.mcp_agent_as_tools 中，
-            会优先返回 self.tools 中的版本（因为列表连接的顺序）。
+            如果同一个名称的工具同时存在于多个列表中，按上面的顺序优先返回靠前的版本。
+            查找走工具注册表中的名称索引，注册表在每次运行开始时（setup_mcp_tools）同步。
         """
-        for tool in self.tools + self.mcp_agent_as_tools:
-            if tool.name == tool_name:
-                return tool
-        return None
+        return self._sync_tool_registry().get(tool_name)
 
     # --- LangGraph Node 定义和 Graph Setup ---
 
@@ -238,58 +348,111 @@ class ReactAgent:
 
         return END
 
-    async def _call_tool_node(self, state: ReactAgentState) -> Dict[str, List[BaseMessage]]:
-        """调用 LLM，判断是否需要使用工具。"""
-        tool_invocation_model = self.model.bind_tools(self.tools)
+    async def _call_tool_node(self, state: ReactAgentState) -> Dict[str, Any]:
+        """调用 LLM，判断是否需要使用工具。
+
+        节点只返回本轮新增的消息，由 append_messages 追加到状态中；返回完整列表会让
+        reducer 每轮重新合并全部历史，工具循环越长开销越大。
+        绑定了工具的模型由工具注册表缓存，工具集不变时不再重复序列化工具 Schema。
+
+        工具较多时只绑定与用户问题最相关的 tool_top_k 个工具；模型请求过未绑定的工具后
+        （见 _execute_tool_node），本次执行余下的模型调用改为绑定全部工具。
+        """
+        registry = self._sync_tool_registry()
+        selection = registry.select(
+            latest_user_query(state["messages"]), 0 if state.get("expand_tools") else self.tool_top_k
+        )
+        tool_selection_stats.record(selection)
+        tool_invocation_model = registry.bound_model(selection.tools)
         response: AIMessage = await tool_invocation_model.ainvoke(state["messages"])
         if response.tool_calls:
             tool_names = ", ".join(sorted({tool_call["name"] for tool_call in response.tool_calls}))
             logger.info(f"工具调用命中: {tool_names}")
-        state["messages"].append(response)
-        return {"messages": state["messages"]}
+        return {
+            "messages": [response],
+            "model_call_count": state.get("model_call_count", 0) + 1,
+            "selected_tools": selection.names if selection.filtered else None,
+        }
 
     async def _execute_tool_node(self, state: ReactAgentState) -> Dict[str, Any]:
-        """执行 LLM 上一阶段选中的工具。"""
+        """
+        执行 LLM 上一阶段选中的工具。
+
+        同一条 AIMessage 中的多个工具调用彼此独立，使用 asyncio.gather 并发执行：
+            - 异步工具直接 await，同步工具放到有界线程池中执行
+            - 每个工具调用受 tool_timeout 限制，超时或异常都转换为错误 ToolMessage
+            - 并发数受 max_tool_concurrency 限制（每次请求独立计数）
+            - 返回的 ToolMessage 与 tool_calls 顺序一致
+        """
         last_message = state["messages"][-1]
         tool_calls = last_message.tool_calls
-        tool_messages: List[BaseMessage] = []
 
         if not tool_calls:
             logger.warning("Execute tool node reached without tool calls.")
-            return {"messages": state["messages"], "tool_call_count": state.get("tool_call_count", 0)}
-
-        for tool_call in tool_calls:
-            tool_name = tool_call["name"]
-            tool_args = tool_call["args"]
-            tool_call_id = tool_call["id"]
+            return {}
 
-            try:
-                current_tool = self.get_tool_by_name(tool_name)
+        semaphore = asyncio.Semaphore(self.max_tool_concurrency)
+        tool_messages: List[BaseMessage] = await asyncio.gather(
+            *(self._run_tool_call(tool_call, semaphore) for tool_call in tool_calls)
+        )
 
-                if current_tool is None:
-                    raise ValueError(f"Tool '{tool_name}' not found.")
+        update: Dict[str, Any] = {"messages": tool_messages, "tool_call_count": state.get("tool_call_count", 0) + 1}
+        selected_tools = state.get("selected_tools")
+        if selected_tools is not None and not state.get("expand_tools"):
+            unknown = {tool_call["name"] for tool_call in tool_calls} - set(selected_tools)
+            if unknown:
+                # 检索漏掉了模型需要的工具（或模型编造了工具名），之后改为绑定全部工具
+                logger.info(f"模型请求了未绑定的工具 {', '.join(sorted(unknown))}，改为绑定全部工具")
+                tool_selection_stats.expansions += 1
+                update["expand_tools"] = True
+
+        # 只返回新增的 ToolMessage（见 _call_tool_node）
+        return update
+
+    async def _run_tool_call(self, tool_call: Dict[str, Any], semaphore: asyncio.Semaphore) -> ToolMessage:
+        """执行单个工具调用，并将结果或错误封装为 ToolMessage。"""
+        tool_name = tool_call["name"]
+        tool_args = tool_call["args"]
+        tool_call_id = tool_call["id"]
+
+        try:
+            current_tool = self.get_tool_by_name(tool_name)
+
+            if current_tool is None:
+                raise ValueError(f"Tool '{tool_name}' not found.")
+
+            async with semaphore:
+                emit_agent_event("tool_start", id=tool_call_id, name=tool_name, args=tool_args)
+                tool_result = await asyncio.wait_for(self._invoke_tool(current_tool, tool_args), self.tool_timeout)
+
+            tool_result_str = str(tool_result)
+            logger.info(f"Tool {tool_name} executed. Args: {tool_args}, Result: {tool_result_str}")
+            emit_agent_event(
+                "tool_end", id=tool_call_id, name=tool_name, status="success", output=preview(tool_result_str)
+            )
+            return ToolMessage(content=tool_result_str, name=tool_name, tool_call_id=tool_call_id)
+
+        except asyncio.TimeoutError:
+            error_message = f"执行工具 {tool_name} 超时（{self.tool_timeout} 秒）"
+        except Exception as err:
+            error_message = f"执行工具 {tool_name} 失败: {str(err)}"
 
-                if current_tool.coroutine:
-                    tool_result = await current_tool.ainvoke(tool_args)
-                else:
-                    tool_result = current_tool.invoke(tool_args)
+        logger.error(error_message)
+        emit_agent_event("tool_end", id=tool_call_id, name=tool_name, status="error", output=error_message)
+        return ToolMessage(content=error_message, name=tool_name, tool_call_id=tool_call_id)
 
-                tool_result_str = str(tool_result)
-                tool_messages.append(
-                    ToolMessage(content=tool_result_str, name=tool_name, tool_call_id=tool_call_id)
-                )
-                logger.info(f"Tool {tool_name} executed. Args: {tool_args}, Result: {tool_result_str}")
+    @staticmethod
+    async def _invoke_tool(tool: BaseTool, tool_args: Any) -> Any:
+        """异步工具直接 await；同步工具在线程池中执行（复制当前上下文以保留回调等 contextvars）。
 
-            except Exception as err:
-                error_message = f"执行工具 {tool_name} 失败: {str(err)}"
-                logger.error(error_message)
-                tool_messages.append(
-                    ToolMessage(content=error_message, name=tool_name, tool_call_id=tool_call_id)
-                )
+        注意：超时只会放弃等待，已在线程中运行的同步工具无法被中断，会在后台执行完毕。
+        """
+        if getattr(tool, "coroutine", None):
+            return await tool.ainvoke(tool_args)
 
-        state["messages"].extend(tool_messages)
-        new_tool_count = state.get("tool_call_count", 0) + 1
-        return {"messages": state["messages"], "tool_call_count": new_tool_count}
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(_tool_executor, partial(context.run, tool.invoke, tool_args))
 
     # --- 主调用方法 ---
 
@@ -314,6 +477,27 @@ class ReactAgent:
         except Exception as err:
             logger.error(f"Agent Execution Error: {err}")
 
+    async def astream_events(self, messages: List[BaseMessage]) -> AsyncGenerator[AgentEvent, None]:
+        """结构化事件流：模型输出片段（token）与工具执行进度（tool_start / tool_end），最后是 done。
+
+        与 astream 不同，执行异常会在已产出的事件之后抛出，由调用方转换为 error 事件。
+        """
+
+        async def run():
+            # 自动加载 MCP 工具
+            await self.setup_mcp_tools()
+
+            prepared_messages = self._prepare_messages(messages)
+            await self._init_agent()
+
+            initial_state = {"messages": prepared_messages, "tool_call_count": 0, "model_call_count": 0}
+            async for message, _ in self.graph.astream(input=initial_state, stream_mode="messages"):
+                if isinstance(message, (AIMessageChunk, AIMessage)) and message.content:
+                    emit_agent_event("token", content=message.content)
+
+        async for event in stream_agent_events(run):
+            yield event
+
     async def ainvoke(self, messages: List[BaseMessage]) -> str:
         """一次性执行完整的 ReAct 流程并返回最终回复。"""
         # 自动加载 MCP 工具
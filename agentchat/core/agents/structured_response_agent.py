@@ -27,4 +27,9 @@ class StructuredResponseAgent:
     def get_structured_response(self, messages):
         """执行一次调用，返回解析后的结构化字段 `structured_response`。"""
         result = self.structured_agent.invoke({"messages": messages})
+        return result["structured_response"]
+
+    async def aget_structured_response(self, messages):
+        """get_structured_response 的异步版本，在事件循环中调用时应使用此方法，避免阻塞。"""
+        result = await self.structured_agent.ainvoke({"messages": messages})
         return result["structured_response"]
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""Agent 运行事件：各智能体在执行过程中发出结构化事件，供 SSE 等流式接口消费。
+
+事件为普通字典，"type" 字段取值见 AgentEventType：
+    token          {"content"}                          模型输出的文本片段
+    tool_start     {"id", "name", "args"}               开始执行工具
+    tool_end       {"id", "name", "status", "output"}   工具执行结束（status 为 success / error）
+    plan           {"plan"}                             PlanExecute 生成的执行计划
+    sandbox_output {"code", "output"}                   CodeAct 沙箱的一次执行
+    error          {"message"}                          执行失败
+    done           {"usage"}                            执行结束，附带本次运行的模型 token 用量
+
+智能体内部通过 emit_agent_event 发出事件；事件接收方由 stream_agent_events 通过
+contextvar 注入，没有接收方时（例如 ainvoke）调用是空操作。
+"""
+
+import asyncio
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Literal, Optional
+
+from langchain_core.callbacks import get_usage_metadata_callback
+
+AgentEventType = Literal["token", "tool_start", "tool_end", "plan", "sandbox_output", "error", "done"]
+AgentEvent = Dict[str, Any]
+
+# 工具输出等长文本在事件中只保留前缀，完整内容仍在消息上下文中
+EVENT_PREVIEW_CHARS = 2000
+
+_event_sink: ContextVar[Optional[Callable[[AgentEvent], None]]] = ContextVar("agent_event_sink", default=None)
+
+
+def agent_event(event_type: AgentEventType, **data: Any) -> AgentEvent:
+    return {"type": event_type, **data}
+
+
+def emit_agent_event(event_type: AgentEventType, **data: Any) -> None:
+    """向当前运行的事件接收方发出事件；可在事件循环线程或工作线程中调用。"""
+    sink = _event_sink.get()
+    if sink is not None:
+        sink(agent_event(event_type, **data))
+
+
+def preview(value: Any, limit: int = EVENT_PREVIEW_CHARS) -> str:
+    text = value if isinstance(value, str) else str(value)
+    return text if len(text) <= limit else f"{text[:limit]}..."
+
+
+async def stream_agent_events(run: Callable[[], Awaitable[Any]]) -> AsyncGenerator[AgentEvent, None]:
+    """在后台任务中执行 run，并按发生顺序产出其间发出的事件，最后产出 done 事件。
+
+    run 中创建的子任务会继承事件接收方与 token 用量统计。run 抛出的异常在已产出的
+    事件之后重新抛出；消费方提前关闭生成器（如客户端断开）时取消后台任务。
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    loop = asyncio.get_running_loop()
+
+    def sink(event: AgentEvent) -> None:
+        # 同步节点/工具在线程池中执行，需切回事件循环线程入队
+        if asyncio._get_running_loop() is loop:
+            queue.put_nowait(event)
+        else:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    async def runner() -> Dict[str, int]:
+        _event_sink.set(sink)
+        with get_usage_metadata_callback() as usage_callback:
+            await run()
+        usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+        for model_usage in usage_callback.usage_metadata.values():
+            for key in usage:
+                usage[key] += model_usage.get(key, 0)
+        return usage
+
+    task = asyncio.create_task(runner())
+    getter: Optional[asyncio.Future] = None
+    try:
+        while True:
+            getter = getter or asyncio.ensure_future(queue.get())
+            await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                event, getter = getter.result(), None
+                yield event
+            elif task.done():
+                getter.cancel()
+                getter = None
+                break
+
+        while not queue.empty():
+            yield queue.get_nowait()
+        yield agent_event("done", usage=task.result())
+    finally:
+        if getter is not None:
+            getter.cancel()
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,33 @@
+"""智能体运行上下文：注册表中的智能体实例由所有请求共享，请求相关的信息（当前用户）
+不能保存在实例上，而是由调用方通过 contextvar 设置，智能体在执行时读取。
+
+事件循环中创建的子任务会继承当前上下文，工具调用、计划步骤等并发执行的部分
+读取到的都是发起本次运行的用户。
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+_current_user_id: ContextVar[Optional[str]] = ContextVar("agent_user_id", default=None)
+
+
+def current_user_id(default: Optional[str] = None) -> Optional[str]:
+    """返回当前运行所属的用户；未设置时返回 default（例如智能体构造时传入的 user_id）。"""
+    user_id = _current_user_id.get()
+    return user_id if user_id is not None else default
+
+
+def set_current_user(user_id: Optional[str]) -> None:
+    """把当前上下文中的运行归属到 user_id（用于无法可靠 reset 的异步生成器）。"""
+    _current_user_id.set(user_id)
+
+
+@contextmanager
+def user_scope(user_id: Optional[str]) -> Iterator[None]:
+    """代码块内的智能体运行归属到 user_id。"""
+    token = _current_user_id.set(user_id)
+    try:
+        yield
+    finally:
+        _current_user_id.reset(token)
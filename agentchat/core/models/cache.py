@@ -0,0 +1,374 @@
+"""Opt-in exact-match response cache for the chat models created by `ModelManager`.
+
+Responses are keyed by a hash of the request the provider would receive
+(model, messages, bound tools, temperature and the other sampling parameters)
+and stored in a local SQLite file with a TTL and size-bounded LRU eviction.
+Streaming calls store the received chunks and replay them on a hit, so
+token-by-token consumers behave the same with a warm cache.
+
+Hit rates are tracked per scope; the agent runner sets the scope to the agent
+mode of the current run with `llm_cache_scope`.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import generate_from_stream
+from langchain_core.messages import AIMessageChunk, BaseMessage, messages_from_dict, messages_to_dict
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+from loguru import logger
+from pydantic import Field
+
+from agentchat.schema.common import LLMCacheConfig
+
+DEFAULT_SCOPE = "default"
+# Request fields that only select the transport, not the response.
+TRANSPORT_PARAMS = ("stream", "stream_options")
+# Eviction trims the cache to this fraction of its limits so it does not run on every insert.
+EVICTION_TARGET_RATIO = 0.9
+
+_cache_scope: ContextVar[str] = ContextVar("llm_cache_scope", default=DEFAULT_SCOPE)
+
+
+def set_llm_cache_scope(scope: str) -> None:
+    """Attribute the cache lookups of the current context to `scope`."""
+    _cache_scope.set(scope or DEFAULT_SCOPE)
+
+
+@contextmanager
+def llm_cache_scope(scope: str) -> Iterator[None]:
+    """Attribute the cache lookups made inside the block to `scope`."""
+    token = _cache_scope.set(scope or DEFAULT_SCOPE)
+    try:
+        yield
+    finally:
+        _cache_scope.reset(token)
+
+
+@dataclass
+class LLMCacheScopeStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        lookups = self.hits + self.misses
+        data["hit_rate"] = self.hits / lookups if lookups else 0.0
+        return data
+
+
+@dataclass
+class LLMCacheStats:
+    """Lookup counters per scope (agent mode) plus eviction counters."""
+
+    scopes: Dict[str, LLMCacheScopeStats] = field(default_factory=dict)
+    expired: int = 0
+    evicted: int = 0
+    errors: int = 0
+
+    def scope(self, name: Optional[str] = None) -> LLMCacheScopeStats:
+        name = name or _cache_scope.get()
+        stats = self.scopes.get(name)
+        if stats is None:
+            stats = self.scopes[name] = LLMCacheScopeStats()
+        return stats
+
+    def as_dict(self) -> Dict[str, Any]:
+        hits = sum(stats.hits for stats in self.scopes.values())
+        misses = sum(stats.misses for stats in self.scopes.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "errors": self.errors,
+            "scopes": {name: stats.as_dict() for name, stats in self.scopes.items()},
+        }
+
+
+llm_cache_stats = LLMCacheStats()
+
+
+def _dump_generations(generations: Sequence[Any]) -> Optional[str]:
+    """Serialise chat generations; returns None for generations that cannot be cached."""
+    if not generations or not all(isinstance(generation, ChatGeneration) for generation in generations):
+        return None
+    messages: List[BaseMessage] = []
+    for generation in generations:
+        # The model assigns fresh run ids on replay.
+        messages.append(generation.message.model_copy(update={"id": None}))
+    return json.dumps(
+        {"chunks": isinstance(generations[0], ChatGenerationChunk), "messages": messages_to_dict(messages)},
+        ensure_ascii=False,
+        default=str,
+    )
+
+
+def _load_generations(value: str) -> List[ChatGeneration]:
+    data = json.loads(value)
+    generation_class = ChatGenerationChunk if data["chunks"] else ChatGeneration
+    return [generation_class(message=message) for message in messages_from_dict(data["messages"])]
+
+
+class SQLiteLLMCache(BaseCache):
+    """LangChain cache backed by a SQLite file, with a TTL and LRU eviction by entry count and size.
+
+    Blocking SQLite calls run in a worker thread from the async methods. Entries
+    are keyed by the SHA-256 of (llm_string, prompt).
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, max_bytes: int = 256 * 1024 * 1024, ttl: float = 86400):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._entries = 0
+        self._bytes = 0
+
+    @staticmethod
+    def cache_key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed_at ON llm_cache (accessed_at)")
+            self._connection = connection
+            self._refresh_totals()
+        return self._connection
+
+    def _refresh_totals(self) -> None:
+        self._entries, self._bytes = self._connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+        ).fetchone()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self.cache_key(prompt, llm_string)
+        stats = llm_cache_stats.scope()
+        now = time.time()
+        try:
+            with self._lock:
+                connection = self._connect()
+                row = connection.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and self.ttl > 0 and row[1] < now - self.ttl:
+                    connection.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._refresh_totals()
+                    llm_cache_stats.expired += 1
+                    row = None
+                if row is None:
+                    stats.misses += 1
+                    return None
+                connection.execute(
+                    "UPDATE llm_cache SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (now, key)
+                )
+                stats.hits += 1
+            return _load_generations(row[0])
+        except Exception as err:
+            llm_cache_stats.errors += 1
+            logger.warning(f"LLM cache lookup failed: {err}")
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        value = _dump_generations(return_val)
+        if value is None:
+            return
+        key = self.cache_key(prompt, llm_string)
+        size = len(value.encode("utf-8"))
+        now = time.time()
+        try:
+            with self._lock:
+                connection = self._connect()
+                connection.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, now, now),
+                )
+                self._entries += 1
+                self._bytes += size
+                llm_cache_stats.scope().stores += 1
+                if self._entries > self.max_entries or self._bytes > self.max_bytes:
+                    self._evict(now)
+        except Exception as err:
+            llm_cache_stats.errors += 1
+            logger.warning(f"LLM cache update failed: {err}")
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then the least recently used ones until below the target size."""
+        connection = self._connection
+        if self.ttl > 0:
+            llm_cache_stats.expired += connection.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,)
+            ).rowcount
+        self._refresh_totals()
+
+        target_entries = int(self.max_entries * EVICTION_TARGET_RATIO)
+        target_bytes = int(self.max_bytes * EVICTION_TARGET_RATIO)
+        if self._entries <= self.max_entries and self._bytes <= self.max_bytes:
+            return
+        entries, total_bytes = self._entries, self._bytes
+        victims: List[Tuple[str]] = []
+        for key, size in connection.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at"):
+            if entries <= target_entries and total_bytes <= target_bytes:
+                break
+            victims.append((key,))
+            entries -= 1
+            total_bytes -= size
+        connection.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+        llm_cache_stats.evicted += len(victims)
+        self._refresh_totals()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM llm_cache")
+            self._refresh_totals()
+
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return await asyncio.to_thread(self.lookup, prompt, llm_string)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        await asyncio.to_thread(self.update, prompt, llm_string, return_val)
+
+    async def aclear(self, **kwargs: Any) -> None:
+        await asyncio.to_thread(self.clear)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class CachedChatOpenAI(ChatOpenAI):
+    """ChatOpenAI that serves identical requests from `response_cache`.
+
+    The key is the request payload sent to the provider, minus the streaming
+    flags, so streamed and non-streamed calls share entries. Replayed responses
+    carry no usage metadata since the provider was not called.
+    """
+
+    response_cache: Optional[SQLiteLLMCache] = Field(default=None, exclude=True)
+
+    def _cache_key_parts(self, messages: List[BaseMessage], stop: Optional[List[str]], **kwargs: Any) -> Tuple[str, str]:
+        payload = self._get_request_payload(messages, stop=stop, **kwargs)
+        for name in TRANSPORT_PARAMS:
+            payload.pop(name, None)
+        prompt = payload.pop("messages", None) or payload.pop("input", None)
+        llm = {"base_url": self.openai_api_base, "request": payload}
+        return (
+            json.dumps(prompt, sort_keys=True, ensure_ascii=False, default=str),
+            json.dumps(llm, sort_keys=True, ensure_ascii=False, default=str),
+        )
+
+    @staticmethod
+    def _replayed(message: BaseMessage) -> BaseMessage:
+        return message.model_copy(update={"usage_metadata": None})
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.response_cache is None:
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        prompt, llm_string = self._cache_key_parts(messages, stop, **kwargs)
+        cached = await self.response_cache.alookup(prompt, llm_string)
+        if cached:
+            if isinstance(cached[0], ChatGenerationChunk):
+                return generate_from_stream(
+                    ChatGenerationChunk(message=self._replayed(chunk.message)) for chunk in cached
+                )
+            return ChatResult(generations=[ChatGeneration(message=self._replayed(cached[0].message))])
+
+        result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        await self.response_cache.aupdate(prompt, llm_string, result.generations[:1])
+        return result
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        if self.response_cache is None:
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                yield chunk
+            return
+
+        prompt, llm_string = self._cache_key_parts(messages, stop, **kwargs)
+        cached = await self.response_cache.alookup(prompt, llm_string)
+        if cached:
+            if isinstance(cached[0], ChatGenerationChunk):
+                replay = [self._replayed(chunk.message) for chunk in cached]
+            else:
+                message = cached[0].message
+                replay = [AIMessageChunk(content=message.content, tool_calls=getattr(message, "tool_calls", []))]
+            for message in replay:
+                chunk = ChatGenerationChunk(message=message)
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+            return
+
+        chunks: List[ChatGenerationChunk] = []
+        async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        # Only complete streams are stored; a cancelled stream never reaches this point.
+        if chunks:
+            await self.response_cache.aupdate(prompt, llm_string, chunks)
+
+
+_response_cache: Optional[SQLiteLLMCache] = None
+_response_cache_config: Optional[LLMCacheConfig] = None
+
+
+def get_response_cache(config: LLMCacheConfig) -> Optional[SQLiteLLMCache]:
+    """Return the process-wide cache for `config`, or None when caching is disabled."""
+    global _response_cache, _response_cache_config
+    if not config.enabled:
+        return None
+    if _response_cache is None or _response_cache_config != config:
+        close_response_cache()
+        _response_cache = SQLiteLLMCache(
+            config.path,
+            max_entries=config.max_entries,
+            max_bytes=config.max_size_mb * 1024 * 1024,
+            ttl=config.ttl,
+        )
+        _response_cache_config = config
+    return _response_cache
+
+
+def close_response_cache() -> None:
+    global _response_cache, _response_cache_config
+    if _response_cache is not None:
+        _response_cache.close()
+    _response_cache = None
+    _response_cache_config = None
@@ -1,24 +1,166 @@
+import asyncio
+import importlib.util
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Set, Tuple
+
+import httpx
 from langchain_core.language_models import BaseChatModel
 from langchain_openai import ChatOpenAI
 
-from agentchat.settings import app_settings
+from agentchat.core.models.cache import CachedChatOpenAI, close_response_cache, get_response_cache
+from agentchat.schema.common import ModelConfig
+from agentchat.settings import app_settings, on_settings_reload
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+HTTPClients = Tuple[httpx.Client, httpx.AsyncClient]
+
+
+class _RetiredClients:
+    """HTTP clients dropped by a reload, waiting for the runs that may still use them."""
+
+    def __init__(self, clients: List[HTTPClients], leases: Set[object]) -> None:
+        self.clients = clients
+        self.pending = set(leases)
+        self.idle = asyncio.Event()
+        if not self.pending:
+            self.idle.set()
+
+    def release(self, lease: object) -> None:
+        self.pending.discard(lease)
+        if not self.pending:
+            self.idle.set()
+
+    async def close_when_idle(self) -> None:
+        await self.idle.wait()
+        for http_client, http_async_client in self.clients:
+            http_client.close()
+            await http_async_client.aclose()
 
 
 class ModelManager:
-    """Thin factory for the chat models used by the agents and tools."""
+    """Factory for the chat models used by the agents and tools.
+
+    Models are cached per (model, api_key, base_url, kwargs) and every model of the
+    same base_url shares one keep-alive HTTP connection pool, so agents can ask for
+    a model on each request without opening new connections. The caches are
+    dropped when `initialize_app_settings` reloads the configuration; the HTTP
+    clients of the dropped models are closed once every run that held a `lease`
+    at that moment has finished, so a reload does not break requests in flight.
+
+    When `llm_cache.enabled` is set, the models serve identical requests from
+    the shared SQLite response cache (see `agentchat.core.models.cache`).
+    """
+
+    _models: Dict[Tuple, BaseChatModel] = {}
+    _http_clients: Dict[str, HTTPClients] = {}
+    _leases: Set[object] = set()
+    _retired: List[_RetiredClients] = []
+    _closing: Set[asyncio.Task] = set()
 
     @classmethod
     def get_tool_invocation_model(cls, **kwargs) -> BaseChatModel:
-        return ChatOpenAI(
-            model=app_settings.multi_models.tool_call_model.model_name,
-            api_key=app_settings.multi_models.tool_call_model.api_key,
-            base_url=app_settings.multi_models.tool_call_model.base_url,
-        )
+        return cls._get_model(app_settings.multi_models.tool_call_model, **kwargs)
 
     @classmethod
     def get_conversation_model(cls, **kwargs) -> BaseChatModel:
-        return ChatOpenAI(
-            model=app_settings.multi_models.conversation_model.model_name,
-            api_key=app_settings.multi_models.conversation_model.api_key,
-            base_url=app_settings.multi_models.conversation_model.base_url,
+        return cls._get_model(app_settings.multi_models.conversation_model, **kwargs)
+
+    @classmethod
+    def _get_model(cls, model_config: ModelConfig, **kwargs: Any) -> BaseChatModel:
+        key = (
+            model_config.model_name,
+            model_config.api_key,
+            model_config.base_url,
+            tuple(sorted((name, repr(value)) for name, value in kwargs.items())),
         )
+        model = cls._models.get(key)
+        if model is None:
+            http_client, http_async_client = cls._get_http_clients(model_config.base_url)
+            options = dict(
+                model=model_config.model_name,
+                api_key=model_config.api_key,
+                base_url=model_config.base_url,
+                http_client=http_client,
+                http_async_client=http_async_client,
+                **kwargs,
+            )
+            response_cache = get_response_cache(app_settings.llm_cache)
+            if response_cache is not None:
+                model = CachedChatOpenAI(response_cache=response_cache, **options)
+            else:
+                model = ChatOpenAI(**options)
+            cls._models[key] = model
+        return model
+
+    @classmethod
+    def _get_http_clients(cls, base_url: str) -> HTTPClients:
+        """Return the (sync, async) HTTP clients shared by all models of `base_url`."""
+        clients = cls._http_clients.get(base_url)
+        if clients is None:
+            config = app_settings.llm_client
+            limits = httpx.Limits(
+                max_connections=config.max_connections,
+                max_keepalive_connections=config.max_keepalive_connections,
+                keepalive_expiry=config.keepalive_expiry,
+            )
+            # HTTP/2 needs the optional `h2` package; fall back to HTTP/1.1 keep-alive without it.
+            http2 = config.http2 and HTTP2_AVAILABLE
+            clients = (
+                httpx.Client(limits=limits, timeout=config.timeout, http2=http2),
+                httpx.AsyncClient(limits=limits, timeout=config.timeout, http2=http2),
+            )
+            cls._http_clients[base_url] = clients
+        return clients
+
+    @classmethod
+    @contextmanager
+    def lease(cls) -> Iterator[None]:
+        """Mark a run (an agent execution, a summary update...) that uses the cached models.
+
+        HTTP clients dropped by `aclear` while the lease is held stay open until it is released.
+        """
+        lease = object()
+        cls._leases.add(lease)
+        try:
+            yield
+        finally:
+            cls._leases.discard(lease)
+            for retired in cls._retired:
+                retired.release(lease)
+
+    @classmethod
+    async def aclear(cls, wait_for_runs: bool = True) -> None:
+        """Drop cached models and close their HTTP connection pools.
+
+        With `wait_for_runs` the pools are closed in the background once the runs
+        holding a lease have finished; otherwise (shutdown) they are closed now,
+        together with pools still waiting from earlier reloads.
+        """
+        retired = _RetiredClients(list(cls._http_clients.values()), cls._leases)
+        cls._models.clear()
+        cls._http_clients.clear()
+        close_response_cache()
+        cls._retired.append(retired)
+
+        if not wait_for_runs:
+            for pending in cls._retired:
+                pending.idle.set()
+            await asyncio.gather(*cls._closing, return_exceptions=True)
+            await cls._close_retired(retired)
+            return
+
+        task = asyncio.create_task(cls._close_retired(retired))
+        cls._closing.add(task)
+        task.add_done_callback(cls._closing.discard)
+
+    @classmethod
+    async def _close_retired(cls, retired: _RetiredClients) -> None:
+        try:
+            await retired.close_when_idle()
+        finally:
+            if retired in cls._retired:
+                cls._retired.remove(retired)
+
+
+on_settings_reload(ModelManager.aclear)
@@ -0,0 +1,226 @@
+"""进程内工具检索：对工具名称、描述与参数名建立 BM25 倒排索引，按用户问题挑选最相关的 top-k 工具。
+
+挂载多个 MCP 服务后，每次模型调用都携带全部工具的 JSON Schema，提示词 token 数与首 token
+延迟随工具数增长。索引随工具注册表一起维护：工具集变化时只对新增 / 移除的工具增量更新，
+每轮检索只访问查询词命中的倒排表。
+"""
+
+import json
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from agentchat.utils.tokens import count_tokens
+
+# 每轮最多绑定的工具数，0 表示不做检索、始终绑定全部工具
+TOOL_RETRIEVAL_TOP_K = int(os.getenv("TOOL_RETRIEVAL_TOP_K", "8"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_CAMEL_BOUNDARY = re.compile(r"([a-z0-9])([A-Z])")
+_TERM_PATTERN = re.compile(r"[a-z0-9]+|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """切分检索词：英文按驼峰、下划线与非字母数字字符切分并转小写，中文取单字与相邻双字。"""
+    if not text:
+        return []
+    terms: List[str] = []
+    for run in _TERM_PATTERN.findall(_CAMEL_BOUNDARY.sub(r"\1 \2", text).lower()):
+        if run[0].isascii():
+            terms.append(run)
+            continue
+        terms.extend(run)
+        terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def latest_user_query(messages: Sequence[BaseMessage]) -> str:
+    """最近一条用户消息的文本，作为工具检索的查询。"""
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            if isinstance(message.content, str):
+                return message.content
+            return " ".join(
+                part if isinstance(part, str) else str(part.get("text", ""))
+                for part in message.content
+                if isinstance(part, (str, dict))
+            )
+    return ""
+
+
+def tool_search_text(tool: BaseTool) -> str:
+    """参与检索的文本：工具名（计两次以提高权重）、描述与参数名。"""
+    try:
+        arg_names = " ".join(tool.args)
+    except Exception:
+        arg_names = ""
+    return f"{tool.name} {tool.name} {tool.description or ''} {arg_names}"
+
+
+def tool_schema_tokens(tool: BaseTool) -> int:
+    """工具以 OpenAI function 格式发送给模型时的 Schema token 数（近似值）。"""
+    try:
+        schema = convert_to_openai_tool(tool)
+    except Exception:
+        schema = {"name": tool.name, "description": tool.description}
+    return count_tokens(json.dumps(schema, ensure_ascii=False, default=str))
+
+
+@dataclass
+class ToolSelectionStats:
+    """工具检索统计：发送的 Schema token 与全部绑定时相比节省的数量。"""
+
+    selections: int = 0
+    filtered_selections: int = 0  # 实际裁剪了工具集的次数
+    expansions: int = 0  # 模型请求了未提供的工具、回退为全部工具的次数
+    tools_available: int = 0
+    tools_selected: int = 0
+    schema_tokens_available: int = 0
+    schema_tokens_sent: int = 0
+
+    def record(self, selection: "ToolSelection") -> None:
+        self.selections += 1
+        self.filtered_selections += int(selection.filtered)
+        self.tools_available += selection.tools_available
+        self.tools_selected += len(selection.tools)
+        self.schema_tokens_available += selection.schema_tokens_available
+        self.schema_tokens_sent += selection.schema_tokens_sent
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["schema_tokens_saved"] = self.schema_tokens_available - self.schema_tokens_sent
+        data["schema_tokens_saved_ratio"] = (
+            data["schema_tokens_saved"] / self.schema_tokens_available if self.schema_tokens_available else 0.0
+        )
+        data["avg_tools_selected"] = self.tools_selected / self.selections if self.selections else 0.0
+        return data
+
+
+tool_selection_stats = ToolSelectionStats()
+
+
+@dataclass
+class ToolSelection:
+    """一次检索的结果：选中的工具（按相关度排序）及其 Schema token 数。"""
+
+    tools: List[BaseTool]
+    tools_available: int
+    schema_tokens_available: int
+    schema_tokens_sent: int
+
+    @property
+    def filtered(self) -> bool:
+        return len(self.tools) < self.tools_available
+
+    @property
+    def names(self) -> List[str]:
+        return [tool.name for tool in self.tools]
+
+
+@dataclass
+class _ToolDocument:
+    tool: BaseTool
+    term_freqs: Counter
+    length: int
+    schema_tokens: int
+
+
+class ToolIndex:
+    """工具的 BM25 倒排索引，按工具名称标识文档，支持增量增删。"""
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._documents: Dict[str, _ToolDocument] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}  # 检索词 -> {工具名: 词频}
+        self._total_length = 0
+        self._schema_tokens_total = 0
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, tool: BaseTool) -> None:
+        if tool.name in self._documents:
+            self.remove(tool.name)
+        term_freqs = Counter(tokenize(tool_search_text(tool)))
+        document = _ToolDocument(tool, term_freqs, sum(term_freqs.values()), tool_schema_tokens(tool))
+        self._documents[tool.name] = document
+        for term, freq in term_freqs.items():
+            self._postings.setdefault(term, {})[tool.name] = freq
+        self._total_length += document.length
+        self._schema_tokens_total += document.schema_tokens
+
+    def remove(self, tool_name: str) -> None:
+        document = self._documents.pop(tool_name, None)
+        if document is None:
+            return
+        for term in document.term_freqs:
+            posting = self._postings[term]
+            del posting[tool_name]
+            if not posting:
+                del self._postings[term]
+        self._total_length -= document.length
+        self._schema_tokens_total -= document.schema_tokens
+
+    def sync(self, tools: Iterable[BaseTool]) -> Tuple[int, int]:
+        """使索引与给定的工具列表一致，只处理新增、移除或被替换的工具。返回 (新增数, 移除数)。"""
+        tools_by_name = {tool.name: tool for tool in tools}
+        removed = [
+            name for name, document in self._documents.items()
+            if tools_by_name.get(name) is not document.tool
+        ]
+        for name in removed:
+            self.remove(name)
+        added = [tool for name, tool in tools_by_name.items() if name not in self._documents]
+        for tool in added:
+            self.add(tool)
+        return len(added), len(removed)
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[BaseTool, float]]:
+        """按 BM25 得分降序返回与查询相关的工具，不含得分为 0 的工具。"""
+        if not self._documents:
+            return []
+        document_count = len(self._documents)
+        avg_length = self._total_length / document_count or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (document_count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for name, freq in posting.items():
+                length = self._documents[name].length
+                norm = freq + self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[name] = scores.get(name, 0.0) + idf * freq * (self.k1 + 1) / norm
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [(self._documents[name].tool, score) for name, score in ranked]
+
+    def select(self, query: str, tools: Sequence[BaseTool], top_k: int) -> ToolSelection:
+        """从 tools（须已同步到索引）中挑选最多 top_k 个工具。
+
+        命中的工具按得分排序在前，不足 top_k 时按 tools 的顺序补齐；查询没有命中任何工具时
+        无法判断相关性，返回全部工具。
+        """
+        selected: List[BaseTool] = list(tools)
+        if 0 < top_k < len(tools):
+            ranked = [tool for tool, _ in self.search(query, top_k)]
+            if ranked:
+                chosen = {tool.name for tool in ranked}
+                selected = ranked + [tool for tool in tools if tool.name not in chosen][: top_k - len(ranked)]
+        return ToolSelection(
+            tools=selected,
+            tools_available=len(tools),
+            schema_tokens_available=self._schema_tokens_total,
+            schema_tokens_sent=sum(self._documents[tool.name].schema_tokens for tool in selected),
+        )
@@ -0,0 +1,108 @@
+"""智能体级工具注册表：合并本地工具、MCP 工具与代理工具，维护名称索引与绑定了工具的模型。
+
+bind_tools 每次调用都会把全部工具的 JSON Schema 重新序列化一遍，按名称查找工具时
+拼接列表再线性扫描也会随工具数增长。注册表按工具集指纹缓存这两者，工具集不变时
+每轮推理只做一次指纹比较。注册表同时维护工具检索索引（见 index.ToolIndex），
+按问题只绑定相关的工具时，各工具子集绑定的模型也一并缓存。
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
+from langchain_core.tools import BaseTool
+from loguru import logger
+
+from agentchat.core.tools.index import ToolIndex, ToolSelection
+
+ToolsetFingerprint = Tuple[int, ...]
+
+# 每个注册表缓存的工具子集绑定模型数量上限
+BOUND_SUBSET_CACHE_SIZE = 32
+
+
+def toolset_fingerprint(model: Any, *tool_groups: Sequence[BaseTool]) -> ToolsetFingerprint:
+    """由模型与各组工具的对象标识组成的指纹。
+
+    MCP 工具目录在缓存有效期内返回同一批工具对象，重新加载（过期或服务端通知工具变更）
+    后才是新对象，因此按对象标识比较即可发现工具集变化，无需序列化 Schema。
+    """
+    return (id(model), *(id(tool) for group in tool_groups for tool in group))
+
+
+class ToolRegistry:
+    """缓存合并后的工具列表、名称索引与绑定了工具的模型，工具集指纹变化时重建。"""
+
+    def __init__(self):
+        self._fingerprint: Optional[ToolsetFingerprint] = None
+        self._model: Optional[BaseChatModel] = None
+        self._tools: List[BaseTool] = []
+        self._tools_by_name: Dict[str, BaseTool] = {}
+        self._bound_model: Optional[Runnable] = None
+        self._bound_subsets: "OrderedDict[Tuple[str, ...], Runnable]" = OrderedDict()
+        self.index = ToolIndex()
+        # 指纹中的对象标识只在对象存活期间唯一，因此保留各工具组的引用（含被同名覆盖的工具）
+        self._tool_groups: List[List[BaseTool]] = []
+        self.rebuilds = 0
+
+    def sync(self, model: BaseChatModel, *tool_groups: Sequence[BaseTool]) -> bool:
+        """按给定的模型与工具组更新注册表，返回是否发生了重建。
+
+        同名工具以排在前面的工具组为准。绑定模型延迟到首次使用时构建。
+        """
+        fingerprint = toolset_fingerprint(model, *tool_groups)
+        if fingerprint == self._fingerprint:
+            return False
+
+        tools_by_name: Dict[str, BaseTool] = {}
+        for group in tool_groups:
+            for tool in group:
+                tools_by_name.setdefault(tool.name, tool)
+
+        self._model = model
+        self._tools = list(tools_by_name.values())
+        self._tools_by_name = tools_by_name
+        self._bound_model = None
+        self._bound_subsets.clear()
+        self.index.sync(self._tools)
+        self._tool_groups = [list(group) for group in tool_groups]
+        self._fingerprint = fingerprint
+        self.rebuilds += 1
+        logger.debug(f"Tool registry rebuilt with {len(self._tools)} tools")
+        return True
+
+    @property
+    def synced(self) -> bool:
+        return self._fingerprint is not None
+
+    @property
+    def tools(self) -> List[BaseTool]:
+        return self._tools
+
+    def get(self, tool_name: str) -> Optional[BaseTool]:
+        return self._tools_by_name.get(tool_name)
+
+    def select(self, query: str, top_k: int) -> ToolSelection:
+        """按问题从当前工具中检索最多 top_k 个相关工具（top_k 为 0 时返回全部工具）。"""
+        return self.index.select(query, self._tools, top_k)
+
+    def bound_model(self, tools: Optional[Sequence[BaseTool]] = None) -> Runnable:
+        """返回绑定了 tools（默认为当前全部工具）的模型；没有工具时返回原模型。"""
+        if self._model is None:
+            raise RuntimeError("ToolRegistry.sync must be called before bound_model")
+        if tools is None or len(tools) == len(self._tools):
+            if self._bound_model is None:
+                self._bound_model = self._model.bind_tools(self._tools) if self._tools else self._model
+            return self._bound_model
+
+        key = tuple(tool.name for tool in tools)
+        bound = self._bound_subsets.get(key)
+        if bound is None:
+            bound = self._model.bind_tools(list(tools)) if tools else self._model
+            self._bound_subsets[key] = bound
+            if len(self._bound_subsets) > BOUND_SUBSET_CACHE_SIZE:
+                self._bound_subsets.popitem(last=False)
+        else:
+            self._bound_subsets.move_to_end(key)
+        return bound
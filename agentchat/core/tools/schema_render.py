@@ -0,0 +1,252 @@
+"""工具 Schema 的紧凑渲染：把工具参数的 JSON Schema 渲染成函数签名形式，用于规划提示词。
+
+规划提示词原先直接嵌入 str(model_json_schema())：Python repr 形式，带有 title、$defs 等
+冗余字段，且每次规划都为每个工具重新生成 Schema。这里渲染为
+
+    get_weather(city: str, days: int=3) - 查询城市天气
+      city: 城市名称
+
+并按工具类型、名称、描述与参数 Schema（Pydantic 模型按类，MCP 工具按 Schema 内容）缓存结果，
+同时记录每个工具渲染后的 token 数，便于找出占用提示词最多的工具。
+"""
+
+import json
+import os
+import re
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel
+
+from agentchat.utils.tokens import count_tokens
+
+TOOL_SCHEMA_CACHE_SIZE = int(os.getenv("TOOL_SCHEMA_CACHE_SIZE", "1024"))
+# 工具描述与参数描述的最大字符数，超出部分截断
+TOOL_DESCRIPTION_CHARS = int(os.getenv("TOOL_DESCRIPTION_CHARS", "200"))
+PARAM_DESCRIPTION_CHARS = int(os.getenv("TOOL_PARAM_DESCRIPTION_CHARS", "80"))
+# 默认值的 JSON 表示超过该长度时不渲染
+MAX_DEFAULT_CHARS = 24
+# 嵌套对象展开的最大深度，更深的对象渲染为 dict
+MAX_NESTED_DEPTH = 2
+
+JSON_TYPE_NAMES = {
+    "string": "str",
+    "integer": "int",
+    "number": "float",
+    "boolean": "bool",
+    "object": "dict",
+    "array": "list",
+    "null": "None",
+}
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class ToolSchemaRenderStats:
+    """渲染缓存统计，以及按渲染后 token 数排序的工具列表。"""
+
+    hits: int = 0
+    misses: int = 0
+    entries: int = 0
+    tokens_total: int = 0
+    verbose_tokens_total: int = 0
+    top_tools: List[Dict[str, Any]] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        lookups = self.hits + self.misses
+        data["hit_rate"] = self.hits / lookups if lookups else 0.0
+        return data
+
+
+@dataclass(frozen=True)
+class RenderedToolSchema:
+    """一个工具的渲染结果及其 token 数。"""
+
+    name: str
+    text: str
+    tokens: int
+    verbose_tokens: int  # 以 str(JSON Schema) 形式嵌入时的 token 数，用于对比
+
+
+def shorten(text: Optional[str], limit: int) -> str:
+    """取第一段并合并空白，超过 limit 个字符时截断。"""
+    if not text:
+        return ""
+    text = _WHITESPACE.sub(" ", text.strip().split("\n\n", 1)[0])
+    return text if len(text) <= limit else text[: limit - 1].rstrip() + "…"
+
+
+def _render_type(schema: Any, defs: Dict[str, Any], depth: int = 0) -> str:
+    """把 JSON Schema 类型渲染为简短的类型表达式，如 str、list[int]、"a"|"b"、{x: int, y?: str}。"""
+    if not isinstance(schema, dict):
+        return "any"
+    if "$ref" in schema:
+        name = schema["$ref"].rsplit("/", 1)[-1]
+        target = defs.get(name)
+        return _render_type(target, defs, depth + 1) if target is not None and depth < MAX_NESTED_DEPTH else name
+    if "const" in schema:
+        return json.dumps(schema["const"], ensure_ascii=False)
+    if "enum" in schema:
+        return "|".join(json.dumps(value, ensure_ascii=False) for value in schema["enum"])
+    for key in ("anyOf", "oneOf"):
+        if key in schema:
+            variants = [_render_type(variant, defs, depth) for variant in schema[key]]
+            return "|".join(dict.fromkeys(variants))
+    if len(schema.get("allOf") or []) == 1:
+        return _render_type(schema["allOf"][0], defs, depth)
+
+    json_type = schema.get("type")
+    if isinstance(json_type, list):
+        return "|".join(_render_type({**schema, "type": item}, defs, depth) for item in json_type)
+    if json_type == "array":
+        items = schema.get("items")
+        return f"list[{_render_type(items, defs, depth)}]" if items else "list"
+    if json_type == "object" or (json_type is None and "properties" in schema):
+        properties = schema.get("properties")
+        if not properties or depth >= MAX_NESTED_DEPTH:
+            return "dict"
+        return "{" + ", ".join(_render_params(schema, defs, depth + 1)) + "}"
+    return JSON_TYPE_NAMES.get(json_type, json_type or "any")
+
+
+def _render_params(schema: Dict[str, Any], defs: Dict[str, Any], depth: int = 0) -> List[str]:
+    """渲染对象的各个字段：必填为 name: type，有默认值为 name: type=default，其余为 name?: type。"""
+    required = set(schema.get("required") or [])
+    params: List[str] = []
+    for name, prop in (schema.get("properties") or {}).items():
+        prop_type = _render_type(prop, defs, depth)
+        if name in required:
+            params.append(f"{name}: {prop_type}")
+            continue
+        default = None
+        if isinstance(prop, dict) and "default" in prop:
+            default = json.dumps(prop["default"], ensure_ascii=False, default=str)
+        if default is not None and len(default) <= MAX_DEFAULT_CHARS:
+            params.append(f"{name}: {prop_type}={default}")
+        else:
+            params.append(f"{name}?: {prop_type}")
+    return params
+
+
+def render_schema(name: str, description: Optional[str], schema: Dict[str, Any]) -> str:
+    """把工具名称、描述与参数 JSON Schema 渲染为签名行，参数描述逐行列在签名下方。"""
+    defs = {**(schema.get("definitions") or {}), **(schema.get("$defs") or {})}
+    lines = [f"{name}({', '.join(_render_params(schema, defs))})"]
+    summary = shorten(description, TOOL_DESCRIPTION_CHARS)
+    if summary:
+        lines[0] += f" - {summary}"
+    for param, prop in (schema.get("properties") or {}).items():
+        if not isinstance(prop, dict):
+            continue
+        param_description = shorten(prop.get("description"), PARAM_DESCRIPTION_CHARS)
+        if param_description:
+            lines.append(f"  {param}: {param_description}")
+    return "\n".join(lines)
+
+
+def _tool_json_schema(tool: BaseTool) -> Dict[str, Any]:
+    """模型可见的参数 JSON Schema（不含 InjectedToolArg 等注入参数）。"""
+    try:
+        schema = tool.tool_call_schema
+    except Exception:
+        schema = getattr(tool, "args_schema", None)
+    if isinstance(schema, BaseModel):
+        schema = type(schema)
+    if isinstance(schema, type) and issubclass(schema, BaseModel):
+        return schema.model_json_schema()
+    if isinstance(schema, dict):
+        return schema
+    if schema is not None and hasattr(schema, "schema"):
+        # pydantic v1 模型
+        return schema.schema()
+    return {}
+
+
+def _schema_cache_key(tool: BaseTool) -> Tuple[Hashable, ...]:
+    """缓存键：Pydantic 参数模型按类区分，字典形式的 Schema（MCP 工具）按内容区分。"""
+    schema = getattr(tool, "args_schema", None)
+    if isinstance(schema, dict):
+        schema_key: Hashable = json.dumps(schema, sort_keys=True, ensure_ascii=False, default=str)
+    elif isinstance(schema, BaseModel):
+        schema_key = type(schema)
+    else:
+        schema_key = schema
+    return type(tool), tool.name, tool.description, schema_key
+
+
+class ToolSchemaRenderer:
+    """带 LRU 缓存的工具 Schema 渲染器，同一工具（类与 Schema 未变）只渲染一次。"""
+
+    def __init__(self, max_size: int = TOOL_SCHEMA_CACHE_SIZE):
+        self.max_size = max_size
+        self._cache: "OrderedDict[Tuple[Hashable, ...], RenderedToolSchema]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, tool: BaseTool) -> RenderedToolSchema:
+        try:
+            key = _schema_cache_key(tool)
+            hash(key)
+        except TypeError:
+            # args_schema 不可哈希时不缓存
+            return self._render(tool)
+
+        rendered = self._cache.get(key)
+        if rendered is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return rendered
+
+        self.misses += 1
+        rendered = self._render(tool)
+        self._cache[key] = rendered
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return rendered
+
+    @staticmethod
+    def _render(tool: BaseTool) -> RenderedToolSchema:
+        schema = _tool_json_schema(tool)
+        text = render_schema(tool.name, tool.description, schema)
+        return RenderedToolSchema(
+            name=tool.name,
+            text=text,
+            tokens=count_tokens(text),
+            verbose_tokens=count_tokens(str(schema)),
+        )
+
+    def report(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """已渲染工具的 token 数，按渲染后的 token 数降序排列（同名工具取最近一次渲染）。"""
+        latest: Dict[str, RenderedToolSchema] = {}
+        for rendered in self._cache.values():
+            latest.pop(rendered.name, None)
+            latest[rendered.name] = rendered
+        ranked = sorted(latest.values(), key=lambda rendered: rendered.tokens, reverse=True)
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [
+            {key: value for key, value in asdict(rendered).items() if key != "text"} for rendered in ranked
+        ]
+
+    def stats(self, top: int = 20) -> ToolSchemaRenderStats:
+        tools = self.report()
+        return ToolSchemaRenderStats(
+            hits=self.hits,
+            misses=self.misses,
+            entries=len(self._cache),
+            tokens_total=sum(item["tokens"] for item in tools),
+            verbose_tokens_total=sum(item["verbose_tokens"] for item in tools),
+            top_tools=tools[:top],
+        )
+
+
+tool_schema_renderer = ToolSchemaRenderer()
+
+
+def render_tool_schema(tool: BaseTool) -> str:
+    """返回工具的紧凑签名文本（带缓存）。"""
+    return tool_schema_renderer.render(tool).text
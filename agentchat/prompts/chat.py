@@ -113,9 +113,11 @@ You are an inference assistant responsible for creating tool call flows. Based o
 ## Output Requirements
 - The format must be a pure JSON string, ensuring that it can be successfully parsed using `json.loads(response)`. No redundant content (such as ```json`) should be added.
 - The content must include multiple processes, with each process using "Process X" as the key and a list of tool call reasoning information as the value (a process can include multiple parallel tool calls).
+- Next to the processes, output one top-level "dependencies" key (never inside a tool call element): an object mapping every "Process X" key to the list of earlier "Process X" keys whose results it uses. Use an empty list for a process that only needs the user question, so independent processes can run in parallel. A process must never depend on itself or on a later process.
 - Each element in the list must contain:
 - "tool_name": The name of the tool being called (selected from the provided tool information)
 - "tool_args": The required arguments for the tool (specifying their source, such as user question extraction, previous process results, etc.)
+  - When every argument value is already known from the user question, give "tool_args" as a JSON object keyed by the tool's parameter names (for example {"city": "Beijing"}), so the tool can be called directly. Only describe the arguments in text when a value comes from the result of an earlier step.
 - "message": Reasoning (explaining the reasoning behind the tool and its arguments, and its relationship to other tools/processes)
 
 ## User Question
@@ -213,4 +215,28 @@ You are a professional tool invocation expert, capable of executing tool invocat
 ## User-Provided Tool Invocation Information
 {plan_actions}
 
-"""
\ No newline at end of file
+"""
+
+CONVERSATION_SUMMARY_PROMPT = """
+You are maintaining a running summary of a conversation between a user and an AI assistant. The summary replaces the older messages in the assistant's context, so it must preserve everything needed to continue the conversation.
+
+## Core Tasks🎯
+- Merge the new messages into the current summary and output the updated summary.
+- Keep the user's goals, stated preferences, constraints, decisions, facts and figures, tool results that were relied on, and any open questions or pending tasks.
+- Drop greetings, filler and intermediate reasoning that no longer matters.
+
+## Output Requirements
+- Only output the updated summary as concise plain text, written in the language of the conversation.
+- Do not exceed {max_words} words.
+
+## Current Summary
+{summary}
+
+## New Messages
+{messages}
+"""
+
+CONVERSATION_SUMMARY_CONTEXT_PROMPT = """
+Summary of the earlier part of this conversation (the original messages are omitted):
+{summary}
+"""
@@ -56,6 +56,11 @@ class PlanToolFlow(BaseModel):
         ...,
         description="工具调用流程，键为步骤名（step_1/step_2...），值为该步骤的工具调用列表",
     )
+    dependencies: Optional[Dict[str, List[str]]] = Field(
+        None,
+        description="步骤依赖关系，键为步骤名，值为该步骤需要使用其结果的前置步骤名列表；"
+                    "空列表表示可与其他步骤并行执行，未列出的步骤视为依赖之前的全部步骤",
+    )
 
 
 class EnhancedPlanFlow(BaseModel):
@@ -7,6 +7,35 @@ class ModelConfig(BaseModel):
     base_url: str = ""
 
 
+class LLMClientConfig(BaseModel):
+    """HTTP connection pool shared by the chat model clients of one base_url."""
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    timeout: float = 120.0
+    http2: bool = True
+
+
+class LLMCacheConfig(BaseModel):
+    """Opt-in exact-match cache of chat model responses, stored in a local SQLite file."""
+
+    enabled: bool = False
+    path: str = "data/llm_cache.sqlite3"
+    max_entries: int = 10000
+    max_size_mb: int = 256
+    ttl: float = 86400.0  # seconds; 0 keeps entries until evicted
+
+
+class SandboxConfig(BaseModel):
+    """Execution mode of the CodeAct sandbox and limits of its worker pool."""
+
+    mode: str = "subprocess"  # subprocess | pool
+    pool_size: int = 2
+    max_executions: int = 100
+    max_memory_mb: int = 1024
+
+
 class MultiModels(BaseModel):
     """Minimal model settings needed by the agents and tools."""
 
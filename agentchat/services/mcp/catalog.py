@@ -0,0 +1,160 @@
+"""Process-wide cache of the LangChain tools loaded from MCP servers.
+
+Listing tools is a paginated round-trip to the server, yet the tool set of a
+server rarely changes. The catalog keeps the converted tools per connection
+config (see ``connection_fingerprint``) for a TTL, drops them early when the
+server sends ``notifications/tools/list_changed``, and lets concurrent cold-cache
+requests share a single list call.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from functools import partial
+from typing import Any
+
+from langchain_core.tools import BaseTool
+from mcp.types import ServerNotification, ToolListChangedNotification
+
+from agentchat.services.mcp.pool import MCPSessionPool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOOL_CACHE_TTL = 300.0
+
+ToolLoader = Callable[[], Awaitable[list[BaseTool]]]
+
+
+@dataclass
+class _CatalogEntry:
+    tools: list[BaseTool]
+    expires_at: float
+
+
+@dataclass
+class ToolCatalogStats:
+    """Counters describing how the tool catalog is being used."""
+
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    """Requests that joined an in-flight list call instead of issuing their own."""
+
+    invalidations: int = 0
+    list_changed_notifications: int = 0
+    entries: int = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        data = asdict(self)
+        lookups = self.hits + self.misses + self.coalesced
+        data["hit_rate"] = self.hits / lookups if lookups else 0.0
+        return data
+
+
+class MCPToolCatalog:
+    """TTL cache of converted MCP tools with single-flight loading."""
+
+    def __init__(self, ttl: float = DEFAULT_TOOL_CACHE_TTL) -> None:
+        self.ttl = ttl
+        self._entries: dict[tuple[int, str], _CatalogEntry] = {}
+        self._inflight: dict[tuple[int, str], asyncio.Task] = {}
+        self._generations: dict[tuple[int, str], int] = {}
+        self._watched: set[int] = set()
+        self._stats = ToolCatalogStats()
+
+    @staticmethod
+    def _key(fingerprint: str) -> tuple[int, str]:
+        # Cached tools borrow sessions from loop-bound pools, so entries are
+        # scoped to the running event loop as well.
+        return id(asyncio.get_running_loop()), fingerprint
+
+    async def get_tools(
+        self,
+        fingerprint: str,
+        loader: ToolLoader,
+        *,
+        ttl: float | None = None,
+    ) -> list[BaseTool]:
+        """Return the cached tools for ``fingerprint``, loading them on a miss.
+
+        Args:
+            fingerprint: Connection fingerprint identifying the server.
+            loader: Coroutine function listing and converting the server's tools.
+            ttl: Optional per-call TTL overriding the catalog default.
+
+        Returns:
+            A new list holding the cached tools.
+        """
+        key = self._key(fingerprint)
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > time.monotonic():
+            self._stats.hits += 1
+            return list(entry.tools)
+
+        task = self._inflight.get(key)
+        if task is None:
+            self._stats.misses += 1
+            task = asyncio.create_task(self._load(key, loader, self.ttl if ttl is None else ttl))
+            # Consume the exception if every waiter was cancelled.
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        else:
+            self._stats.coalesced += 1
+
+        # Shield the shared load so a cancelled waiter doesn't cancel it for the others.
+        return list(await asyncio.shield(task))
+
+    async def _load(self, key: tuple[int, str], loader: ToolLoader, ttl: float) -> list[BaseTool]:
+        generation = self._generations.get(key, 0)
+        try:
+            tools = await loader()
+        finally:
+            self._inflight.pop(key, None)
+
+        # Skip storing if the entry was invalidated while the list call was in flight.
+        if ttl > 0 and self._generations.get(key, 0) == generation:
+            self._entries[key] = _CatalogEntry(tools=tools, expires_at=time.monotonic() + ttl)
+        return tools
+
+    def invalidate(self, fingerprint: str | None = None) -> None:
+        """Drop the cached tools of one server, or of every server if None."""
+        if fingerprint is None:
+            keys = list(self._entries) + list(self._inflight)
+        else:
+            keys = [key for key in list(self._entries) + list(self._inflight) if key[1] == fingerprint]
+        for key in keys:
+            self._entries.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+        self._stats.invalidations += 1
+
+    def watch(self, pool: MCPSessionPool) -> None:
+        """Invalidate the pool's entry when its server announces a changed tool list."""
+        if id(pool) in self._watched:
+            return
+        self._watched.add(id(pool))
+        pool.add_notification_listener(partial(self._on_notification, pool.fingerprint))
+
+    def _on_notification(self, fingerprint: str, message: Any) -> None:
+        if isinstance(message, ServerNotification) and isinstance(message.root, ToolListChangedNotification):
+            self._stats.list_changed_notifications += 1
+            logger.info(f"MCP tool list changed, invalidating catalog entry {fingerprint}")
+            self.invalidate(fingerprint)
+
+    def stats(self) -> ToolCatalogStats:
+        self._stats.entries = len(self._entries)
+        return self._stats
+
+
+tool_catalog = MCPToolCatalog()
+
+
+__all__ = [
+    "DEFAULT_TOOL_CACHE_TTL",
+    "MCPToolCatalog",
+    "ToolCatalogStats",
+    "tool_catalog",
+]
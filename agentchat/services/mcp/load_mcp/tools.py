@@ -20,6 +20,7 @@ from mcp.types import CallToolResult, EmbeddedResource, ImageContent, TextConten
 from mcp.types import Tool as MCPTool
 from pydantic import BaseModel, create_model
 
+from agentchat.services.mcp.pool import MCPSessionPool
 from agentchat.services.mcp.sessions import Connection, create_session
 
 NonTextContent = ImageContent | EmbeddedResource
@@ -102,6 +103,7 @@ def convert_mcp_tool_to_langchain_tool(
     tool: MCPTool,
     *,
     connection: Connection | None = None,
+    session_pool: MCPSessionPool | None = None,
 ) -> BaseTool:
     """Convert an MCP tool to a LangChain tool.
 
@@ -112,19 +114,26 @@ def convert_mcp_tool_to_langchain_tool(
         tool: MCP tool to convert
         connection: Optional connection config to use to create a new session
                     if a `session` is not provided
+        session_pool: Optional session pool to borrow a session from
+                    if a `session` is not provided
 
     Returns:
         a LangChain tool
 
     """
-    if session is None and connection is None:
-        msg = "Either a session or a connection config must be provided"
+    if session is None and connection is None and session_pool is None:
+        msg = "Either a session, a session pool or a connection config must be provided"
         raise ValueError(msg)
 
     async def call_tool(
         **arguments: dict[str, Any],
     ) -> tuple[str | list[str], list[NonTextContent] | None]:
-        if session is None:
+        if session is None and session_pool is not None:
+            call_tool_result = await session_pool.run(
+                lambda pooled_session: pooled_session.call_tool(tool.name, arguments),
+                idempotent=False,
+            )
+        elif session is None:
             # If a session is not provided, we will create one on the fly
             async with create_session(connection) as tool_session:
                 await tool_session.initialize()
@@ -150,25 +159,32 @@ async def load_mcp_tools(
     session: ClientSession | None,
     *,
     connection: Connection | None = None,
+    session_pool: MCPSessionPool | None = None,
 ) -> list[BaseTool]:
     """Load all available MCP tools and convert them to LangChain tools.
 
     Args:
-        session: The MCP client session. If None, connection must be provided.
+        session: The MCP client session. If None, a session pool or a connection
+            must be provided.
         connection: Connection config to create a new session if session is None.
+        session_pool: Session pool to borrow sessions from if session is None.
+            Takes precedence over `connection`; the returned tools borrow from
+            the same pool when they are called.
 
     Returns:
         List of LangChain tools. Tool annotations are returned as part
         of the tool metadata object.
 
     Raises:
-        ValueError: If neither session nor connection is provided.
+        ValueError: If neither session, session pool nor connection is provided.
     """
-    if session is None and connection is None:
-        msg = "Either a session or a connection config must be provided"
+    if session is None and connection is None and session_pool is None:
+        msg = "Either a session, a session pool or a connection config must be provided"
         raise ValueError(msg)
 
-    if session is None:
+    if session is None and session_pool is not None:
+        tools = await session_pool.run(_list_all_tools)
+    elif session is None:
         # If a session is not provided, we will create one on the fly
         async with create_session(connection) as tool_session:
             await tool_session.initialize()
@@ -177,7 +193,9 @@ async def load_mcp_tools(
         tools = await _list_all_tools(session)
 
     return [
-        convert_mcp_tool_to_langchain_tool(session, tool, connection=connection)
+        convert_mcp_tool_to_langchain_tool(
+            session, tool, connection=connection, session_pool=session_pool
+        )
         for tool in tools
     ]
 
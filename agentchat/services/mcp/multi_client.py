@@ -15,8 +15,15 @@ from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.tools import BaseTool
 from mcp import ClientSession
 
+from agentchat.services.mcp.catalog import tool_catalog
 from agentchat.services.mcp.load_mcp.prompts import load_mcp_prompt
 from agentchat.services.mcp.load_mcp.resources import load_mcp_resources
+from agentchat.services.mcp.pool import (
+    MCPSessionPool,
+    SessionPoolConfig,
+    connection_fingerprint,
+    get_session_pool,
+)
 from agentchat.services.mcp.sessions import (
     Connection,
     McpHttpClientFactory,
@@ -45,14 +52,33 @@ class MultiServerMCPClient:
     Loads LangChain-compatible tools, prompts and resources from MCP servers.
     """
 
-    def __init__(self, connections: dict[str, Connection] | None = None) -> None:
+    def __init__(
+        self,
+        connections: dict[str, Connection] | None = None,
+        *,
+        use_session_pool: bool = True,
+        pool_config: SessionPoolConfig | None = None,
+        cache_tools: bool = True,
+        tool_cache_ttl: float | None = None,
+    ) -> None:
         """Initialize a MultiServerMCPClient with MCP servers connections.
 
         Args:
             connections: A dictionary mapping server names to connection configurations.
                 If None, no initial connections are established.
-
-        Example: basic usage (starting a new session on each tool call)
+            use_session_pool: Whether tools, prompts and resources borrow long-lived
+                sessions from a per-server pool. If False, a new session is started
+                for every call.
+            pool_config: Sizing and lifecycle settings used when a server's pool is
+                created. Pools are shared process-wide per connection config, so the
+                first client to create a pool decides its settings.
+            cache_tools: Whether `get_tools` is served from the process-wide tool
+                catalog, which is shared by every client connecting to the same
+                server and invalidated when the server reports a changed tool list.
+            tool_cache_ttl: Optional TTL (in seconds) for cached tools, overriding
+                the catalog default.
+
+        Example: basic usage (borrowing pooled sessions on each tool call)
 
         ```python
         from mars_agent.core.mcp.client import MultiServerMCPClient
@@ -91,6 +117,26 @@ class MultiServerMCPClient:
         self.connections: dict[str, Connection] = (
             connections if connections is not None else {}
         )
+        self.use_session_pool = use_session_pool
+        self.pool_config = pool_config
+        self.cache_tools = cache_tools
+        self.tool_cache_ttl = tool_cache_ttl
+
+    def _get_connection(self, server_name: str) -> Connection:
+        if server_name not in self.connections:
+            msg = (
+                f"Couldn't find a server with name '{server_name}', "
+                f"expected one of '{list(self.connections.keys())}'"
+            )
+            raise ValueError(msg)
+        return self.connections[server_name]
+
+    def get_session_pool(self, server_name: str) -> MCPSessionPool | None:
+        """Return the session pool of a server, or None if pooling is disabled."""
+        connection = self._get_connection(server_name)
+        if not self.use_session_pool:
+            return None
+        return get_session_pool(connection, self.pool_config)
 
     @asynccontextmanager
     async def session(
@@ -112,18 +158,58 @@ class MultiServerMCPClient:
             An initialized ClientSession
 
         """
-        if server_name not in self.connections:
-            msg = (
-                f"Couldn't find a server with name '{server_name}', "
-                f"expected one of '{list(self.connections.keys())}'"
-            )
-            raise ValueError(msg)
-
-        async with create_session(self.connections[server_name]) as session:
+        async with create_session(self._get_connection(server_name)) as session:
             if auto_initialize:
                 await session.initialize()
             yield session
 
+    @asynccontextmanager
+    async def pooled_session(self, server_name: str) -> AsyncIterator[ClientSession]:
+        """Borrow an initialized session from the server's pool.
+
+        Falls back to a new session when pooling is disabled.
+
+        Args:
+            server_name: Name to identify this server connection
+
+        Raises:
+            ValueError: If the server name is not found in the connections
+
+        Yields:
+            An initialized ClientSession
+
+        """
+        pool = self.get_session_pool(server_name)
+        if pool is None:
+            async with self.session(server_name) as session:
+                yield session
+            return
+
+        async with pool.session() as session:
+            yield session
+
+    async def _load_server_tools(self, server_name: str) -> list[BaseTool]:
+        connection = self._get_connection(server_name)
+        session_pool = self.get_session_pool(server_name)
+
+        async def load() -> list[BaseTool]:
+            return await load_mcp_tools(None, connection=connection, session_pool=session_pool)
+
+        if not self.cache_tools:
+            return await load()
+
+        if session_pool is not None:
+            tool_catalog.watch(session_pool)
+        return await tool_catalog.get_tools(
+            connection_fingerprint(connection), load, ttl=self.tool_cache_ttl
+        )
+
+    def invalidate_tools(self, server_name: str | None = None) -> None:
+        """Drop cached tools of one server (or of all servers of this client)."""
+        server_names = [server_name] if server_name is not None else list(self.connections)
+        for name in server_names:
+            tool_catalog.invalidate(connection_fingerprint(self._get_connection(name)))
+
     async def get_tools(self, *, server_name: str | None = None) -> list[BaseTool]:
         """Get a list of all tools from all connected servers.
 
@@ -131,27 +217,21 @@ class MultiServerMCPClient:
             server_name: Optional name of the server to get tools from.
                 If None, all tools from all servers will be returned (default).
 
-        NOTE: a new session will be created for each tool call
+        NOTE: tools borrow a pooled session for each tool call (or start a new
+        session if pooling is disabled). The tool list itself is served from the
+        shared tool catalog while it is fresh.
 
         Returns:
             A list of LangChain tools
 
         """
         if server_name is not None:
-            if server_name not in self.connections:
-                msg = (
-                    f"Couldn't find a server with name '{server_name}', "
-                    f"expected one of '{list(self.connections.keys())}'"
-                )
-                raise ValueError(msg)
-            return await load_mcp_tools(None, connection=self.connections[server_name])
+            return await self._load_server_tools(server_name)
 
         all_tools: list[BaseTool] = []
         load_mcp_tool_tasks = []
-        for connection in self.connections.values():
-            load_mcp_tool_task = asyncio.create_task(
-                load_mcp_tools(None, connection=connection)
-            )
+        for name in self.connections:
+            load_mcp_tool_task = asyncio.create_task(self._load_server_tools(name))
             load_mcp_tool_tasks.append(load_mcp_tool_task)
         tools_list = await asyncio.gather(*load_mcp_tool_tasks)
         for tools in tools_list:
@@ -166,7 +246,7 @@ class MultiServerMCPClient:
         arguments: dict[str, Any] | None = None,
     ) -> list[HumanMessage | AIMessage]:
         """Get a prompt from a given MCP server."""
-        async with self.session(server_name) as session:
+        async with self.pooled_session(server_name) as session:
             return await load_mcp_prompt(session, prompt_name, arguments=arguments)
 
     async def get_resources(
@@ -186,7 +266,7 @@ class MultiServerMCPClient:
             A list of LangChain Blobs
 
         """
-        async with self.session(server_name) as session:
+        async with self.pooled_session(server_name) as session:
             return await load_mcp_resources(session, uris=uris)
 
     async def __aenter__(self) -> "MultiServerMCPClient":
@@ -220,6 +300,7 @@ __all__ = [
     "McpHttpClientFactory",
     "MultiServerMCPClient",
     "SSEConnection",
+    "SessionPoolConfig",
     "StdioConnection",
     "StreamableHttpConnection",
     "WebsocketConnection",
@@ -0,0 +1,480 @@
+"""Long-lived, per-server MCP session pooling.
+
+Opening an MCP session means a transport connect (TCP/SSE/WebSocket or a child
+process for stdio) plus the ``initialize`` handshake. This module keeps a small
+pool of initialized sessions per connection config so that tool listing and tool
+calls can borrow an already connected session instead of paying that cost on
+every invocation.
+
+Pools are shared process-wide: two ``MultiServerMCPClient`` instances pointing at
+the same server (same connection config) borrow from the same pool.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, TypeVar
+
+import anyio
+import httpx
+from mcp import ClientSession
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+
+from agentchat.services.mcp.sessions import Connection, create_session
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+NotificationListener = Callable[[Any], None]
+
+TRANSPORT_ERRORS: tuple[type[BaseException], ...] = (
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+    httpx.TransportError,
+    ConnectionError,
+)
+"""Errors that mean the connection is unusable.
+
+``OSError`` is deliberately not listed: ``TimeoutError`` derives from it, and a
+timeout (waiting for a pooled session, or a slow tool) says nothing about the
+health of the connection.
+"""
+
+
+@dataclass
+class SessionPoolConfig:
+    """Sizing and lifecycle settings for an MCP session pool."""
+
+    min_size: int = 0
+    """Number of sessions that are never evicted for being idle."""
+
+    max_size: int = 4
+    """Maximum number of concurrently open sessions per server."""
+
+    idle_timeout: float = 300.0
+    """Seconds an idle session may stay open before it is evicted."""
+
+    health_check_interval: float = 30.0
+    """Sessions idle for longer than this are pinged before being handed out."""
+
+    health_check_timeout: float = 5.0
+    """Timeout for the health-check ping."""
+
+    acquire_timeout: float = 30.0
+    """How long a caller waits for a free session when the pool is exhausted."""
+
+    connect_timeout: float = 30.0
+    """Timeout for opening and initializing a new session."""
+
+
+@dataclass
+class SessionPoolStats:
+    """Counters describing how a session pool is being used."""
+
+    hits: int = 0
+    """Acquisitions served by an already open idle session."""
+
+    misses: int = 0
+    """Acquisitions that had to open a new session."""
+
+    waits: int = 0
+    """Acquisitions that had to wait because the pool was exhausted."""
+
+    wait_time_total: float = 0.0
+    wait_time_max: float = 0.0
+
+    opened: int = 0
+    closed: int = 0
+    evicted_idle: int = 0
+    health_check_failures: int = 0
+    reconnects: int = 0
+
+    in_use: int = 0
+    idle: int = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        data = asdict(self)
+        acquisitions = self.hits + self.misses
+        data["hit_rate"] = self.hits / acquisitions if acquisitions else 0.0
+        data["wait_time_avg"] = self.wait_time_total / self.waits if self.waits else 0.0
+        return data
+
+
+def is_transport_error(error: BaseException) -> bool:
+    """Return True if ``error`` means the underlying connection is unusable."""
+    if isinstance(error, McpError):
+        return error.error.code == CONNECTION_CLOSED
+    return isinstance(error, TRANSPORT_ERRORS)
+
+
+def connection_fingerprint(connection: Connection) -> str:
+    """Return a stable hash of a connection config (transport, URL/command, headers...)."""
+    normalized = {
+        key: value if isinstance(value, (str, int, float, bool, list, dict, type(None))) else repr(value)
+        for key, value in connection.items()
+    }
+    payload = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _connection_label(connection: Connection) -> str:
+    transport = connection.get("transport", "unknown")
+    target = connection.get("url") or connection.get("command") or ""
+    return f"{transport}:{target}"
+
+
+class _PooledSession:
+    """A ClientSession kept open by a dedicated background task.
+
+    The MCP transports are built on anyio task groups, which must be entered and
+    exited from the same task. Each pooled session therefore owns a runner task
+    that opens the session, waits until it is asked to close, and then exits the
+    context managers itself.
+    """
+
+    def __init__(self, connection: Connection) -> None:
+        self._connection = connection
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._error: BaseException | None = None
+
+        self.session: ClientSession | None = None
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+
+    @property
+    def alive(self) -> bool:
+        return (
+            self.session is not None
+            and self._task is not None
+            and not self._task.done()
+            and not self._closing.is_set()
+        )
+
+    async def open(self, timeout: float) -> ClientSession:
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+        except BaseException:
+            await self.close()
+            raise
+        if self._error is not None:
+            raise self._error
+        return self.session
+
+    async def _run(self) -> None:
+        try:
+            async with create_session(self._connection) as session:
+                await session.initialize()
+                self.session = session
+                self._ready.set()
+                await self._closing.wait()
+        except Exception as err:  # noqa: BLE001
+            if not self._ready.is_set():
+                self._error = err
+            else:
+                logger.info(f"Pooled MCP session closed by transport: {err!r}")
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def close(self, timeout: float = 5.0) -> None:
+        self._closing.set()
+        if self._task is None or self._task.done():
+            return
+        done, _ = await asyncio.wait({self._task}, timeout=timeout)
+        if not done:
+            self._task.cancel()
+            try:
+                await self._task
+            except BaseException:  # noqa: BLE001
+                pass
+
+
+class MCPSessionPool:
+    """Pool of initialized MCP sessions for a single server connection."""
+
+    def __init__(self, connection: Connection, config: SessionPoolConfig | None = None) -> None:
+        self.connection = connection
+        self.config = config or SessionPoolConfig()
+        self.fingerprint = connection_fingerprint(connection)
+        self.label = _connection_label(connection)
+
+        self._idle: list[_PooledSession] = []
+        self._size = 0
+        self._cond = asyncio.Condition()
+        self._closed = False
+        self._listeners: list[NotificationListener] = []
+        self._stats = SessionPoolStats()
+
+    # --- notifications ---
+
+    def add_notification_listener(self, listener: NotificationListener) -> None:
+        """Register a callback invoked with every server notification of pooled sessions."""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    async def _handle_message(self, message: Any) -> None:
+        for listener in list(self._listeners):
+            try:
+                listener(message)
+            except Exception as err:  # noqa: BLE001
+                logger.warning(f"MCP notification listener failed: {err!r}")
+
+    def _session_connection(self) -> Connection:
+        connection = dict(self.connection)
+        session_kwargs = dict(connection.get("session_kwargs") or {})
+        user_handler = session_kwargs.get("message_handler")
+
+        async def message_handler(message: Any) -> None:
+            await self._handle_message(message)
+            if user_handler is not None:
+                await user_handler(message)
+
+        session_kwargs["message_handler"] = message_handler
+        connection["session_kwargs"] = session_kwargs
+        return connection
+
+    # --- lifecycle ---
+
+    async def warm_up(self) -> None:
+        """Open sessions until ``min_size`` sessions are available."""
+        while True:
+            async with self._cond:
+                if self._closed or self._size >= self.config.min_size:
+                    return
+                self._size += 1
+            pooled = await self._open_session()
+            if pooled is None:
+                return
+            await self._release(pooled)
+
+    async def close(self) -> None:
+        """Close every idle session and reject further acquisitions."""
+        async with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        await self._close_sessions(idle)
+
+    def stats(self) -> SessionPoolStats:
+        self._stats.idle = len(self._idle)
+        self._stats.in_use = self._size - len(self._idle)
+        return self._stats
+
+    # --- borrowing ---
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[ClientSession]:
+        """Borrow an initialized session; it is returned to the pool on exit.
+
+        A session that raised a transport error (or whose use was cancelled) is
+        discarded instead of being returned.
+        """
+        pooled = await self._acquire()
+        discard = False
+        try:
+            yield pooled.session
+        except BaseException as err:
+            discard = isinstance(err, asyncio.CancelledError) or is_transport_error(err)
+            raise
+        finally:
+            await self._release(pooled, discard=discard)
+
+    async def run(
+        self,
+        operation: Callable[[ClientSession], Awaitable[T]],
+        *,
+        idempotent: bool = True,
+    ) -> T:
+        """Run ``operation`` with a borrowed session, reconnecting once on transport errors.
+
+        Operations that are not idempotent (tool calls) are only retried when the
+        error happened while acquiring or initializing the session, i.e. before the
+        request was sent. Once the request may have reached the server, a transport
+        error discards the session and is raised to the caller.
+        """
+        sent = False
+        try:
+            async with self.session() as session:
+                sent = True
+                return await operation(session)
+        except Exception as err:
+            if not is_transport_error(err) or (sent and not idempotent):
+                raise
+            self._stats.reconnects += 1
+            logger.warning(f"MCP transport error on {self.label}, reconnecting: {err!r}")
+
+        async with self.session() as session:
+            return await operation(session)
+
+    async def _acquire(self) -> _PooledSession:
+        start = time.monotonic()
+        deadline = start + self.config.acquire_timeout
+        waited = False
+
+        while True:
+            pooled: _PooledSession | None = None
+            create = False
+            async with self._cond:
+                while True:
+                    if self._closed:
+                        msg = f"MCP session pool for {self.label} is closed"
+                        raise RuntimeError(msg)
+
+                    expired = self._take_expired_locked()
+                    if expired:
+                        asyncio.create_task(self._close_sessions(expired))
+
+                    while self._idle:
+                        candidate = self._idle.pop()
+                        if candidate.alive:
+                            pooled = candidate
+                            break
+                        self._size -= 1
+                        asyncio.create_task(self._close_sessions([candidate]))
+                    if pooled is not None:
+                        break
+
+                    if self._size < self.config.max_size:
+                        self._size += 1
+                        create = True
+                        break
+
+                    waited = True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        msg = f"Timed out waiting for an MCP session for {self.label}"
+                        raise TimeoutError(msg)
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        continue
+
+            if create:
+                self._stats.misses += 1
+                pooled = await self._open_session(raise_errors=True)
+            elif not await self._check_health(pooled):
+                continue
+            else:
+                self._stats.hits += 1
+
+            if waited:
+                wait_time = time.monotonic() - start
+                self._stats.waits += 1
+                self._stats.wait_time_total += wait_time
+                self._stats.wait_time_max = max(self._stats.wait_time_max, wait_time)
+            return pooled
+
+    async def _open_session(self, raise_errors: bool = False) -> _PooledSession | None:
+        pooled = _PooledSession(self._session_connection())
+        try:
+            await pooled.open(timeout=self.config.connect_timeout)
+        except BaseException as err:
+            async with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            if raise_errors or not isinstance(err, Exception):
+                raise
+            logger.warning(f"Failed to open MCP session for {self.label}: {err!r}")
+            return None
+        self._stats.opened += 1
+        return pooled
+
+    async def _check_health(self, pooled: _PooledSession) -> bool:
+        if time.monotonic() - pooled.last_used_at < self.config.health_check_interval:
+            return True
+        try:
+            await asyncio.wait_for(pooled.session.send_ping(), timeout=self.config.health_check_timeout)
+            return True
+        except Exception as err:  # noqa: BLE001
+            self._stats.health_check_failures += 1
+            logger.info(f"MCP session health check failed for {self.label}: {err!r}")
+            await self._release(pooled, discard=True)
+            return False
+
+    async def _release(self, pooled: _PooledSession, *, discard: bool = False) -> None:
+        to_close = []
+        async with self._cond:
+            if discard or self._closed or not pooled.alive:
+                self._size -= 1
+                to_close.append(pooled)
+            else:
+                pooled.last_used_at = time.monotonic()
+                self._idle.append(pooled)
+            to_close.extend(self._take_expired_locked())
+            self._cond.notify()
+        if to_close:
+            asyncio.create_task(self._close_sessions(to_close))
+
+    def _take_expired_locked(self) -> list[_PooledSession]:
+        """Remove idle sessions past ``idle_timeout``, keeping at least ``min_size`` open."""
+        now = time.monotonic()
+        expired = []
+        # The idle list is LIFO, so the oldest sessions sit at the front.
+        while self._idle and self._size > self.config.min_size:
+            if now - self._idle[0].last_used_at < self.config.idle_timeout:
+                break
+            expired.append(self._idle.pop(0))
+            self._size -= 1
+            self._stats.evicted_idle += 1
+        return expired
+
+    async def _close_sessions(self, sessions: list[_PooledSession]) -> None:
+        for pooled in sessions:
+            await pooled.close()
+            self._stats.closed += 1
+
+
+_session_pools: dict[tuple[int, str], MCPSessionPool] = {}
+
+
+def get_session_pool(connection: Connection, config: SessionPoolConfig | None = None) -> MCPSessionPool:
+    """Return the process-wide pool for ``connection``, creating it on first use.
+
+    Pools are bound to the running event loop, so the registry is keyed by loop
+    as well as by connection fingerprint.
+    """
+    key = (id(asyncio.get_running_loop()), connection_fingerprint(connection))
+    pool = _session_pools.get(key)
+    if pool is None:
+        pool = MCPSessionPool(connection, config)
+        _session_pools[key] = pool
+    return pool
+
+
+def get_session_pool_stats() -> dict[str, dict[str, Any]]:
+    """Return usage statistics of every pool, keyed by ``transport:target``."""
+    return {pool.label: pool.stats().as_dict() for pool in _session_pools.values()}
+
+
+async def close_session_pools() -> None:
+    """Close all pools bound to the running event loop."""
+    loop_id = id(asyncio.get_running_loop())
+    for key in [key for key in _session_pools if key[0] == loop_id]:
+        pool = _session_pools.pop(key)
+        await pool.close()
+
+
+__all__ = [
+    "MCPSessionPool",
+    "SessionPoolConfig",
+    "SessionPoolStats",
+    "close_session_pools",
+    "connection_fingerprint",
+    "get_session_pool",
+    "get_session_pool_stats",
+    "is_transport_error",
+]
@@ -3,9 +3,23 @@ from agentchat.services.sandbox.pyodide import (
     PyodideSandboxTool,
     SyncPyodideSandbox,
 )
+from agentchat.services.sandbox.pool import (
+    PooledPyodideSandbox,
+    SandboxMode,
+    SandboxPoolConfig,
+    close_sandbox_pools,
+    create_sandbox,
+    get_sandbox_pool_stats,
+)
 
 __all__ = [
+    "PooledPyodideSandbox",
     "PyodideSandbox",
     "PyodideSandboxTool",
+    "SandboxMode",
+    "SandboxPoolConfig",
     "SyncPyodideSandbox",
+    "close_sandbox_pools",
+    "create_sandbox",
+    "get_sandbox_pool_stats",
 ]
\ No newline at end of file
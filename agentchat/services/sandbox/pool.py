@@ -0,0 +1,419 @@
+"""Pool of long-lived Pyodide worker processes for low-latency code execution.
+
+``PyodideSandbox`` starts a fresh Deno process per snippet, paying for Deno
+start-up, the Pyodide WASM load and package imports every time. The pool keeps
+a few ``pyodide_worker.ts`` processes alive with Pyodide loaded and talks to
+them over newline-delimited JSON on stdin/stdout (see the worker for the frame
+format). Each execution gets a fresh namespace and the worker restores the
+interpreter state it changed; a worker that reports state it could not restore
+is replaced. Workers are also recycled after a number of executions and evicted
+when their RSS grows past a limit.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import json
+import logging
+import time
+from collections import deque
+from collections.abc import Sequence
+from typing import Any, Literal
+from uuid import uuid4
+
+from agentchat.services.sandbox.pyodide import (
+    BasePyodideSandbox,
+    CodeExecutionResult,
+    PyodideSandbox,
+    build_request,
+    result_from_frame,
+)
+
+logger = logging.getLogger(__name__)
+
+SandboxMode = Literal["subprocess", "pool"]
+
+# Frames carry code, output and base64 session bytes on a single line.
+FRAME_LIMIT = 64 * 1024 * 1024
+
+
+class SandboxWorkerError(RuntimeError):
+    """Raised when a sandbox worker dies or speaks an unexpected protocol."""
+
+
+@dataclasses.dataclass
+class SandboxPoolConfig:
+    """Sizing and lifecycle limits of a sandbox worker pool."""
+
+    size: int = 2
+    """Maximum number of worker processes (and concurrent executions)."""
+
+    max_executions: int = 100
+    """Executions after which a worker is replaced by a fresh process."""
+
+    max_memory_mb: int = 1024
+    """RSS above which a worker is evicted after its current execution."""
+
+    startup_timeout: float = 120.0
+    """Seconds to wait for a new worker to load Pyodide."""
+
+
+@dataclasses.dataclass
+class SandboxPoolStats:
+    """Counters describing how a sandbox worker pool is being used."""
+
+    workers: int = 0
+    idle: int = 0
+    waiting: int = 0
+    executions: int = 0
+    workers_started: int = 0
+    workers_recycled: int = 0
+    memory_evictions: int = 0
+    state_evictions: int = 0
+    timeouts: int = 0
+    failures: int = 0
+    wait_time_total: float = 0.0
+    wait_time_max: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        data = dataclasses.asdict(self)
+        data["wait_time_avg"] = self.wait_time_total / self.executions if self.executions else 0.0
+        return data
+
+
+class _SandboxWorker:
+    """One Deno process running ``pyodide_worker.ts``."""
+
+    def __init__(self, process: asyncio.subprocess.Process) -> None:
+        self.process = process
+        self.executions = 0
+        self.reported_memory = 0
+        self._stderr: deque[str] = deque(maxlen=20)
+        self._stderr_task = asyncio.create_task(self._drain_stderr())
+
+    @classmethod
+    async def start(cls, command: Sequence[str], startup_timeout: float) -> _SandboxWorker:
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=FRAME_LIMIT,
+        )
+        worker = cls(process)
+        try:
+            await asyncio.wait_for(worker._read_frame(lambda frame: frame.get("type") == "ready"), startup_timeout)
+        except BaseException:
+            await worker.close()
+            raise
+        return worker
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    def memory_mb(self) -> float:
+        """Resident memory of the worker, from /proc when available."""
+        try:
+            with open(f"/proc/{self.process.pid}/status", encoding="ascii") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return self.reported_memory / (1024 * 1024)
+
+    async def execute(self, request: dict[str, Any]) -> dict[str, Any]:
+        self.process.stdin.write(json.dumps(request).encode("utf-8") + b"\n")
+        await self.process.stdin.drain()
+        frame = await self._read_frame(lambda item: item.get("id") == request["id"])
+        self.executions += 1
+        self.reported_memory = frame.get("memory") or self.reported_memory
+        return frame
+
+    async def _read_frame(self, matches) -> dict[str, Any]:
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                stderr = "\n".join(self._stderr)
+                msg = f"Sandbox worker exited with code {await self.process.wait()}: {stderr}"
+                raise SandboxWorkerError(msg)
+            try:
+                frame = json.loads(line)
+            except json.JSONDecodeError:
+                # Pyodide / Deno may print diagnostics to stdout; they are not frames.
+                logger.debug(f"Ignoring sandbox worker output: {line[:200]!r}")
+                continue
+            if isinstance(frame, dict) and frame.get("type") == "error":
+                raise SandboxWorkerError(frame.get("error", "Sandbox worker protocol error"))
+            if isinstance(frame, dict) and matches(frame):
+                return frame
+
+    async def _drain_stderr(self) -> None:
+        async for line in self.process.stderr:
+            self._stderr.append(line.decode("utf-8", errors="replace").rstrip())
+
+    async def close(self) -> None:
+        if self.alive:
+            self.process.kill()
+        await self.process.wait()
+        self._stderr_task.cancel()
+
+
+class SandboxWorkerPool:
+    """Bounded pool of warm Pyodide workers sharing one Deno command line."""
+
+    def __init__(self, command: Sequence[str], config: SandboxPoolConfig | None = None) -> None:
+        self.command = list(command)
+        self.config = config or SandboxPoolConfig()
+        self._slots = asyncio.Semaphore(self.config.size)
+        self._idle: deque[_SandboxWorker] = deque()
+        self._workers: set[_SandboxWorker] = set()
+        self._stats = SandboxPoolStats()
+        self._closed = False
+
+    async def warm_up(self, count: int | None = None) -> None:
+        """Start workers ahead of the first execution.
+
+        Like an execution, each starting worker holds a slot, so warming up while
+        executions are running never starts more than ``config.size`` processes;
+        workers are only started for slots that are free right now.
+        """
+        count = min(self.config.size, self.config.size if count is None else count)
+        reserved = 0
+        try:
+            while reserved < count - len(self._workers) and not self._slots.locked():
+                await self._slots.acquire()
+                reserved += 1
+            if not reserved:
+                return
+            workers = await asyncio.gather(*(self._start_worker() for _ in range(reserved)), return_exceptions=True)
+            for worker in workers:
+                if isinstance(worker, BaseException):
+                    logger.warning(f"Sandbox worker warm-up failed: {worker}")
+                elif self._closed:
+                    await self._retire(worker)
+                else:
+                    self._idle.append(worker)
+        finally:
+            for _ in range(reserved):
+                self._slots.release()
+
+    async def execute(self, request: dict[str, Any], timeout_seconds: float | None = None) -> dict[str, Any]:
+        """Run one request frame on an idle worker and return its result frame.
+
+        A worker that times out, fails or is cancelled mid-execution is killed,
+        since its interpreter state is unknown; the next request starts a new one.
+        So is a worker that asks to be recycled because the execution left state
+        behind that it could not reset (an imported extension module, installed
+        packages, running tasks).
+        """
+        worker = await self._acquire()
+        discard = True
+        try:
+            frame = await asyncio.wait_for(worker.execute(request), timeout_seconds)
+            discard = bool(frame.get("recycle"))
+            if discard:
+                self._stats.state_evictions += 1
+            return frame
+        except asyncio.TimeoutError:
+            self._stats.timeouts += 1
+            raise
+        except SandboxWorkerError:
+            self._stats.failures += 1
+            raise
+        finally:
+            self._stats.executions += 1
+            await self._release(worker, discard=discard)
+
+    async def _acquire(self) -> _SandboxWorker:
+        if self._closed:
+            msg = "Sandbox worker pool is closed"
+            raise SandboxWorkerError(msg)
+
+        started = time.monotonic()
+        self._stats.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._stats.waiting -= 1
+        waited = time.monotonic() - started
+        self._stats.wait_time_total += waited
+        self._stats.wait_time_max = max(self._stats.wait_time_max, waited)
+
+        try:
+            while self._idle:
+                worker = self._idle.popleft()
+                if worker.alive:
+                    return worker
+                await self._retire(worker)
+            return await self._start_worker()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def _release(self, worker: _SandboxWorker, *, discard: bool) -> None:
+        try:
+            if discard or not worker.alive or self._closed or len(self._workers) > self.config.size:
+                await self._retire(worker)
+            elif worker.executions >= self.config.max_executions:
+                self._stats.workers_recycled += 1
+                await self._retire(worker)
+            elif worker.memory_mb() > self.config.max_memory_mb:
+                self._stats.memory_evictions += 1
+                logger.info(f"Evicting sandbox worker {worker.process.pid} at {worker.memory_mb():.0f}MB RSS")
+                await self._retire(worker)
+            else:
+                self._idle.append(worker)
+        finally:
+            self._slots.release()
+
+    async def _start_worker(self) -> _SandboxWorker:
+        worker = await _SandboxWorker.start(self.command, self.config.startup_timeout)
+        self._workers.add(worker)
+        self._stats.workers_started += 1
+        return worker
+
+    async def _retire(self, worker: _SandboxWorker) -> None:
+        self._workers.discard(worker)
+        await worker.close()
+
+    def stats(self) -> SandboxPoolStats:
+        self._stats.workers = len(self._workers)
+        self._stats.idle = len(self._idle)
+        return self._stats
+
+    async def close(self) -> None:
+        self._closed = True
+        idle = list(self._idle)
+        self._idle.clear()
+        for worker in idle:
+            await self._retire(worker)
+
+
+_pools: dict[tuple[int, tuple[str, ...]], SandboxWorkerPool] = {}
+
+
+def get_sandbox_pool(command: Sequence[str], config: SandboxPoolConfig | None = None) -> SandboxWorkerPool:
+    """Return the pool for ``command`` on the running event loop, creating it if needed."""
+    key = (id(asyncio.get_running_loop()), tuple(command))
+    pool = _pools.get(key)
+    if pool is None:
+        pool = SandboxWorkerPool(command, config)
+        _pools[key] = pool
+    return pool
+
+
+def get_sandbox_pool_stats() -> list[dict[str, Any]]:
+    """Stats of every sandbox worker pool in the process."""
+    return [pool.stats().as_dict() for pool in _pools.values()]
+
+
+async def close_sandbox_pools() -> None:
+    """Kill the workers of every pool created on the running event loop."""
+    loop_id = id(asyncio.get_running_loop())
+    for key in [key for key in _pools if key[0] == loop_id]:
+        await _pools.pop(key).close()
+
+
+class PooledPyodideSandbox(BasePyodideSandbox):
+    """PyodideSandbox that executes code on a pool of warm worker processes.
+
+    Same interface as ``PyodideSandbox``; the Deno permissions of the sandbox
+    apply to the worker processes. ``memory_limit_mb`` is not applied per
+    execution because workers are shared; use ``pool_config.max_memory_mb``.
+    """
+
+    def __init__(self, *, pool_config: SandboxPoolConfig | None = None, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.pool_config = pool_config or SandboxPoolConfig()
+
+    def get_pool(self) -> SandboxWorkerPool:
+        return get_sandbox_pool(self._build_command(), self.pool_config)
+
+    async def warm_up(self, count: int | None = None) -> None:
+        await self.get_pool().warm_up(count)
+
+    async def execute(
+        self,
+        code: str,
+        *,
+        session_bytes: bytes | None = None,
+        session_metadata: dict | None = None,
+        timeout_seconds: float | None = None,
+        memory_limit_mb: int | None = None,  # noqa: ARG002
+    ) -> CodeExecutionResult:
+        """Execute Python code on a pooled worker.
+
+        Args:
+            code: The Python code to execute in the sandbox
+            session_bytes: Optional bytes containing session state
+            session_metadata: Optional metadata for session state
+            timeout_seconds: Maximum execution time in seconds
+            memory_limit_mb: Ignored, see the class docstring
+
+        Returns:
+            CodeExecutionResult containing execution results and metadata
+        """
+        start_time = time.time()
+        request = build_request(
+            code,
+            stateful=self.stateful,
+            session_bytes=session_bytes,
+            session_metadata=session_metadata,
+            request_id=uuid4().hex,
+        )
+
+        try:
+            frame = await self.get_pool().execute(request, timeout_seconds)
+        except asyncio.TimeoutError:
+            return CodeExecutionResult(
+                status="error",
+                execution_time=time.time() - start_time,
+                stderr=f"Execution timed out after {timeout_seconds} seconds",
+            )
+        except SandboxWorkerError as e:
+            return CodeExecutionResult(
+                status="error",
+                execution_time=time.time() - start_time,
+                stderr=str(e),
+            )
+
+        return result_from_frame(frame, time.time() - start_time)
+
+
+def create_sandbox(
+    mode: SandboxMode = "subprocess",
+    *,
+    pool_config: SandboxPoolConfig | None = None,
+    **kwargs: Any,
+) -> PyodideSandbox | PooledPyodideSandbox:
+    """Create an async sandbox for the given execution mode.
+
+    Args:
+        mode: "subprocess" starts one Deno process per execution; "pool" runs
+            code on warm, long-lived workers.
+        pool_config: Pool limits, only used in "pool" mode.
+        **kwargs: Sandbox options (permissions, stateful, ...).
+    """
+    if mode == "pool":
+        return PooledPyodideSandbox(pool_config=pool_config, **kwargs)
+    if mode == "subprocess":
+        return PyodideSandbox(**kwargs)
+    msg = f"Unknown sandbox mode: {mode}"
+    raise ValueError(msg)
+
+
+__all__ = [
+    "PooledPyodideSandbox",
+    "SandboxPoolConfig",
+    "SandboxMode",
+    "SandboxPoolStats",
+    "SandboxWorkerError",
+    "SandboxWorkerPool",
+    "close_sandbox_pools",
+    "create_sandbox",
+    "get_sandbox_pool",
+    "get_sandbox_pool_stats",
+]
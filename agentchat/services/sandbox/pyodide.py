@@ -1,11 +1,14 @@
 """Python wrapper that calls pyodide & deno for code execution."""
 
 import asyncio
+import base64
 import dataclasses
 import json
 import logging
 import subprocess
 import time
+import zlib
+from pathlib import Path
 from typing import Annotated, Any, Literal
 
 from langchain_core.callbacks import (
@@ -35,8 +38,73 @@ class CodeExecutionResult:
     session_bytes: bytes | None = None
 
 
-# Published package name
-PKG_NAME = "jsr:@langchain/pyodide-sandbox@0.0.4"
+# Deno script executing the code, shared with the worker pool. The request
+# (code and session state) is written to its stdin as one JSON line, so large
+# scripts and sessions are not bounded by the command-line length limit.
+WORKER_SCRIPT = Path(__file__).resolve().parent / "pyodide_worker.ts"
+
+# Session bytes are deflate-compressed and base64-encoded in transit; the
+# worker decompresses them with the web-standard DecompressionStream.
+SESSION_ENCODING = "deflate"
+SESSION_COMPRESSION_LEVEL = 1
+
+
+def encode_session_bytes(session_bytes: bytes) -> str:
+    """Encode session bytes for a request frame."""
+    return base64.b64encode(zlib.compress(session_bytes, SESSION_COMPRESSION_LEVEL)).decode("ascii")
+
+
+def decode_session_bytes(data: str | None, encoding: str | None) -> bytes | None:
+    """Decode the session bytes of a result frame."""
+    if not data:
+        return None
+    raw = base64.b64decode(data)
+    return zlib.decompress(raw) if encoding == SESSION_ENCODING else raw
+
+
+def build_request(
+    code: str,
+    *,
+    stateful: bool,
+    session_bytes: bytes | None = None,
+    session_metadata: dict | None = None,
+    request_id: str = "0",
+) -> dict[str, Any]:
+    """Build the request frame understood by ``pyodide_worker.ts``."""
+    return {
+        "id": request_id,
+        "code": code,
+        "stateful": stateful,
+        "sessionEncoding": SESSION_ENCODING,
+        "sessionBytes": encode_session_bytes(session_bytes) if session_bytes else None,
+        "sessionMetadata": session_metadata,
+    }
+
+
+def parse_result_frame(output: str, request_id: str = "0") -> dict[str, Any] | None:
+    """Find the result frame of ``request_id`` in the worker's stdout."""
+    for line in output.splitlines():
+        try:
+            frame = json.loads(line)
+        except json.JSONDecodeError:
+            # Pyodide / Deno may print diagnostics to stdout; they are not frames.
+            continue
+        if isinstance(frame, dict) and frame.get("type") == "result" and frame.get("id") == request_id:
+            return frame
+    return None
+
+
+def result_from_frame(frame: dict[str, Any], execution_time: float) -> CodeExecutionResult:
+    """Convert a worker result frame into a ``CodeExecutionResult``."""
+    return CodeExecutionResult(
+        status="success" if frame.get("success", False) else "error",
+        execution_time=execution_time,
+        stdout=frame.get("stdout") or None,
+        stderr=frame.get("stderr") or None,
+        result=frame.get("result"),
+        session_metadata=frame.get("sessionMetadata"),
+        session_bytes=decode_session_bytes(frame.get("sessionBytes"), frame.get("sessionEncoding")),
+    )
 
 
 def build_permission_flag(
@@ -196,20 +264,13 @@ class BasePyodideSandbox:
 
         self.permissions.append(f"--node-modules-dir={node_modules_dir}")
 
-    def _build_command(
-        self,
-        code: str,
-        *,
-        session_bytes: bytes | None = None,
-        session_metadata: dict | None = None,
-        memory_limit_mb: int | None = None,
-    ) -> list[str]:
-        """Build the Deno command with all necessary arguments.
+    def _build_command(self, *, memory_limit_mb: int | None = None) -> list[str]:
+        """Build the Deno command running the sandbox worker script.
+
+        The code and session state are not part of the command line; they are
+        sent to the process on stdin, see ``_build_input``.
 
         Args:
-            code: The Python code to execute
-            session_bytes: Optional session state bytes
-            session_metadata: Optional session metadata
             memory_limit_mb: Optional memory limit in MB
 
         Returns:
@@ -227,24 +288,38 @@ class BasePyodideSandbox:
         if memory_limit_mb is not None and memory_limit_mb > 0:
             cmd.append(f"--v8-flags=--max-old-space-size={memory_limit_mb}")
 
-        # Add the path to the JavaScript wrapper script
-        cmd.append(PKG_NAME)
+        # Add the path to the worker script
+        cmd.append(str(WORKER_SCRIPT))
 
-        # Add script path and code
-        cmd.extend(["-c", code])
+        return cmd
 
-        if self.stateful:
-            cmd.extend(["-s"])
+    def _build_input(
+        self,
+        code: str,
+        *,
+        session_bytes: bytes | None = None,
+        session_metadata: dict | None = None,
+    ) -> bytes:
+        """Build the stdin payload of a one-shot execution.
 
-        if session_bytes:
-            # Convert bytes to list of integers and then to JSON string
-            bytes_array = list(session_bytes)
-            cmd.extend(["-b", json.dumps(bytes_array)])
+        The worker executes the single request frame and exits when stdin is
+        closed.
 
-        if session_metadata:
-            cmd.extend(["-m", json.dumps(session_metadata)])
+        Args:
+            code: The Python code to execute
+            session_bytes: Optional session state bytes
+            session_metadata: Optional session metadata
 
-        return cmd
+        Returns:
+            The request frame as one newline-terminated JSON line
+        """
+        request = build_request(
+            code,
+            stateful=self.stateful,
+            session_bytes=session_bytes,
+            session_metadata=session_metadata,
+        )
+        return json.dumps(request).encode("utf-8") + b"\n"
 
 
 class PyodideSandbox(BasePyodideSandbox):
@@ -286,16 +361,17 @@ class PyodideSandbox(BasePyodideSandbox):
         result = None
         status: Literal["success", "error"] = "success"
 
-        cmd = self._build_command(
+        cmd = self._build_command(memory_limit_mb=memory_limit_mb)
+        payload = self._build_input(
             code,
             session_bytes=session_bytes,
             session_metadata=session_metadata,
-            memory_limit_mb=memory_limit_mb,
         )
 
         # Create and run the subprocess
         process = await asyncio.create_subprocess_exec(
             *cmd,
+            stdin=asyncio.subprocess.PIPE,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
         )
@@ -303,36 +379,27 @@ class PyodideSandbox(BasePyodideSandbox):
         try:
             # Wait for process with a timeout
             stdout_bytes, stderr_bytes = await asyncio.wait_for(
-                process.communicate(),
+                process.communicate(payload),
                 timeout=timeout_seconds,
             )
-            stdout = stdout_bytes.decode("utf-8", errors="replace")
-
-            if stdout:
-                # stdout encodes the full result from the sandbox.
-                # including stdout, stderr, and the json result.
-                full_result = json.loads(stdout)
-                stdout = full_result.get("stdout", None)
-                stderr = full_result.get("stderr", None)
-                result = full_result.get("result", None)
-                status = "success" if full_result.get("success", False) else "error"
-                session_metadata = full_result.get("sessionMetadata", None)
-                # Convert the Uint8Array to Python bytes
-                session_bytes_array = full_result.get("sessionBytes", None)
-                session_bytes = (
-                    bytes(session_bytes_array) if session_bytes_array else None
-                )
-            else:
-                stderr = stderr_bytes.decode("utf-8", errors="replace")
-                status = "error"
+            # stdout carries the worker's frames; the result frame holds the
+            # sandbox stdout, stderr, the json result and the session state.
+            frame = parse_result_frame(stdout_bytes.decode("utf-8", errors="replace"))
+            if frame is not None:
+                return result_from_frame(frame, time.time() - start_time)
+            stderr = stderr_bytes.decode("utf-8", errors="replace")
+            status = "error"
         except asyncio.TimeoutError:
             process.kill()
             await process.wait()
             status = "error"
             stderr = f"Execution timed out after {timeout_seconds} seconds"
         except asyncio.CancelledError:
-            # Optionally: log cancellation if needed
-            pass
+            # The caller gave up (e.g. the client disconnected): stop the Deno
+            # process instead of letting it run to completion in the background.
+            process.kill()
+            await process.wait()
+            raise
         end_time = time.time()
 
         return CodeExecutionResult(
@@ -382,20 +449,21 @@ class SyncPyodideSandbox(BasePyodideSandbox):
         stderr: str
         status: Literal["success", "error"]
 
-        cmd = self._build_command(
+        cmd = self._build_command(memory_limit_mb=memory_limit_mb)
+        payload = self._build_input(
             code,
             session_bytes=session_bytes,
             session_metadata=session_metadata,
-            memory_limit_mb=memory_limit_mb,
         )
 
         try:
             # Run the subprocess with timeout
             # Ignoring S603 for subprocess.run as the cmd is built safely.
-            # Untrusted input comes from `code` parameter, which should be
-            # escaped properly as we are **not** using shell=True.
+            # Untrusted input from the `code` parameter is sent on stdin and
+            # never becomes part of the command line.
             process = subprocess.run(  # noqa: S603
                 cmd,
+                input=payload,
                 capture_output=True,
                 text=False,  # Keep as bytes for proper decoding
                 timeout=timeout_seconds,
@@ -405,25 +473,13 @@ class SyncPyodideSandbox(BasePyodideSandbox):
             stdout_bytes = process.stdout
             stderr_bytes = process.stderr
 
-            stdout = stdout_bytes.decode("utf-8", errors="replace")
-
-            if stdout:
-                # stdout encodes the full result from the sandbox
-                # including stdout, stderr, and the json result
-                full_result = json.loads(stdout)
-                stdout = full_result.get("stdout", None)
-                stderr = full_result.get("stderr", None)
-                result = full_result.get("result", None)
-                status = "success" if full_result.get("success", False) else "error"
-                session_metadata = full_result.get("sessionMetadata", None)
-                # Convert the Uint8Array to Python bytes
-                session_bytes_array = full_result.get("sessionBytes", None)
-                session_bytes = (
-                    bytes(session_bytes_array) if session_bytes_array else None
-                )
-            else:
-                stderr = stderr_bytes.decode("utf-8", errors="replace")
-                status = "error"
+            # stdout carries the worker's frames; the result frame holds the
+            # sandbox stdout, stderr, the json result and the session state.
+            frame = parse_result_frame(stdout_bytes.decode("utf-8", errors="replace"))
+            if frame is not None:
+                return result_from_frame(frame, time.time() - start_time)
+            stderr = stderr_bytes.decode("utf-8", errors="replace")
+            status = "error"
 
         except subprocess.TimeoutExpired:
             status = "error"
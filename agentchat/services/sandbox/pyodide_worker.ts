@@ -0,0 +1,437 @@
+// Pyodide worker used by the sandbox (see pyodide.py and pool.py).
+//
+// Pyodide is loaded once at start-up; afterwards the worker executes code
+// snippets received over a newline-delimited JSON protocol:
+//
+//   stdout <- {"type": "ready"}                        once Pyodide is loaded
+//   stdin  -> {"id", "code", "stateful", "sessionEncoding"?, "sessionBytes"?,
+//              "sessionMetadata"?}
+//   stdout <- {"type": "result", "id", "success", "stdout", "stderr", "result",
+//              "sessionEncoding"?, "sessionBytes"?, "sessionMetadata"?, "memory",
+//              "recycle"?}
+//
+// The worker pool keeps the process alive across requests; one-shot
+// executions write a single request and close stdin, which ends the worker.
+//
+// Session bytes are base64-encoded dill pickles of the snippet namespace,
+// compressed when "sessionEncoding" is "deflate" (the reply uses the encoding
+// of the request).
+//
+// The interpreter is shared by every request the worker serves, so besides
+// running each snippet in a fresh globals dict the worker snapshots the state a
+// snippet can change and restores it afterwards: top-level attributes of every
+// loaded module (including builtins and sys), sys.modules, sys.path and the
+// import hooks, warning filters, os.environ, the working directory and files
+// created under the scratch directories. Library modules a snippet imports
+// (stdlib, loaded packages, extension modules) stay loaded so later snippets
+// find them warm; the modules a snippet imports directly are imported before the
+// snapshot, so changes to their attributes are undone as well. Modules defined
+// by the snippet itself are dropped. Some changes cannot be undone: installed
+// packages stay on the import path and background tasks keep running. In those
+// cases the reply carries "recycle": true and the pool replaces the worker.
+// In-place mutation of objects held by modules (e.g. appending to a
+// module-level list) is not detected; callers that need full isolation should
+// use one-shot executions.
+//
+// One-shot (subprocess) executions also run this script, in place of the
+// published jsr:@langchain/pyodide-sandbox CLI, which only takes the code and
+// session on the command line; the snapshot and restore are wasted there but
+// cost little next to loading Pyodide.
+
+import { loadPyodide, type PyodideInterface } from "npm:pyodide@0.27";
+
+interface Runtime {
+  pyodide: PyodideInterface;
+  // deno-lint-ignore no-explicit-any
+  helpers: Record<"dict" | "run" | "loadSession" | "dumpSession" | "preimport" | "snapshot" | "restore", any>;
+}
+
+type SessionEncoding = "deflate";
+
+interface ExecuteRequest {
+  id: string;
+  code: string;
+  stateful?: boolean;
+  sessionEncoding?: SessionEncoding | null;
+  sessionBytes?: string | null;
+  sessionMetadata?: Record<string, unknown> | null;
+}
+
+const PRELUDE = `
+import ast
+import asyncio
+import importlib
+import json
+import os
+import shutil
+import sys
+import warnings
+
+# Directories a snippet may write to; anything it creates there is deleted afterwards.
+_SANDBOX_SCRATCH_DIRS = ("/tmp", "/home")
+_SANDBOX_MISSING = object()
+
+
+async def _sandbox_run(code, namespace):
+    from pyodide.code import eval_code_async
+
+    result = await eval_code_async(code, namespace)
+    if result is None:
+        return None
+    try:
+        return json.dumps(result)
+    except (TypeError, ValueError):
+        return json.dumps(repr(result))
+
+
+def _sandbox_load_session(namespace, data):
+    import dill
+
+    namespace.update(dill.loads(data.to_bytes()))
+
+
+def _sandbox_dump_session(namespace):
+    import dill
+
+    state = {}
+    for name, value in namespace.items():
+        if name.startswith("__"):
+            continue
+        try:
+            dill.dumps(value)
+        except Exception:
+            continue
+        state[name] = value
+    return dill.dumps(state)
+
+
+def _sandbox_scratch_files():
+    paths = set()
+    for root in _SANDBOX_SCRATCH_DIRS:
+        for directory, dirnames, filenames in os.walk(root):
+            paths.update(os.path.join(directory, name) for name in dirnames + filenames)
+    return paths
+
+
+def _sandbox_import_dirs():
+    listing = {}
+    for entry in sys.path:
+        try:
+            listing[entry] = frozenset(os.listdir(entry or "."))
+        except OSError:
+            pass
+    return listing
+
+
+def _sandbox_tasks():
+    try:
+        return set(asyncio.all_tasks(asyncio.get_event_loop()))
+    except RuntimeError:
+        return set()
+
+
+def _sandbox_is_library(module):
+    """Whether a module comes with the interpreter or an installed package, not from the snippet."""
+    spec = getattr(module, "__spec__", None)
+    if spec is None:
+        return False
+    if spec.origin in ("built-in", "frozen"):
+        return True
+    locations = [spec.origin] if spec.has_location else list(spec.submodule_search_locations or [])
+    scratch = tuple(os.path.join(root, "") for root in _SANDBOX_SCRATCH_DIRS)
+    return bool(locations) and all(
+        isinstance(location, str) and not location.startswith(scratch) for location in locations
+    )
+
+
+def _sandbox_preimport(code):
+    """Import the modules the snippet imports before the state snapshot.
+
+    They stay loaded for later executions, and since the snapshot covers them,
+    attributes the snippet changes on them are restored.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module)
+    for name in sorted(names):
+        if name in sys.modules:
+            continue
+        try:
+            importlib.import_module(name)
+        except Exception:
+            # The snippet's own import reports the error.
+            pass
+
+
+def _sandbox_snapshot():
+    namespaces = {}
+    for name, module in sys.modules.items():
+        namespace = getattr(module, "__dict__", None)
+        if isinstance(namespace, dict):
+            namespaces[name] = (namespace, dict(namespace))
+    return {
+        "modules": dict(sys.modules),
+        "namespaces": namespaces,
+        "sys_lists": {name: list(getattr(sys, name)) for name in ("path", "meta_path", "path_hooks")},
+        "path_importer_cache": dict(sys.path_importer_cache),
+        "warning_filters": list(warnings.filters),
+        "environ": dict(os.environ),
+        "cwd": os.getcwd(),
+        "files": _sandbox_scratch_files(),
+        "import_dirs": _sandbox_import_dirs(),
+        "tasks": _sandbox_tasks(),
+    }
+
+
+def _sandbox_restore(snapshot):
+    """Undo the changes a snippet made; return False if the worker must be replaced."""
+    clean = True
+
+    # Library modules the snippet imported stay loaded (extension modules cannot
+    # be unloaded, and dropping the Python modules around them would leave two
+    # copies of their classes); modules defined by the snippet are dropped.
+    modules = snapshot["modules"]
+    added = {name: module for name, module in sys.modules.items() if name not in modules}
+    kept = {name for name, module in added.items() if _sandbox_is_library(module)}
+
+    # Module attributes next: this also rebinds sys.modules, sys.path, ... and
+    # the builtins if the snippet replaced them. A package keeps the attributes
+    # of its kept submodules, which the import system only sets on first import.
+    for module_name, (namespace, saved) in snapshot["namespaces"].items():
+        for key in [key for key in namespace if key not in saved]:
+            if f"{module_name}.{key}" not in kept:
+                del namespace[key]
+        for key, value in saved.items():
+            if namespace.get(key, _SANDBOX_MISSING) is not value:
+                namespace[key] = value
+
+    for name, module in added.items():
+        if name not in kept:
+            sys.modules.pop(name, None)
+        elif sys.modules.get(name) is not module:
+            sys.modules[name] = module
+    for name, module in modules.items():
+        if sys.modules.get(name) is not module:
+            sys.modules[name] = module
+
+    for name, saved in snapshot["sys_lists"].items():
+        getattr(sys, name)[:] = saved
+    sys.path_importer_cache.clear()
+    sys.path_importer_cache.update(snapshot["path_importer_cache"])
+    warnings.filters[:] = snapshot["warning_filters"]
+    warnings._filters_mutated()
+
+    environ = snapshot["environ"]
+    for key in [key for key in os.environ if key not in environ]:
+        del os.environ[key]
+    for key, value in environ.items():
+        if os.environ.get(key) != value:
+            os.environ[key] = value
+    os.chdir(snapshot["cwd"])
+
+    for path in sorted(_sandbox_scratch_files() - snapshot["files"], key=len, reverse=True):
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.lexists(path):
+            os.remove(path)
+
+    if _sandbox_import_dirs() != snapshot["import_dirs"]:
+        clean = False
+    for task in _sandbox_tasks() - snapshot["tasks"]:
+        if not task.done():
+            task.cancel()
+            clean = False
+    return clean
+`;
+
+const encoder = new TextEncoder();
+const quiet = { messageCallback: () => {} };
+
+async function writeFrame(frame: Record<string, unknown>): Promise<void> {
+  const data = encoder.encode(JSON.stringify(frame) + "\n");
+  let written = 0;
+  while (written < data.length) {
+    written += await Deno.stdout.write(data.subarray(written));
+  }
+}
+
+function encodeBase64(bytes: Uint8Array): string {
+  let binary = "";
+  for (let i = 0; i < bytes.length; i += 0x8000) {
+    binary += String.fromCharCode(...bytes.subarray(i, i + 0x8000));
+  }
+  return btoa(binary);
+}
+
+function decodeBase64(data: string): Uint8Array {
+  const binary = atob(data);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  return bytes;
+}
+
+async function transform(bytes: Uint8Array, stream: TransformStream<Uint8Array, Uint8Array>): Promise<Uint8Array> {
+  const output = new Blob([bytes]).stream().pipeThrough(stream);
+  return new Uint8Array(await new Response(output).arrayBuffer());
+}
+
+async function decodeSession(data: string, encoding?: SessionEncoding | null): Promise<Uint8Array> {
+  const bytes = decodeBase64(data);
+  return encoding ? await transform(bytes, new DecompressionStream(encoding)) : bytes;
+}
+
+async function encodeSession(bytes: Uint8Array, encoding?: SessionEncoding | null): Promise<string> {
+  return encodeBase64(encoding ? await transform(bytes, new CompressionStream(encoding)) : bytes);
+}
+
+async function* readLines(stream: ReadableStream<Uint8Array>): AsyncGenerator<string> {
+  const decoder = new TextDecoder();
+  let buffer = "";
+  for await (const chunk of stream) {
+    buffer += decoder.decode(chunk, { stream: true });
+    let newline: number;
+    while ((newline = buffer.indexOf("\n")) >= 0) {
+      yield buffer.slice(0, newline);
+      buffer = buffer.slice(newline + 1);
+    }
+  }
+  buffer += decoder.decode();
+  if (buffer) {
+    yield buffer;
+  }
+}
+
+let dillInstalled = false;
+
+async function ensureDill({ pyodide }: Runtime): Promise<void> {
+  if (dillInstalled) {
+    return;
+  }
+  const micropip = pyodide.pyimport("micropip");
+  try {
+    await micropip.install("dill");
+  } finally {
+    micropip.destroy();
+  }
+  // Import dill before the state snapshot, like the snippet's own imports (see _sandbox_preimport).
+  pyodide.pyimport("dill").destroy();
+  dillInstalled = true;
+}
+
+async function execute(runtime: Runtime, request: ExecuteRequest): Promise<Record<string, unknown>> {
+  const { pyodide, helpers } = runtime;
+  const stdout: string[] = [];
+  const stderr: string[] = [];
+  pyodide.setStdout({ batched: (line: string) => stdout.push(line) });
+  pyodide.setStderr({ batched: (line: string) => stderr.push(line) });
+
+  const namespace = helpers.dict();
+  namespace.set("__name__", "__main__");
+  const frame: Record<string, unknown> = { type: "result", id: request.id };
+  // deno-lint-ignore no-explicit-any
+  let snapshot: any = null;
+
+  try {
+    await pyodide.loadPackagesFromImports(request.code, quiet);
+    if (request.stateful) {
+      await ensureDill(runtime);
+    }
+    helpers.preimport(request.code);
+    snapshot = helpers.snapshot();
+    if (request.stateful) {
+      if (request.sessionBytes) {
+        helpers.loadSession(namespace, await decodeSession(request.sessionBytes, request.sessionEncoding));
+      }
+    }
+
+    const result = await helpers.run(request.code, namespace);
+    frame.success = true;
+    frame.result = result === undefined || result === null ? null : JSON.parse(result);
+
+    if (request.stateful) {
+      const dumped = helpers.dumpSession(namespace);
+      try {
+        frame.sessionBytes = await encodeSession(dumped.toJs(), request.sessionEncoding);
+        if (request.sessionEncoding) {
+          frame.sessionEncoding = request.sessionEncoding;
+        }
+      } finally {
+        dumped.destroy();
+      }
+      const now = new Date().toISOString();
+      frame.sessionMetadata = {
+        created: now,
+        ...(request.sessionMetadata ?? {}),
+        lastModified: now,
+      };
+    }
+  } catch (error) {
+    frame.success = false;
+    stderr.push(error instanceof Error ? error.message : String(error));
+  } finally {
+    namespace.destroy();
+    if (snapshot !== null) {
+      try {
+        if (!helpers.restore(snapshot)) {
+          frame.recycle = true;
+        }
+      } catch (error) {
+        frame.recycle = true;
+        stderr.push(`Sandbox state reset failed: ${error instanceof Error ? error.message : String(error)}`);
+      } finally {
+        snapshot.destroy();
+      }
+    }
+  }
+
+  frame.stdout = stdout.join("\n");
+  frame.stderr = stderr.join("\n");
+  frame.memory = Deno.memoryUsage().rss;
+  return frame;
+}
+
+async function main(): Promise<void> {
+  const pyodide = await loadPyodide();
+  await pyodide.loadPackage(["micropip"], quiet);
+  pyodide.runPython(PRELUDE);
+  const runtime: Runtime = {
+    pyodide,
+    helpers: {
+      dict: pyodide.globals.get("dict"),
+      run: pyodide.globals.get("_sandbox_run"),
+      loadSession: pyodide.globals.get("_sandbox_load_session"),
+      dumpSession: pyodide.globals.get("_sandbox_dump_session"),
+      preimport: pyodide.globals.get("_sandbox_preimport"),
+      snapshot: pyodide.globals.get("_sandbox_snapshot"),
+      restore: pyodide.globals.get("_sandbox_restore"),
+    },
+  };
+  await writeFrame({ type: "ready" });
+
+  for await (const line of readLines(Deno.stdin.readable)) {
+    if (!line.trim()) {
+      continue;
+    }
+    let request: ExecuteRequest;
+    try {
+      request = JSON.parse(line);
+    } catch (error) {
+      await writeFrame({ type: "error", error: `Invalid request frame: ${error}` });
+      continue;
+    }
+    await writeFrame(await execute(runtime, request));
+  }
+  // stdin closed: the caller is done with this worker.
+  Deno.exit(0);
+}
+
+await main();
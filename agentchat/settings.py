@@ -1,23 +1,41 @@
 import asyncio
+import inspect
 from pathlib import Path
 from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, List, Union
 
 import yaml
 from loguru import logger
 from pydantic.v1 import BaseSettings
 
-from agentchat.schema.common import MultiModels, ModelConfig, Tools
+from agentchat.schema.common import LLMCacheConfig, LLMClientConfig, MultiModels, ModelConfig, SandboxConfig, Tools
 
 class Settings(BaseSettings):
     """Minimal runtime configuration required to run the agents and built-in tools."""
 
     multi_models: MultiModels = MultiModels()
     tools: Tools = Tools()
+    llm_client: LLMClientConfig = LLMClientConfig()
+    llm_cache: LLMCacheConfig = LLMCacheConfig()
+    sandbox: SandboxConfig = SandboxConfig()
 
 
 app_settings = Settings()
 DEFAULT_CONFIG_PATH = Path(__file__).resolve().parent / "config.yaml"
 
+SettingsReloadCallback = Callable[[], Union[Awaitable[Any], Any]]
+_reload_callbacks: List[SettingsReloadCallback] = []
+
+
+def on_settings_reload(callback: SettingsReloadCallback) -> SettingsReloadCallback:
+    """Register a callback run after `initialize_app_settings` reloads the config.
+
+    Used by components that cache objects built from the settings (model
+    clients, shared agents) to drop them when the configuration changes.
+    """
+    _reload_callbacks.append(callback)
+    return callback
+
 async def initialize_app_settings(file_path: str = None):
     global app_settings
 
@@ -43,10 +61,25 @@ async def initialize_app_settings(file_path: str = None):
                     setattr(tools_config, tool_name, tool_config)
                 data['tools'] = tools_config
 
+            if 'llm_client' in data:
+                data['llm_client'] = LLMClientConfig(**(data['llm_client'] or {}))
+
+            if 'llm_cache' in data:
+                data['llm_cache'] = LLMCacheConfig(**(data['llm_cache'] or {}))
+
+            if 'sandbox' in data:
+                data['sandbox'] = SandboxConfig(**(data['sandbox'] or {}))
+
             for key, value in data.items():
                 setattr(app_settings, key, value)
     except Exception as e:
         logger.error(f"Yaml file loading error: {e}")
+        return
+
+    for callback in _reload_callbacks:
+        result = callback()
+        if inspect.isawaitable(result):
+            await result
 
 
 def load_settings(file_path: str = None):
@@ -0,0 +1,39 @@
+import re
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; fall back to a character heuristic
+    tiktoken = None
+
+DEFAULT_ENCODING = "cl100k_base"
+
+# CJK characters are roughly one token each; other text averages ~4 characters per token.
+CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(encoding_name: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, encoding_name: str = DEFAULT_ENCODING) -> int:
+    """Return the (approximate) number of tokens in `text`.
+
+    Uses tiktoken when it is installed, otherwise a fast heuristic that is good
+    enough for budgeting prompt context.
+    """
+    if not text:
+        return 0
+
+    encoding = _get_encoding(encoding_name)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+
+    cjk_count = len(CJK_PATTERN.findall(text))
+    return cjk_count + (len(text) - cjk_count + 3) // 4
@@ -0,0 +1,110 @@
+"""Agent 注册表：按 (模式, 工具集指纹) 复用已构建的智能体，避免每条消息重复创建模型与编译图。"""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from langchain_core.tools import BaseTool
+from loguru import logger
+
+from agentchat.core.agents.codeact_agent import CodeActAgent
+from agentchat.core.agents.mcp_agent import MCPAgent, MCPConfig
+from agentchat.core.agents.plan_execute_agent import PlanExecuteAgent
+from agentchat.core.agents.react_agent import ReactAgent
+from agentchat.core.models.manager import ModelManager
+from agentchat.settings import on_settings_reload
+from agentchat.tools import AgentTools
+
+WARM_UP_AGENT_MODES = ("react", "plan_execute", "codeact")
+
+AgentKey = Tuple[str, str]
+
+
+def toolset_fingerprint(tools: Sequence[BaseTool], mcp_servers: Optional[List[Dict[str, Any]]] = None) -> str:
+    """根据本地工具名称与 MCP 配置计算工具集指纹。"""
+    payload = {
+        "tools": sorted(getattr(tool, "name", str(tool)) for tool in tools),
+        "mcp_servers": mcp_servers or [],
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class AgentRegistry:
+    """缓存已构建的智能体实例，供所有请求共享。
+
+    每个 (agent_mode, 工具集指纹) 只构建一次：模型客户端、LangGraph 编译结果以及
+    CodeAct 的沙箱检查都在首次构建时完成，之后的请求只携带各自的消息状态。
+    共享实例不绑定用户身份（user_id 为 None），也不保存请求级的状态：本次运行所属的
+    用户由 agent_runner 通过 agentchat.core.context 传入，按用户注入的配置由智能体在
+    调用工具时以该用户向 user_config_provider 获取。
+    """
+
+    def __init__(self, tools: Sequence[BaseTool] = AgentTools):
+        self.tools = list(tools)
+        self._agents: Dict[AgentKey, Any] = {}
+        self._locks: Dict[AgentKey, asyncio.Lock] = {}
+
+    async def get_agent(self, agent_mode: str, mcp_servers: Optional[List[Dict[str, Any]]] = None) -> Any:
+        """返回指定模式与工具集的共享智能体，不存在时构建（并发请求只构建一次）。"""
+        key = (agent_mode, toolset_fingerprint(self.tools, mcp_servers))
+        agent = self._agents.get(key)
+        if agent is not None:
+            return agent
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            agent = self._agents.get(key)
+            if agent is None:
+                agent = await self._build_agent(agent_mode, mcp_servers or [])
+                self._agents[key] = agent
+                logger.info(f"Agent built and registered: mode={agent_mode}, toolset={key[1]}")
+        return agent
+
+    async def _build_agent(self, agent_mode: str, mcp_servers: List[Dict[str, Any]]) -> Any:
+        if agent_mode == "react":
+            agent = ReactAgent(
+                model=ModelManager.get_tool_invocation_model(), tools=self.tools, mcp_servers=mcp_servers
+            )
+            await agent._init_agent()
+            return agent
+
+        if agent_mode == "plan_execute":
+            return PlanExecuteAgent(user_id=None, tools=self.tools, mcp_servers=mcp_servers)
+
+        if agent_mode == "codeact":
+            # CodeActAgent 构造时会同步执行 `deno --version` 检查，放到线程中避免阻塞事件循环
+            agent = await asyncio.to_thread(
+                CodeActAgent, tools=self.tools, user_id=None, mcp_servers=mcp_servers
+            )
+            await agent.warm_up()
+            return agent
+
+        if agent_mode == "mcp":
+            if not mcp_servers:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="MCP agent requires configuration")
+            agent = MCPAgent(mcp_config=MCPConfig(**mcp_servers[0]), user_id=None)
+            await agent.init_mcp_agent()
+            return agent
+
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported agent mode")
+
+    async def warm_up(self, agent_modes: Sequence[str] = WARM_UP_AGENT_MODES) -> None:
+        """启动时预构建默认工具集的智能体；单个模式失败只记录日志，不影响启动。"""
+        for agent_mode in agent_modes:
+            try:
+                await self.get_agent(agent_mode)
+            except Exception as err:
+                logger.warning(f"Agent warm-up failed for mode {agent_mode}: {err}")
+
+    def clear(self) -> None:
+        """丢弃所有已构建的智能体（例如模型配置重新加载后）。"""
+        self._agents.clear()
+        self._locks.clear()
+
+
+agent_registry = AgentRegistry()
+# 模型配置重新加载后，已构建的 Agent 持有的是旧模型实例，需要一并丢弃
+on_settings_reload(agent_registry.clear)
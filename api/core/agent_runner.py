@@ -1,19 +1,58 @@
 """Agent 调度器：根据 agent_mode 分发到不同智能体实现。"""
 
+import asyncio
+from dataclasses import asdict, dataclass
 from typing import Any, AsyncGenerator, Dict, List, Optional
 
 from fastapi import HTTPException, status
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import BaseMessage, HumanMessage
 
-from agentchat.core.agents.codeact_agent import CodeActAgent
-from agentchat.core.agents.mcp_agent import MCPAgent, MCPConfig
-from agentchat.core.agents.plan_execute_agent import PlanExecuteAgent
-from agentchat.core.agents.react_agent import ReactAgent
+from agentchat.core.callbacks.events import AgentEvent
+from agentchat.core.context import set_current_user, user_scope
+from agentchat.core.models.cache import llm_cache_scope, set_llm_cache_scope
 from agentchat.core.models.manager import ModelManager
-from agentchat.tools import AgentTools
+from agentchat.utils.tokens import count_tokens
+from api.core.agent_registry import agent_registry
 
 SUPPORTED_AGENT_MODES = {"react", "plan_execute", "codeact", "mcp"}
 
+
+@dataclass
+class AgentRunStats:
+    """Agent 运行统计。
+
+    被取消的运行（客户端断开）节省的 token 按已完成运行的平均回复 token 数
+    减去取消前已生成的 token 数估算。
+    """
+
+    started: int = 0
+    completed: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    completed_output_tokens: int = 0
+    cancelled_output_tokens: int = 0  # 取消前已生成的回复 token
+    tokens_saved_estimate: int = 0
+
+    def avg_output_tokens(self) -> float:
+        return self.completed_output_tokens / self.completed if self.completed else 0.0
+
+    def record_completed(self, output_tokens: int) -> None:
+        self.completed += 1
+        self.completed_output_tokens += output_tokens
+
+    def record_cancelled(self, output_tokens: int) -> None:
+        self.cancelled += 1
+        self.cancelled_output_tokens += output_tokens
+        self.tokens_saved_estimate += max(round(self.avg_output_tokens()) - output_tokens, 0)
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["avg_output_tokens"] = self.avg_output_tokens()
+        return data
+
+
+agent_run_stats = AgentRunStats()
+
 def normalize_agent_mode(agent_mode: str) -> str:
     """Normalize legacy/variant agent mode names to canonical values."""
     if not agent_mode:
@@ -24,6 +63,11 @@ def normalize_agent_mode(agent_mode: str) -> str:
     return normalized
 
 
+def _build_messages(content: str, history: Optional[List[BaseMessage]] = None) -> List[BaseMessage]:
+    """历史消息在前，本轮用户消息在最后。"""
+    return [*(history or []), HumanMessage(content=content)]
+
+
 def _stringify_agent_result(result: Any) -> str:
     if isinstance(result, list):
         return "\n".join([getattr(msg, "content", str(msg)) for msg in result])
@@ -35,78 +79,77 @@ async def invoke_agent(
     content: str,
     user_id: str,
     mcp_servers: Optional[List[Dict[str, Any]]] = None,
+    history: Optional[List[BaseMessage]] = None,
 ) -> str:
-    """统一入口：根据模式创建对应 Agent 执行用户消息，返回最终回复。"""
+    """统一入口：从注册表取得对应模式的共享 Agent 执行用户消息，返回最终回复。
+
+    共享 Agent 不绑定用户，本次运行所属的用户通过 user_scope 传给 Agent（见 agentchat.core.context）。
+    """
     agent_mode = normalize_agent_mode(agent_mode)
     if agent_mode not in SUPPORTED_AGENT_MODES:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported agent mode")
 
-    if agent_mode == "react":
-        model = ModelManager.get_tool_invocation_model()
-        agent = ReactAgent(model=model, tools=AgentTools, mcp_servers=mcp_servers or [])
-        return await agent.ainvoke([HumanMessage(content=content)])
-
-    if agent_mode == "plan_execute":
-        agent = PlanExecuteAgent(user_id=user_id, tools=AgentTools, mcp_servers=mcp_servers or [])
-        return await agent.ainvoke([HumanMessage(content=content)])
-
-    if agent_mode == "codeact":
-        agent = CodeActAgent(tools=AgentTools, user_id=user_id, mcp_servers=mcp_servers or [])
-        return await agent.ainvoke([HumanMessage(content=content)])
-
-    if not mcp_servers:
+    if agent_mode == "mcp" and not mcp_servers:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="MCP agent requires configuration")
 
-    config = mcp_servers[0]
-    mcp_agent = MCPAgent(mcp_config=MCPConfig(**config), user_id=user_id)
-    await mcp_agent.init_mcp_agent()
-    result = await mcp_agent.ainvoke([HumanMessage(content=content)])
-
-    return _stringify_agent_result(result)
-
-
-async def invoke_agent_stream(
+    # 租约从取得 Agent 持续到运行结束：期间重载配置不会关闭本次运行所用模型的 HTTP 连接池
+    with ModelManager.lease():
+        agent = await agent_registry.get_agent(agent_mode, mcp_servers)
+        agent_run_stats.started += 1
+        try:
+            with user_scope(user_id), llm_cache_scope(agent_mode):
+                result = await agent.ainvoke(_build_messages(content, history))
+        except asyncio.CancelledError:
+            agent_run_stats.record_cancelled(0)
+            raise
+        except Exception:
+            agent_run_stats.failed += 1
+            raise
+
+    if agent_mode == "mcp":
+        result = _stringify_agent_result(result)
+    agent_run_stats.record_completed(count_tokens(str(result or "")))
+    return result
+
+
+async def invoke_agent_events(
     agent_mode: str,
     content: str,
     user_id: str,
     mcp_servers: Optional[List[Dict[str, Any]]] = None,
-) -> AsyncGenerator[str, None]:
-    """流式执行 Agent，按内容片段产出回复。"""
+    history: Optional[List[BaseMessage]] = None,
+) -> AsyncGenerator[AgentEvent, None]:
+    """以结构化事件流执行 Agent（token / tool_start / tool_end / plan / sandbox_output / done）。
+
+    消费方在 done 之前关闭生成器（客户端断开）会取消 Agent 的执行，计入取消统计。
+    """
     agent_mode = normalize_agent_mode(agent_mode)
     if agent_mode not in SUPPORTED_AGENT_MODES:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported agent mode")
 
-    if agent_mode == "react":
-        model = ModelManager.get_tool_invocation_model()
-        agent = ReactAgent(model=model, tools=AgentTools, mcp_servers=mcp_servers or [])
-        async for chunk in agent.astream([HumanMessage(content=content)]):
-            if chunk:
-                yield chunk
-        return
-
-    if agent_mode == "plan_execute":
-        agent = PlanExecuteAgent(user_id=user_id, tools=AgentTools, mcp_servers=mcp_servers or [])
-        async for chunk in agent.astream([HumanMessage(content=content)]):
-            if isinstance(chunk, dict):
-                content_piece = chunk.get("content")
-                if content_piece:
-                    yield content_piece
-            elif isinstance(chunk, str):
-                yield chunk
-        return
-
-    if agent_mode == "codeact":
-        agent = CodeActAgent(tools=AgentTools, user_id=user_id, mcp_servers=mcp_servers or [])
-        async for chunk in agent.astream([HumanMessage(content=content)]):
-            if isinstance(chunk, str):
-                yield chunk
-        return
-
-    if not mcp_servers:
+    if agent_mode == "mcp" and not mcp_servers:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="MCP agent requires configuration")
 
-    config = mcp_servers[0]
-    mcp_agent = MCPAgent(mcp_config=MCPConfig(**config), user_id=user_id)
-    await mcp_agent.init_mcp_agent()
-    result = await mcp_agent.ainvoke([HumanMessage(content=content)])
-    yield _stringify_agent_result(result)
+    with ModelManager.lease():
+        agent = await agent_registry.get_agent(agent_mode, mcp_servers)
+        agent_run_stats.started += 1
+        # 生成器可能在其他任务中被关闭，无法可靠地 reset，这里只设置：作用范围限于迭代该生成器的任务
+        set_current_user(user_id)
+        set_llm_cache_scope(agent_mode)
+        answer_chunks: List[str] = []
+        outcome: Optional[str] = None
+        try:
+            async for event in agent.astream_events(_build_messages(content, history)):
+                if event["type"] == "token":
+                    answer_chunks.append(event["content"])
+                elif event["type"] == "done":
+                    outcome = "completed"
+                    agent_run_stats.record_completed(count_tokens("".join(answer_chunks)))
+                yield event
+        except Exception:
+            outcome = "failed"
+            agent_run_stats.failed += 1
+            raise
+        finally:
+            if outcome is None:
+                agent_run_stats.record_cancelled(count_tokens("".join(answer_chunks)))
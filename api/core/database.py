@@ -1,30 +1,173 @@
-"""数据库核心模块：配置 SQLite 引擎、Session 工厂，以及统一的 DB 依赖。"""
+"""数据库核心模块：配置异步引擎、Session 工厂，以及统一的 DB 依赖。
 
+DATABASE_URL 使用常规的同步写法（如 sqlite:///...、postgresql://...），异步驱动据此推导：
+SQLite 使用 aiosqlite，PostgreSQL 使用 asyncpg；URL 中已指定驱动时保持不变。
+
+SQLite 在建立连接时应用 SQLITE_* 环境变量配置的性能参数（默认 WAL + synchronous=NORMAL），
+写事务通过 write_transaction 在进程内串行执行，避免并发写入争抢数据库写锁。
+"""
+
+import asyncio
 import os
-from sqlalchemy import create_engine, event
-from sqlalchemy.orm import declarative_base, sessionmaker
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Dict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Connection, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:////data/wdk/wdk_agent/database/wdk_agent.db")
+# 连接池大小：常驻连接数与高峰时允许额外创建的连接数
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+# SQLite 性能参数，置空表示不设置、沿用 SQLite 默认值
+# WAL 模式下读写互不阻塞；synchronous=NORMAL 在 WAL 下仍保证数据库一致性，仅在断电时可能丢失最近的提交
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-65536"),  # 负数表示 KiB，即 64MB
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", "268435456"),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+}
+
+
+def to_async_url(url: str) -> str:
+    """为未指定驱动的数据库 URL 补上对应的异步驱动。"""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername)
+    if driver is None:
+        return url
+    return parsed.set(drivername=f"{parsed.drivername}+{driver}").render_as_string(hide_password=False)
+
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def _engine_options(url: str) -> dict:
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # 内存数据库只能共享单个连接，不使用连接池参数
+        return {}
+    return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT}
+
+
+ASYNC_DATABASE_URL = to_async_url(DATABASE_URL)
+
+engine = create_async_engine(ASYNC_DATABASE_URL, pool_pre_ping=True, **_engine_options(ASYNC_DATABASE_URL))
+# 提交后不过期实例：提交后返回的 ORM 对象仍可直接读取属性，避免在异步上下文中触发隐式加载
+AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
-@event.listens_for(engine, "connect")
-def enable_foreign_keys(dbapi_connection, connection_record):
-    """启用 SQLite 外键约束，确保级联删除生效。"""
+IS_SQLITE = engine.dialect.name == "sqlite"
+IS_SQLITE_MEMORY = IS_SQLITE and make_url(ASYNC_DATABASE_URL).database in (None, "", ":memory:")
+
+
+@dataclass
+class DatabaseStats:
+    """数据库写入串行化与 SQLite 维护任务的统计。"""
+
+    writes: int = 0
+    contended_writes: int = 0  # 需要排队等待其他写事务的次数
+    write_wait_ms_total: float = 0.0
+    max_write_wait_ms: float = 0.0
+    write_hold_ms_total: float = 0.0
+    checkpoints: int = 0
+    checkpoint_failures: int = 0
+    wal_pages_checkpointed: int = 0
+    optimizes: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["avg_write_wait_ms"] = self.write_wait_ms_total / self.writes if self.writes else 0.0
+        data["avg_write_hold_ms"] = self.write_hold_ms_total / self.writes if self.writes else 0.0
+        return data
+
+
+database_stats = DatabaseStats()
+_write_lock = asyncio.Lock()
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """启用 SQLite 外键约束（确保级联删除生效），并应用 SQLITE_PRAGMAS 中的性能参数。"""
+    if not IS_SQLITE:
+        return
     cursor = dbapi_connection.cursor()
     cursor.execute("PRAGMA foreign_keys=ON")
+    for name, value in SQLITE_PRAGMAS.items():
+        # 内存数据库不支持 WAL
+        if not value or (name == "journal_mode" and IS_SQLITE_MEMORY):
+            continue
+        cursor.execute(f"PRAGMA {name}={value}")
     cursor.close()
 
 
-def get_db():
-    """FastAPI 依赖：提供一个生命周期内复用的数据库会话。"""
-    db = SessionLocal()
-    try:
+@asynccontextmanager
+async def write_transaction() -> AsyncIterator[None]:
+    """在进程内串行执行一个写事务（写入语句到 commit/rollback 之间的代码放在块内）。
+
+    SQLite 同一时刻只允许一个写事务，并发写入会在 busy_timeout 内反复重试甚至报
+    database is locked；在事件循环内排队可以让写事务按到达顺序依次执行，并保证
+    写事务只包住短小的写入，不跨越 Agent 流式执行等耗时操作。其他数据库不做限制。
+    """
+    if not IS_SQLITE:
+        yield
+        return
+
+    started = time.monotonic()
+    contended = _write_lock.locked()
+    async with _write_lock:
+        acquired = time.monotonic()
+        wait_ms = (acquired - started) * 1000
+        database_stats.writes += 1
+        database_stats.contended_writes += int(contended)
+        database_stats.write_wait_ms_total += wait_ms
+        database_stats.max_write_wait_ms = max(database_stats.max_write_wait_ms, wait_ms)
+        try:
+            yield
+        finally:
+            database_stats.write_hold_ms_total += (time.monotonic() - acquired) * 1000
+
+
+def upgrade_schema(connection: Connection) -> None:
+    """为已存在的表补齐新增的列与索引（create_all 只会创建缺失的表）。
+
+    仅处理可空列的新增与索引创建，足以覆盖向后兼容的表结构演进。
+    通过 AsyncConnection.run_sync 在事务内调用。
+    """
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.exec_driver_sql(
+                f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+            )
+
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+async def init_db() -> None:
+    """创建缺失的表并补齐表结构。"""
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.run_sync(upgrade_schema)
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """FastAPI 依赖：提供一个生命周期内复用的异步数据库会话。"""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,98 @@
+"""SQLite 后台维护：定期执行 WAL checkpoint 与 PRAGMA optimize。
+
+WAL 模式下提交先写入 -wal 文件，自动 checkpoint 只在提交时触发，长时间有读事务时
+WAL 文件会持续增长、拖慢读取；后台定期执行 PASSIVE checkpoint（不阻塞读写）将其回写主库。
+PRAGMA optimize 按需更新查询规划器统计信息，开销很小。
+"""
+
+import asyncio
+import os
+import time
+from typing import Optional
+
+from loguru import logger
+
+from api.core.database import IS_SQLITE, IS_SQLITE_MEMORY, database_stats, engine
+
+# 间隔为 0 表示关闭对应的维护操作
+SQLITE_CHECKPOINT_INTERVAL = float(os.getenv("SQLITE_CHECKPOINT_INTERVAL_S", "300"))
+SQLITE_OPTIMIZE_INTERVAL = float(os.getenv("SQLITE_OPTIMIZE_INTERVAL_S", "3600"))
+
+
+class SQLiteMaintenance:
+    """后台维护任务：按各自的间隔执行 checkpoint 与 optimize，关闭时再执行一次 optimize。"""
+
+    def __init__(
+        self,
+        checkpoint_interval: float = SQLITE_CHECKPOINT_INTERVAL,
+        optimize_interval: float = SQLITE_OPTIMIZE_INTERVAL,
+    ):
+        self.checkpoint_interval = checkpoint_interval
+        self.optimize_interval = optimize_interval
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return IS_SQLITE and not IS_SQLITE_MEMORY and (self.checkpoint_interval > 0 or self.optimize_interval > 0)
+
+    async def start(self) -> None:
+        if self._task is not None or not self.enabled:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"SQLite maintenance started, checkpoint={self.checkpoint_interval:.0f}s, "
+            f"optimize={self.optimize_interval:.0f}s"
+        )
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self.optimize_interval > 0:
+            await self.optimize()
+
+    async def checkpoint(self) -> None:
+        """执行一次 PASSIVE checkpoint，回写 WAL 中已提交的页。"""
+        try:
+            async with engine.connect() as connection:
+                result = await connection.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)")
+                busy, wal_pages, checkpointed = result.one()
+        except Exception as err:
+            database_stats.checkpoint_failures += 1
+            logger.warning(f"SQLite checkpoint failed: {err}")
+            return
+        database_stats.checkpoints += 1
+        database_stats.wal_pages_checkpointed += max(checkpointed, 0)
+        logger.debug(f"SQLite checkpoint: busy={busy}, wal_pages={wal_pages}, checkpointed={checkpointed}")
+
+    async def optimize(self) -> None:
+        try:
+            async with engine.connect() as connection:
+                await connection.exec_driver_sql("PRAGMA optimize")
+        except Exception as err:
+            logger.warning(f"SQLite optimize failed: {err}")
+            return
+        database_stats.optimizes += 1
+
+    async def _run(self) -> None:
+        now = time.monotonic()
+        next_checkpoint = now + self.checkpoint_interval if self.checkpoint_interval > 0 else None
+        next_optimize = now + self.optimize_interval if self.optimize_interval > 0 else None
+        while True:
+            deadline = min(t for t in (next_checkpoint, next_optimize) if t is not None)
+            await asyncio.sleep(max(deadline - time.monotonic(), 0))
+            now = time.monotonic()
+            if next_checkpoint is not None and now >= next_checkpoint:
+                await self.checkpoint()
+                next_checkpoint = now + self.checkpoint_interval
+            if next_optimize is not None and now >= next_optimize:
+                await self.optimize()
+                next_optimize = now + self.optimize_interval
+
+
+sqlite_maintenance = SQLiteMaintenance()
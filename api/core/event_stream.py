@@ -0,0 +1,165 @@
+"""SSE 事件流：合并 Agent 的 token 事件、编码为 text/event-stream，并在客户端断开时停止 Agent。"""
+
+import asyncio
+import json
+import os
+import time
+from contextlib import aclosing
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from agentchat.core.callbacks.events import AgentEvent, agent_event
+
+# token 在该时间窗口内合并为一个事件发送，减少逐 token 的编码与网络写入开销
+SSE_TOKEN_FLUSH_INTERVAL = float(os.getenv("SSE_TOKEN_FLUSH_MS", "50")) / 1000
+# 窗口内累计字符数达到该值时提前发送
+SSE_TOKEN_FLUSH_CHARS = int(os.getenv("SSE_TOKEN_FLUSH_CHARS", "1024"))
+# 待发送事件队列上限：客户端读取变慢时暂停从 Agent 拉取事件
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "256"))
+SSE_DISCONNECT_POLL_INTERVAL = float(os.getenv("SSE_DISCONNECT_POLL_MS", "500")) / 1000
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+T = TypeVar("T")
+
+
+class ClientDisconnected(Exception):
+    """客户端在事件流结束前断开连接。"""
+
+
+@dataclass
+class EventStreamStats:
+    """SSE 事件流统计。"""
+
+    streams: int = 0
+    disconnects: int = 0
+    events_sent: int = 0
+    tokens_received: int = 0
+    token_batches_sent: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["avg_tokens_per_batch"] = (
+            self.tokens_received / self.token_batches_sent if self.token_batches_sent else 0.0
+        )
+        return data
+
+
+event_stream_stats = EventStreamStats()
+
+
+def format_sse(event: AgentEvent) -> str:
+    """编码为一条 SSE 消息：event 行为事件类型，data 行为完整事件 JSON。"""
+    data = json.dumps(event, ensure_ascii=False, default=str)
+    return f"event: {event['type']}\ndata: {data}\n\n"
+
+
+async def coalesce_events(
+    events: AsyncIterator[AgentEvent],
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    flush_interval: float = SSE_TOKEN_FLUSH_INTERVAL,
+    flush_chars: int = SSE_TOKEN_FLUSH_CHARS,
+) -> AsyncGenerator[AgentEvent, None]:
+    """按时间窗口合并连续的 token 事件，其他事件原样透传（之前先发送已缓冲的 token）。
+
+    事件由后台任务拉取到有界队列中，窗口到期时即使没有新事件也会发送缓冲内容。
+    is_disconnected 报告客户端已断开时抛出 ClientDisconnected；结束或断开时关闭 events，
+    从而取消仍在执行的 Agent。
+    """
+    event_stream_stats.streams += 1
+    queue: asyncio.Queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+
+    async def pump() -> None:
+        async with aclosing(events):
+            async for event in events:
+                await queue.put(event)
+
+    pump_task = asyncio.create_task(pump())
+    getter: Optional[asyncio.Future] = None
+    buffer: List[str] = []
+    buffered_chars = 0
+    flush_at: Optional[float] = None
+    next_poll = time.monotonic() + SSE_DISCONNECT_POLL_INTERVAL
+
+    def flush() -> AgentEvent:
+        nonlocal buffered_chars, flush_at
+        event = agent_event("token", content="".join(buffer))
+        buffer.clear()
+        buffered_chars, flush_at = 0, None
+        event_stream_stats.token_batches_sent += 1
+        return event
+
+    def drained(event: AgentEvent) -> List[AgentEvent]:
+        nonlocal buffered_chars, flush_at
+        if event["type"] != "token":
+            return [flush(), event] if buffer else [event]
+        event_stream_stats.tokens_received += 1
+        buffer.append(event["content"])
+        buffered_chars += len(event["content"])
+        flush_at = flush_at or time.monotonic() + flush_interval
+        return [flush()] if buffered_chars >= flush_chars else []
+
+    try:
+        while True:
+            now = time.monotonic()
+            if is_disconnected is not None and now >= next_poll:
+                next_poll = now + SSE_DISCONNECT_POLL_INTERVAL
+                if await is_disconnected():
+                    event_stream_stats.disconnects += 1
+                    raise ClientDisconnected()
+            if flush_at is not None and now >= flush_at:
+                event_stream_stats.events_sent += 1
+                yield flush()
+                continue
+
+            deadline = min(next_poll, flush_at) if flush_at is not None else next_poll
+            getter = getter or asyncio.ensure_future(queue.get())
+            await asyncio.wait(
+                {getter, pump_task}, timeout=max(deadline - now, 0), return_when=asyncio.FIRST_COMPLETED
+            )
+            if getter.done():
+                event, getter = getter.result(), None
+                for item in drained(event):
+                    event_stream_stats.events_sent += 1
+                    yield item
+            elif pump_task.done():
+                getter.cancel()
+                getter = None
+                break
+
+        pending = [item for _ in range(queue.qsize()) for item in drained(queue.get_nowait())]
+        if buffer:
+            pending.append(flush())
+        for item in pending:
+            event_stream_stats.events_sent += 1
+            yield item
+        # 事件源的异常在已缓冲事件发送后抛出
+        pump_task.result()
+    finally:
+        if getter is not None:
+            getter.cancel()
+        if not pump_task.done():
+            pump_task.cancel()
+            await asyncio.gather(pump_task, return_exceptions=True)
+
+
+async def run_until_disconnected(
+    awaitable: Awaitable[T],
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+) -> T:
+    """等待 awaitable 完成；期间定期检查客户端连接，断开时取消它并抛出 ClientDisconnected。"""
+    task = asyncio.ensure_future(awaitable)
+    if is_disconnected is None:
+        return await task
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=SSE_DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await is_disconnected():
+                event_stream_stats.disconnects += 1
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
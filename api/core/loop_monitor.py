@@ -0,0 +1,105 @@
+"""事件循环阻塞监控（调试用）：发现长时间占用事件循环的同步调用并打印其调用栈。"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "false").lower() in ("1", "true", "yes")
+LOOP_MONITOR_THRESHOLD = float(os.getenv("LOOP_MONITOR_THRESHOLD_MS", "100")) / 1000
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "20")) / 1000
+
+
+@dataclass
+class LoopMonitorStats:
+    """事件循环阻塞统计。"""
+
+    enabled: bool = False
+    blocked_count: int = 0
+    max_lag_ms: float = 0.0
+    total_blocked_ms: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class EventLoopMonitor:
+    """心跳 + 看门狗线程：心跳协程在事件循环中定期刷新时间戳，看门狗线程在心跳
+    超过阈值未刷新时抓取事件循环线程当前的调用栈，定位阻塞事件循环的代码。
+    """
+
+    def __init__(self, threshold: float = LOOP_MONITOR_THRESHOLD, interval: float = LOOP_MONITOR_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self._stats = LoopMonitorStats()
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    async def start(self) -> None:
+        """在当前事件循环上启动监控。"""
+        if self._heartbeat_task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+        self._stats.enabled = True
+        logger.info(f"Event loop monitor started, threshold={self.threshold * 1000:.0f}ms")
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+        self._stats.enabled = False
+
+    async def _heartbeat(self) -> None:
+        while True:
+            now = time.monotonic()
+            # 实际间隔超出预期的部分即为事件循环被占用的时间
+            lag = now - self._last_beat - self.interval
+            if lag > self.threshold:
+                lag_ms = lag * 1000
+                self._stats.blocked_count += 1
+                self._stats.total_blocked_ms += lag_ms
+                self._stats.max_lag_ms = max(self._stats.max_lag_ms, lag_ms)
+                logger.warning(f"Event loop was blocked for {lag_ms:.0f}ms")
+            self._last_beat = now
+            await asyncio.sleep(self.interval)
+
+    def _watch(self) -> None:
+        reported_beat = None
+        while not self._stopped.wait(self.interval):
+            last_beat = self._last_beat
+            if last_beat == reported_beat or time.monotonic() - last_beat - self.interval <= self.threshold:
+                continue
+            # 每次阻塞只打印一次调用栈
+            reported_beat = last_beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame))
+            logger.warning(
+                f"Event loop blocked for more than {self.threshold * 1000:.0f}ms, current stack:\n{stack}"
+            )
+
+    def stats(self) -> LoopMonitorStats:
+        return self._stats
+
+
+loop_monitor = EventLoopMonitor()
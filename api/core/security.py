@@ -1,14 +1,20 @@
 """安全模块：封装 JWT、密码哈希和当前用户解析的通用逻辑。"""
 
+import hashlib
 import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Tuple
+from typing import Any, Dict, Optional, Tuple
 
 import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from loguru import logger
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.core.database import get_db
 from api.repositories.models import User, UserSession
@@ -17,6 +23,10 @@ from api.utils.current_time import get_current_datetime
 SECRET_KEY = os.getenv("JWT_SECRET", "dev-secret-change-me")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", "60"))
+# 已验证 token 的进程内缓存：条目数上限与有效期（秒，0 表示关闭缓存）
+# 多进程部署时，其他进程中的登出/重新登录最多在 TTL 后生效
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL_S", "60"))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 bearer_scheme = HTTPBearer(auto_error=False)
@@ -44,6 +54,92 @@ def create_access_token(user_id: str) -> Tuple[str, datetime]:
     return token, expires_at
 
 
+def hash_token(token: str) -> str:
+    """token 的 SHA-256 摘要，用于会话表索引与缓存键（不以完整 JWT 作为键）。"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class TokenCacheStats:
+    """token 验证缓存统计。"""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    stale_puts: int = 0  # 查询期间该用户的缓存已被清除、因而未写入的验证结果
+    size: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        total = self.hits + self.misses
+        data["hit_rate"] = self.hits / total if total else 0.0
+        return data
+
+
+class TokenCache:
+    """token 摘要 -> (用户快照, 过期时间) 的 LRU 缓存。
+
+    条目在 TTL 到期或会话过期（取较早者）后失效；用户重新登录替换会话时通过
+    invalidate_user 立即清除该用户的全部条目。
+
+    invalidate_user 同时递增该用户的代数：验证请求在查询数据库前记下代数，写入时代数
+    已变化说明查询可能读到了被替换前的会话，结果不再写入缓存，避免失效后又被并发请求写回。
+    """
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[User, float, datetime]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._stats = TokenCacheStats()
+
+    def get(self, token_hash: str) -> Optional[User]:
+        entry = self._entries.get(token_hash)
+        if entry is None:
+            self._stats.misses += 1
+            return None
+        user, cached_until, session_exp = entry
+        if time.monotonic() >= cached_until or session_exp < get_current_datetime():
+            del self._entries[token_hash]
+            self._stats.misses += 1
+            return None
+        self._entries.move_to_end(token_hash)
+        self._stats.hits += 1
+        return user
+
+    def generation(self, user_id: str) -> int:
+        """用户缓存的当前代数，在查询会话之前读取并传给 put。"""
+        return self._generations.get(user_id, 0)
+
+    def put(self, token_hash: str, user: User, session_exp: datetime, generation: int) -> None:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        if self._generations.get(user.id, 0) != generation:
+            self._stats.stale_puts += 1
+            return
+        self._entries[token_hash] = (user, time.monotonic() + self.ttl, session_exp)
+        self._entries.move_to_end(token_hash)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    def invalidate_user(self, user_id: str) -> None:
+        """清除指定用户的全部缓存条目（会话被替换或吊销时调用）。"""
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        stale = [key for key, (user, _, _) in self._entries.items() if user.id == user_id]
+        for key in stale:
+            del self._entries[key]
+        self._stats.invalidations += len(stale)
+
+    def stats(self) -> TokenCacheStats:
+        self._stats.size = len(self._entries)
+        return self._stats
+
+
+token_cache = TokenCache()
+
+
 def _normalize_dt(value: datetime) -> datetime:
     """将 datetime 转为带 UTC 时区，便于安全比较。"""
     if value.tzinfo is None:
@@ -51,69 +147,56 @@ def _normalize_dt(value: datetime) -> datetime:
     return value.astimezone(timezone.utc)
 
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> User:
-    """解析并验证请求头中的 JWT，返回当前活跃用户。"""
+    """解析并验证请求头中的 JWT，返回当前活跃用户。
+
+    验证通过的 token 缓存在进程内，缓存命中时不再解码 JWT 与查询数据库；
+    未命中时通过一次联表查询校验会话与用户。
+    """
     if credentials is None or not credentials.credentials:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing credentials")
 
     token = credentials.credentials
+    token_hash = hash_token(token)
+    cached = token_cache.get(token_hash)
+    if cached is not None:
+        return cached
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("sub")
         if not user_id:
-            print(f"=== DEBUG: JWT decoded but 'sub' field is missing. Payload: {payload}")
+            logger.debug("JWT decoded but 'sub' field is missing")
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token: missing user_id in payload. Please login again.")
     except jwt.PyJWTError as e:
-        print(f"=== DEBUG: JWT decode error: {e}")
+        logger.debug(f"JWT decode error: {e}")
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
-    # Debug: 检查数据库中的所有session
-    all_sessions = db.query(UserSession).all()
-    print(f"=== DEBUG: Total sessions in DB: {len(all_sessions)}")
-    for s in all_sessions:
-        print(f"  - Session ID: {s.id}, User ID: {s.user_id}, Token: {s.access_token[:50]}..., Revoked: {s.revoked_at}")
-
-    print(f"=== DEBUG: Looking for token: {token[:50]}...")
-    print(f"=== DEBUG: Looking for user_id: {user_id}")
-
-    session = (
-        db.query(UserSession)
-        .filter(
-            UserSession.access_token == token,
+    cache_generation = token_cache.generation(user_id)
+    result = await db.execute(
+        select(UserSession.expires_at, User)
+        .join(User, User.id == UserSession.user_id)
+        .where(
+            UserSession.token_hash == token_hash,
             UserSession.user_id == user_id,
             UserSession.revoked_at.is_(None),
         )
-        .first()
     )
-
-    if not session:
-        print(f"=== DEBUG: Session NOT FOUND!")
-        print(f"=== DEBUG: Checking by token only...")
-        session_by_token = db.query(UserSession).filter(UserSession.access_token == token).first()
-        if session_by_token:
-            print(f"=== DEBUG: Found by token! user_id={session_by_token.user_id}, revoked_at={session_by_token.revoked_at}")
-        else:
-            print(f"=== DEBUG: Not found by token either!")
-
-        print(f"=== DEBUG: Checking by user_id only...")
-        sessions_by_user = db.query(UserSession).filter(UserSession.user_id == user_id).all()
-        print(f"=== DEBUG: Found {len(sessions_by_user)} sessions for user_id")
-        for s in sessions_by_user:
-            print(f"  - Token matches: {s.access_token == token}")
-
+    row = result.first()
+    if row is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired or revoked")
 
-    now_utc = get_current_datetime()
-    session_exp = _normalize_dt(session.expires_at)
-    if session_exp < now_utc:
-        print(session_exp, now_utc)
+    session_expires_at, user = row
+    session_exp = _normalize_dt(session_expires_at)
+    if session_exp < get_current_datetime():
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired or revoked")
-
-    user = db.query(User).filter(User.id == user_id, User.is_active.is_(True)).first()
-    if not user:
+    if not user.is_active:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found or inactive")
 
+    # 与会话解除关联后缓存：已加载的列属性可在任意请求中安全读取
+    db.expunge(user)
+    token_cache.put(token_hash, user, session_exp, cache_generation)
     return user
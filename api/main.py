@@ -3,16 +3,24 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from agentchat.core.models.manager import ModelManager
+from agentchat.services.mcp.pool import close_session_pools
+from agentchat.services.sandbox import close_sandbox_pools
 from agentchat.settings import initialize_app_settings
 
-from api.core.database import Base, SessionLocal, engine
+from api.core.agent_registry import agent_registry
+from api.core.database import AsyncSessionLocal, engine, init_db
+from api.core.db_maintenance import sqlite_maintenance
+from api.core.loop_monitor import LOOP_MONITOR_ENABLED, loop_monitor
 from api.repositories import models as _  # noqa: F401 ensure models are registered
 from api.routers.agents import router as agents_router
 from api.routers.auth import router as auth_router
 from api.routers.conversations import router as conversations_router
+from api.routers.metrics import router as metrics_router
 from api.routers.tools import router as tools_router
 from api.routers.test import router as test_router
 from api.services.auth_service import ensure_default_user
+from api.services.conversation_service import backfill_conversation_stats
 
 
 app = FastAPI(title="WDK Agent API")
@@ -30,18 +38,35 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     """应用启动时加载配置并创建表。"""
+    # 调试模式下监控事件循环阻塞，尽早启动以覆盖启动阶段的同步调用
+    if LOOP_MONITOR_ENABLED:
+        await loop_monitor.start()
     await initialize_app_settings()
-    Base.metadata.create_all(bind=engine)
+    await init_db()
     # 初始化默认账户（用户名/密码：123），仅在不存在时创建
-    db = SessionLocal()
-    try:
-        ensure_default_user(db)
-    finally:
-        db.close()
+    async with AsyncSessionLocal() as db:
+        await ensure_default_user(db)
+        await backfill_conversation_stats(db)
+    # SQLite 定期 WAL checkpoint 与统计信息优化
+    await sqlite_maintenance.start()
+    # 预构建各模式的共享 Agent（模型客户端、编译好的图），避免首条消息承担构建开销
+    await agent_registry.warm_up()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时释放长连接资源（MCP 会话池、模型 HTTP 连接池、沙箱工作进程、数据库连接池）。"""
+    await close_session_pools()
+    await close_sandbox_pools()
+    await ModelManager.aclear(wait_for_runs=False)
+    await sqlite_maintenance.stop()
+    await engine.dispose()
+    await loop_monitor.stop()
 
 
 app.include_router(auth_router)
 app.include_router(agents_router)
 app.include_router(conversations_router)
 app.include_router(tools_router)
+app.include_router(metrics_router)
 app.include_router(test_router)
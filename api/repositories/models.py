@@ -3,7 +3,7 @@
 import datetime
 from uuid import uuid4
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, String, Text, text
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, text
 from sqlalchemy.orm import relationship
 
 from api.core.database import Base
@@ -33,7 +33,9 @@ class UserSession(Base):
 
     id = Column(String, primary_key=True, default=lambda: str(uuid4()))
     user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
-    access_token = Column(Text, unique=True, nullable=False, index=True)
+    access_token = Column(Text, nullable=False)
+    # 按 token 摘要查找会话，索引定长摘要而非完整 JWT 文本
+    token_hash = Column(String(64), nullable=True, unique=True, index=True)
     expires_at = Column(DateTime, nullable=False)
     created_at = Column(DateTime, server_default=TIMESTAMP_DEFAULT)
     revoked_at = Column(DateTime, nullable=True)
@@ -47,16 +49,30 @@ class Conversation(Base):
     __tablename__ = "conversations"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid4()))
-    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     title = Column(String(128), nullable=True)
     created_at = Column(DateTime, server_default=TIMESTAMP_DEFAULT)
     updated_at = Column(DateTime, server_default=TIMESTAMP_DEFAULT, onupdate=datetime.datetime.utcnow)
+    # 与消息写入在同一事务中维护的冗余列，对话列表无需再查询消息表
+    message_count = Column(Integer, nullable=True, default=0)
+    last_message_at = Column(DateTime, nullable=True)
+    last_message_preview = Column(String(256), nullable=True)
+    # 滚动摘要：覆盖到 summary_message_id（含）为止的全部消息，之后的消息以原文进入上下文
+    summary = Column(Text, nullable=True)
+    summary_message_id = Column(String, nullable=True)
+    summary_token_count = Column(Integer, nullable=True)
+    summarized_token_count = Column(Integer, nullable=True)  # 被摘要替代的原始消息 token 总数
 
     user = relationship("User", back_populates="conversations")
     messages = relationship(
         "Message", back_populates="conversation", cascade="all, delete-orphan", passive_deletes=True
     )
 
+    __table_args__ = (
+        # 按最近活跃时间列出用户的对话 / 按游标翻页（同时覆盖 user_id 单列查询）
+        Index("ix_conversations_user_updated", "user_id", "updated_at", "id"),
+    )
+
 
 class Message(Base):
     """消息表：存储每条用户/Agent 消息及使用的智能体模式。"""
@@ -64,12 +80,17 @@ class Message(Base):
     __tablename__ = "messages"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid4()))
-    conversation_id = Column(
-        String, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False, index=True
-    )
+    # 单列索引由 ix_messages_conversation_created 的前缀覆盖
+    conversation_id = Column(String, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
     role = Column(String(16), nullable=False)  # user | agent
     content = Column(Text, nullable=False)
     agent_mode = Column(String(32), nullable=False)
     created_at = Column(DateTime, server_default=TIMESTAMP_DEFAULT)
+    token_count = Column(Integer, nullable=True)  # 内容的 token 数缓存，首次组装上下文时计算
 
     conversation = relationship("Conversation", back_populates="messages")
+
+    __table_args__ = (
+        # 按对话取最近 N 条消息 / 按时间游标翻页
+        Index("ix_messages_conversation_created", "conversation_id", "created_at", "id"),
+    )
@@ -1,7 +1,7 @@
 """认证路由：处理登录获取 token。"""
 
 from fastapi import APIRouter, Depends, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.core.database import get_db
 from api.schemas import LoginRequest, TokenResponse
@@ -11,6 +11,6 @@ router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 
 @router.post("/login", response_model=TokenResponse, status_code=status.HTTP_200_OK)
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
+async def login(payload: LoginRequest, db: AsyncSession = Depends(get_db)):
     """登录并返回 JWT 与过期时间。"""
-    return authenticate_user(db=db, username=payload.username, password=payload.password)
+    return await authenticate_user(db=db, username=payload.username, password=payload.password)
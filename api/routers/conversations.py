@@ -1,18 +1,20 @@
 """会话与消息路由：暴露会话 CRUD 与消息发送/查询接口。"""
 
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.core.agent_runner import SUPPORTED_AGENT_MODES, normalize_agent_mode
 from api.core.database import get_db
+from api.core.event_stream import SSE_HEADERS
 from api.core.security import get_current_user
-from api.repositories.models import Conversation, User
+from api.repositories.models import User
 from api.schemas import (
     ConversationCreate,
     ConversationResponse,
+    ConversationsPage,
     MessageCreate,
     MessagesPage,
     MessageResponse,
@@ -20,59 +22,107 @@ from api.schemas import (
 from api.services.conversation_service import (
     create_conversation,
     delete_conversation,
+    get_user_conversation,
     list_conversations,
+    list_conversations_page,
     list_messages,
 )
-from api.services.message_service import send_message, stream_message
+from api.services.message_service import send_message, stream_message, stream_message_events
 
 router = APIRouter(prefix="/api/conversations", tags=["conversations"])
 
+MESSAGES_MAX_LIMIT = 500
+CONVERSATIONS_MAX_LIMIT = 200
+
 
 @router.post("", response_model=ConversationResponse, status_code=status.HTTP_201_CREATED)
-def create_conversation_endpoint(
+async def create_conversation_endpoint(
     payload: ConversationCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """创建新对话，返回对话基本信息。"""
-    return create_conversation(db=db, user=current_user, payload=payload)
+    return await create_conversation(db=db, user=current_user, payload=payload)
 
 
 @router.get("", response_model=List[ConversationResponse])
-def list_conversations_endpoint(
-    db: Session = Depends(get_db),
+async def list_conversations_endpoint(
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """列出当前用户的所有对话。"""
-    return list_conversations(db=db, user=current_user)
+    return await list_conversations(db=db, user=current_user)
+
+
+@router.get("/page", response_model=ConversationsPage)
+async def list_conversations_page_endpoint(
+    limit: int = Query(50, ge=1, le=CONVERSATIONS_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """按最近活跃时间分页列出对话，附带消息数与最后一条消息预览；cursor 取上一页的 next_cursor。"""
+    return await list_conversations_page(db=db, user=current_user, limit=limit, cursor=cursor)
 
 
 @router.delete("/{conversation_id}")
-def delete_conversation_endpoint(
+async def delete_conversation_endpoint(
     conversation_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """删除指定对话（级联删除消息）。"""
-    delete_conversation(db=db, user=current_user, conversation_id=conversation_id)
+    await delete_conversation(db=db, user=current_user, conversation_id=conversation_id)
     return {"message": "delete ok", "conversation_id": conversation_id}
 
 
 @router.get("/{conversation_id}/messages", response_model=MessagesPage)
-def list_messages_endpoint(
+async def list_messages_endpoint(
     conversation_id: str,
-    limit: int = 50,
-    offset: int = 0,
-    db: Session = Depends(get_db),
+    limit: int = Query(50, ge=1, le=MESSAGES_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    include_total: bool = True,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """分页查询指定对话的消息列表。"""
-    return list_messages(
+    """分页查询指定对话的消息列表。
+
+    推荐使用游标翻页：before=<消息 ID> 向前加载更早的消息，after=<消息 ID> 加载之后的消息；
+    不带游标时按 offset 分页。
+    """
+    return await list_messages(
         db=db,
         user=current_user,
         conversation_id=conversation_id,
         limit=limit,
         offset=offset,
+        before=before,
+        after=after,
+        include_total=include_total,
+    )
+
+
+@router.get("/{conversation_id}/messages/since", response_model=MessagesPage)
+async def list_messages_since_endpoint(
+    conversation_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(MESSAGES_MAX_LIMIT, ge=1, le=MESSAGES_MAX_LIMIT),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """增量同步：返回游标（上次同步到的消息 ID）之后的消息，未指定游标时从头开始。
+
+    has_more 为 true 时以 next_cursor 继续请求；游标失效时返回 400，客户端应全量重新同步。
+    """
+    return await list_messages(
+        db=db,
+        user=current_user,
+        conversation_id=conversation_id,
+        limit=limit,
+        after=cursor,
+        include_total=False,
     )
 
 
@@ -80,15 +130,17 @@ def list_messages_endpoint(
 async def send_message_endpoint(
     conversation_id: str,
     payload: MessageCreate,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """发送用户消息，按选择的 Agent 模式获取回复并落库。"""
+    """发送用户消息，按选择的 Agent 模式获取回复并落库；客户端断开后停止 Agent 执行。"""
     return await send_message(
         db=db,
         user=current_user,
         conversation_id=conversation_id,
         payload=payload,
+        is_disconnected=request.is_disconnected,
     )
 
 
@@ -96,19 +148,16 @@ async def send_message_endpoint(
 async def send_message_stream_endpoint(
     conversation_id: str,
     payload: MessageCreate,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """发送用户消息，流式返回 Agent 回复并落库。"""
+    """发送用户消息，流式返回 Agent 回复并落库；客户端断开后停止 Agent 执行。"""
     agent_mode = normalize_agent_mode(payload.agent_mode)
     if agent_mode not in SUPPORTED_AGENT_MODES:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported agent mode")
 
-    conversation = (
-        db.query(Conversation)
-        .filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id)
-        .first()
-    )
+    conversation = await get_user_conversation(db, current_user, conversation_id)
     if not conversation:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
 
@@ -117,5 +166,37 @@ async def send_message_stream_endpoint(
         user=current_user,
         conversation_id=conversation_id,
         payload=payload,
+        is_disconnected=request.is_disconnected,
     )
     return StreamingResponse(stream, media_type="text/plain")
+
+
+@router.post("/{conversation_id}/messages/events", status_code=status.HTTP_200_OK)
+async def send_message_events_endpoint(
+    conversation_id: str,
+    payload: MessageCreate,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """发送用户消息，以 SSE（text/event-stream）返回结构化事件并落库。
+
+    事件类型：token / tool_start / tool_end / plan / sandbox_output / error / done。
+    客户端断开连接后停止 Agent 执行。
+    """
+    agent_mode = normalize_agent_mode(payload.agent_mode)
+    if agent_mode not in SUPPORTED_AGENT_MODES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported agent mode")
+
+    conversation = await get_user_conversation(db, current_user, conversation_id)
+    if not conversation:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
+
+    stream = stream_message_events(
+        db=db,
+        user=current_user,
+        conversation_id=conversation_id,
+        payload=payload,
+        is_disconnected=request.is_disconnected,
+    )
+    return StreamingResponse(stream, media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,17 @@
+"""运行指标路由：暴露连接池、缓存等组件的运行时统计。"""
+
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends
+
+from api.core.security import get_current_user
+from api.repositories.models import User
+from api.services.metrics_service import collect_metrics
+
+router = APIRouter(prefix="/api/metrics", tags=["metrics"])
+
+
+@router.get("", response_model=Dict[str, Any])
+def metrics_endpoint(current_user: User = Depends(get_current_user)):
+    """返回当前进程内各组件的统计快照。"""
+    return collect_metrics()
@@ -1,7 +1,7 @@
 # Expose Pydantic schemas grouped by domain
 from api.schemas.agent import AgentInfo
 from api.schemas.auth import LoginRequest, TokenResponse
-from api.schemas.conversation import ConversationCreate, ConversationResponse
+from api.schemas.conversation import ConversationCreate, ConversationResponse, ConversationsPage
 from api.schemas.message import MessageCreate, MessageResponse, MessageListItem, MessagesPage
 from api.schemas.tool import ToolInfo
 
@@ -11,6 +11,7 @@ __all__ = [
     "TokenResponse",
     "ConversationCreate",
     "ConversationResponse",
+    "ConversationsPage",
     "MessageCreate",
     "MessageResponse",
     "MessageListItem",
@@ -1,7 +1,7 @@
 """会话相关的请求/响应模型。"""
 
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, ConfigDict, Field
 
@@ -15,4 +15,14 @@ class ConversationResponse(BaseModel):
 
     id: str
     title: Optional[str]
-    created_at: Optional[datetime]
\ No newline at end of file
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime] = None
+    message_count: Optional[int] = None
+    last_message_at: Optional[datetime] = None
+    last_message_preview: Optional[str] = None
+
+
+class ConversationsPage(BaseModel):
+    items: List[ConversationResponse]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
\ No newline at end of file
@@ -30,4 +30,6 @@ class MessageListItem(BaseModel):
 
 class MessagesPage(BaseModel):
     items: List[MessageListItem]
-    total: int
+    total: Optional[int] = None  # 近似总数；include_total=false 时不返回
+    next_cursor: Optional[str] = None
+    has_more: bool = False
@@ -1,39 +1,47 @@
 """认证服务层：处理用户校验与 token 签发逻辑。"""
 
-from datetime import datetime
+import asyncio
 
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from api.core.security import create_access_token, verify_password, get_password_hash
+from api.core.database import write_transaction
+from api.core.security import create_access_token, get_password_hash, hash_token, token_cache, verify_password
 from api.repositories.models import User, UserSession
 from api.schemas import TokenResponse
 
 
-def authenticate_user(db: Session, username: str, password: str) -> TokenResponse:
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> TokenResponse:
     """校验用户名密码并返回新生成的 JWT。"""
-    user: User | None = (
-        db.query(User).filter(User.username == username, User.is_active.is_(True)).first()
-    )
-    if not user or not verify_password(password, user.password_hash):
+    result = await db.execute(select(User).where(User.username == username, User.is_active.is_(True)))
+    user: User | None = result.scalars().first()
+    # bcrypt 校验是 CPU 密集操作，放到线程中执行，避免阻塞事件循环
+    if not user or not await asyncio.to_thread(verify_password, password, user.password_hash):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid username or password")
 
-    # 单用户单会话：登录前清理旧 session
-    db.query(UserSession).filter(UserSession.user_id == user.id).delete()
-
     token, expires_at = create_access_token(user.id)
-    session = UserSession(user_id=user.id, access_token=token, expires_at=expires_at)
-    db.add(session)
-    db.commit()
+    session = UserSession(
+        user_id=user.id, access_token=token, token_hash=hash_token(token), expires_at=expires_at
+    )
+    async with write_transaction():
+        # 单用户单会话：登录前清理旧 session
+        await db.execute(delete(UserSession).where(UserSession.user_id == user.id))
+        db.add(session)
+        await db.commit()
+    # 旧 session 已删除，其缓存的验证结果同步失效
+    token_cache.invalidate_user(user.id)
 
     return TokenResponse(access_token=token, expires_at=expires_at)
 
 
-def ensure_default_user(db: Session, username: str = "123", password: str = "123") -> None:
+async def ensure_default_user(db: AsyncSession, username: str = "123", password: str = "123") -> None:
     """确保存在一个默认账号（用户名/密码均为123），仅在未创建时插入。"""
-    existing = db.query(User).filter(User.username == username).first()
+    existing = await db.scalar(select(User).where(User.username == username))
     if existing:
         return
-    user = User(username=username, password_hash=get_password_hash(password), is_active=True)
-    db.add(user)
-    db.commit()
+    password_hash = await asyncio.to_thread(get_password_hash, password)
+    user = User(username=username, password_hash=password_hash, is_active=True)
+    async with write_transaction():
+        db.add(user)
+        await db.commit()
@@ -1,67 +1,229 @@
 """会话服务层：封装对话及消息的业务操作。"""
 
-from typing import List
+import os
+from typing import Any, Dict, List, Optional
 
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from loguru import logger
+from sqlalchemy import func, literal, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from api.core.database import write_transaction
 from api.repositories.models import Conversation, Message, User
-from api.schemas import ConversationCreate, ConversationResponse, MessagesPage, MessageListItem
+from api.schemas import (
+    ConversationCreate,
+    ConversationResponse,
+    ConversationsPage,
+    MessagesPage,
+    MessageListItem,
+)
+from api.services.history_service import after_message, before_message
 
+CONVERSATION_PREVIEW_CHARS = int(os.getenv("CONVERSATION_PREVIEW_CHARS", "120"))
 
-def create_conversation(db: Session, user: User, payload: ConversationCreate) -> ConversationResponse:
+
+async def get_user_conversation(db: AsyncSession, user: User, conversation_id: str) -> Conversation | None:
+    """按 ID 查询属于该用户的对话。"""
+    result = await db.execute(
+        select(Conversation).where(Conversation.id == conversation_id, Conversation.user_id == user.id)
+    )
+    return result.scalars().first()
+
+
+async def create_conversation(db: AsyncSession, user: User, payload: ConversationCreate) -> ConversationResponse:
     """创建对话并持久化。"""
     conversation = Conversation(user_id=user.id, title=payload.title)
-    db.add(conversation)
-    db.commit()
-    db.refresh(conversation)
+    async with write_transaction():
+        db.add(conversation)
+        await db.commit()
+    await db.refresh(conversation)
     return conversation
 
 
-def list_conversations(db: Session, user: User) -> List[ConversationResponse]:
-    """返回用户所有对话（按创建时间倒序）。"""
-    return (
-        db.query(Conversation)
-        .filter(Conversation.user_id == user.id)
-        .order_by(Conversation.created_at.desc())
-        .all()
+async def list_conversations(db: AsyncSession, user: User) -> List[ConversationResponse]:
+    """返回用户所有对话（按最近活跃时间倒序）。对话较多时使用 list_conversations_page。"""
+    result = await db.execute(
+        select(Conversation)
+        .where(Conversation.user_id == user.id)
+        .order_by(Conversation.updated_at.desc(), Conversation.id.desc())
     )
+    return list(result.scalars().all())
 
 
-def delete_conversation(db: Session, user: User, conversation_id: str) -> None:
-    """删除指定对话，不存在则抛 404。"""
-    conversation = (
-        db.query(Conversation)
-        .filter(Conversation.id == conversation_id, Conversation.user_id == user.id)
-        .first()
+async def list_conversations_page(
+    db: AsyncSession, user: User, limit: int, cursor: Optional[str] = None
+) -> ConversationsPage:
+    """按最近活跃时间倒序分页列出对话，走 (user_id, updated_at, id) 索引。
+
+    cursor 为上一页最后一个对话的 ID；该对话在翻页期间有新消息时会移到列表顶部，
+    此时继续翻页可能返回重复的对话，客户端按 ID 去重即可。
+    """
+    query = select(Conversation).where(Conversation.user_id == user.id)
+    if cursor:
+        cursor_updated_at = (
+            select(Conversation.updated_at)
+            .where(Conversation.id == cursor, Conversation.user_id == user.id)
+            .scalar_subquery()
+        )
+        if await db.scalar(select(cursor_updated_at)) is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        query = query.where(
+            tuple_(Conversation.updated_at, Conversation.id) < tuple_(cursor_updated_at, literal(cursor))
+        )
+
+    result = await db.execute(
+        query.order_by(Conversation.updated_at.desc(), Conversation.id.desc()).limit(limit + 1)
+    )
+    items = list(result.scalars().all())
+    has_more = len(items) > limit
+    items = items[:limit]
+    return ConversationsPage(
+        items=[ConversationResponse.model_validate(item) for item in items],
+        next_cursor=items[-1].id if items else cursor,
+        has_more=has_more,
     )
+
+
+async def delete_conversation(db: AsyncSession, user: User, conversation_id: str) -> None:
+    """删除指定对话，不存在则抛 404。"""
+    conversation = await get_user_conversation(db, user, conversation_id)
     if not conversation:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
-    db.delete(conversation)
-    db.commit()
+    async with write_transaction():
+        await db.delete(conversation)
+        await db.commit()
+
+
+def _latest_message(column: Any):
+    return (
+        select(column)
+        .where(Message.conversation_id == Conversation.id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def conversation_stats_values() -> Dict[Any, Any]:
+    """按消息表重新计算对话冗余列的 UPDATE 取值（关联子查询，用于删除消息与历史数据回填）。
 
+    显式设置 updated_at，避免触发 ORM 的 onupdate（其写入格式与库中默认值不同，会打乱排序）。
+    """
+    last_message_at = _latest_message(Message.created_at)
+    return {
+        Conversation.message_count: (
+            select(func.count()).where(Message.conversation_id == Conversation.id).scalar_subquery()
+        ),
+        Conversation.last_message_at: last_message_at,
+        Conversation.last_message_preview: _latest_message(
+            func.substr(Message.content, 1, CONVERSATION_PREVIEW_CHARS)
+        ),
+        Conversation.updated_at: func.coalesce(last_message_at, Conversation.updated_at),
+    }
 
-def list_messages(
-    db: Session,
+
+async def record_message(db: AsyncSession, message: Message) -> None:
+    """更新对话的消息数、最后消息时间与预览；需在写入消息的同一写事务中、消息 flush 之后调用。
+
+    updated_at 同步为最后消息时间，对话列表按最近活跃排序。
+    """
+    created_at = select(Message.created_at).where(Message.id == message.id).scalar_subquery()
+    await db.execute(
+        update(Conversation)
+        .where(Conversation.id == message.conversation_id)
+        .values(
+            {
+                Conversation.message_count: func.coalesce(Conversation.message_count, 0) + 1,
+                Conversation.last_message_at: created_at,
+                Conversation.last_message_preview: message.content[:CONVERSATION_PREVIEW_CHARS],
+                Conversation.updated_at: created_at,
+            }
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def refresh_conversation_stats(db: AsyncSession, conversation_id: str) -> None:
+    """删除消息后按消息表重新计算对话冗余列；需在同一写事务中调用。"""
+    await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(conversation_stats_values())
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def backfill_conversation_stats(db: AsyncSession) -> None:
+    """为新增冗余列之前创建的对话回填统计值（启动时调用，仅处理未回填的行）。"""
+    async with write_transaction():
+        result = await db.execute(
+            update(Conversation)
+            .where(Conversation.message_count.is_(None))
+            .values(conversation_stats_values())
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    if result.rowcount:
+        logger.info(f"Backfilled message stats for {result.rowcount} conversations")
+
+
+async def _ensure_cursor(db: AsyncSession, conversation_id: str, cursor: str) -> None:
+    # 游标消息不存在（如已随未完成的请求删除）时提示客户端重新同步，而不是静默返回空列表
+    exists = await db.scalar(
+        select(Message.id).where(Message.id == cursor, Message.conversation_id == conversation_id)
+    )
+    if not exists:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+async def list_messages(
+    db: AsyncSession,
     user: User,
     conversation_id: str,
     limit: int,
-    offset: int,
+    offset: int = 0,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    include_total: bool = True,
 ) -> MessagesPage:
-    """分页查询指定对话的消息列表。"""
-    conversation = (
-        db.query(Conversation)
-        .filter(Conversation.id == conversation_id, Conversation.user_id == user.id)
-        .first()
-    )
+    """分页查询指定对话的消息列表，按 (created_at, id) 升序返回。
+
+    - before：游标（消息 ID）之前最近的 limit 条，用于从最新消息向前翻页；
+    - after：游标之后的 limit 条，用于增量同步；
+    - 均未指定时按 offset 分页（兼容旧接口，offset 越大越慢）。
+    next_cursor 为沿同一方向继续翻页的游标，has_more 表示该方向是否还有消息；
+    total 取自对话的 message_count 列，无需计数查询。
+    """
+    if before and after:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Use either before or after")
+    conversation = await get_user_conversation(db, user, conversation_id)
     if not conversation:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
 
-    query = (
-        db.query(Message)
-        .filter(Message.conversation_id == conversation_id)
-        .order_by(Message.created_at.asc())
+    query = select(Message).where(Message.conversation_id == conversation_id)
+    if before:
+        await _ensure_cursor(db, conversation_id, before)
+        query = query.where(before_message(before)).order_by(Message.created_at.desc(), Message.id.desc())
+    else:
+        if after:
+            await _ensure_cursor(db, conversation_id, after)
+            query = query.where(after_message(after))
+        elif offset:
+            query = query.offset(offset)
+        query = query.order_by(Message.created_at.asc(), Message.id.asc())
+
+    # 多取一条用于判断是否还有下一页
+    result = await db.execute(query.limit(limit + 1))
+    items = list(result.scalars().all())
+    has_more = len(items) > limit
+    items = items[:limit]
+    next_cursor = items[-1].id if items else (before or after)
+    if before:
+        items.reverse()
+
+    return MessagesPage(
+        items=[MessageListItem.model_validate(item) for item in items],
+        total=conversation.message_count if include_total else None,
+        next_cursor=next_cursor,
+        has_more=has_more,
     )
-    total = query.count()
-    items = query.offset(offset).limit(limit).all()
-    return MessagesPage(items=[MessageListItem.model_validate(item) for item in items], total=total)
@@ -0,0 +1,87 @@
+"""历史消息服务层：按 token 预算加载对话最近的消息，组装成 Agent 的上下文。"""
+
+import os
+from typing import List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from sqlalchemy import literal, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from agentchat.utils.tokens import count_tokens
+from api.repositories.models import Message
+
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "20"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "4000"))
+
+
+def message_token_count(message: Message) -> int:
+    """返回消息的 token 数，未缓存时计算并写回该行（随当前事务提交）。"""
+    if message.token_count is None:
+        message.token_count = count_tokens(message.content)
+    return message.token_count
+
+
+def to_langchain_message(message: Message) -> BaseMessage:
+    """将数据库消息转换为 LangChain 消息。"""
+    if message.role == "user":
+        return HumanMessage(content=message.content)
+    return AIMessage(content=message.content)
+
+
+def _cursor_key(message_id: str):
+    # 游标的 created_at 通过子查询取库中原值比较，避免与 Python datetime 的序列化格式不一致
+    cursor_created_at = select(Message.created_at).where(Message.id == message_id).scalar_subquery()
+    return tuple_(cursor_created_at, literal(message_id))
+
+
+def after_message(message_id: str):
+    """按 (created_at, id) 排序时位于指定消息之后的过滤条件。
+
+    使用行值比较，SQLite/PostgreSQL 可直接在 (conversation_id, created_at, id) 索引上定位游标位置。
+    """
+    return tuple_(Message.created_at, Message.id) > _cursor_key(message_id)
+
+
+def before_message(message_id: str):
+    """按 (created_at, id) 排序时位于指定消息之前的过滤条件。"""
+    return tuple_(Message.created_at, Message.id) < _cursor_key(message_id)
+
+
+async def load_history(
+    db: AsyncSession,
+    conversation_id: str,
+    max_messages: Optional[int] = None,
+    token_budget: Optional[int] = None,
+    after: Optional[str] = None,
+) -> List[BaseMessage]:
+    """加载对话最近的消息作为上下文。
+
+    只查询最近 max_messages 条（走 (conversation_id, created_at, id) 索引），
+    再从最新一条往前累加 token 数，超出 token_budget 即停止，
+    因此开销只与窗口大小有关，与对话总长度无关。返回结果按时间正序排列。
+    after 为消息 id 时只取排在该消息之后的消息（例如已并入摘要的部分不再重复加载）。
+    """
+    max_messages = HISTORY_MAX_MESSAGES if max_messages is None else max_messages
+    token_budget = HISTORY_TOKEN_BUDGET if token_budget is None else token_budget
+    if max_messages <= 0 or token_budget <= 0:
+        return []
+
+    query = select(Message).where(Message.conversation_id == conversation_id)
+    if after is not None:
+        query = query.where(after_message(after))
+    result = await db.execute(
+        query.order_by(Message.created_at.desc(), Message.id.desc()).limit(max_messages)
+    )
+    recent = result.scalars().all()
+
+    window: List[Message] = []
+    used_tokens = 0
+    for message in recent:
+        tokens = message_token_count(message)
+        if used_tokens + tokens > token_budget:
+            break
+        used_tokens += tokens
+        window.append(message)
+
+    window.reverse()
+    return [to_langchain_message(message) for message in window]
@@ -1,66 +1,109 @@
-"""消息服务层：负责落库用户/Agent 消息并调用对应 Agent 获取回复。"""
+"""消息服务层：负责落库用户/Agent 消息并调用对应 Agent 获取回复。
 
-from typing import AsyncGenerator
+用户消息在 Agent 执行前单独提交，Agent 回复在执行结束后单独提交，两个写事务都很短，
+流式执行期间不持有数据库写锁；Agent 未能完成时（出错、客户端断开导致请求被取消或
+生成器被关闭）删除已提交的用户消息。
+"""
+
+import asyncio
+import time
+from contextlib import aclosing
+from typing import AsyncGenerator, Awaitable, Callable, Optional
 
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from loguru import logger
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.core.agent_runner import (
     SUPPORTED_AGENT_MODES,
     invoke_agent,
-    invoke_agent_stream,
+    invoke_agent_events,
     normalize_agent_mode,
 )
-from api.repositories.models import Conversation, Message, User
+from api.core.database import AsyncSessionLocal, write_transaction
+from api.core.event_stream import ClientDisconnected, coalesce_events, format_sse, run_until_disconnected
+from agentchat.core.callbacks.events import AgentEvent, agent_event
+from agentchat.utils.tokens import count_tokens
+from api.repositories.models import Message, User
 from api.schemas import MessageCreate, MessageResponse
+from api.services.conversation_service import (
+    get_user_conversation,
+    record_message,
+    refresh_conversation_stats,
+)
+from api.services.summary_service import build_context, schedule_summary_update
+
+
+DisconnectCheck = Callable[[], Awaitable[bool]]
 
 
 async def send_message(
-    db: Session,
+    db: AsyncSession,
     user: User,
     conversation_id: str,
     payload: MessageCreate,
+    is_disconnected: Optional[DisconnectCheck] = None,
 ) -> MessageResponse:
-    """保存用户消息、调用 Agent 获取回复并存入数据库。"""
+    """保存用户消息、调用 Agent 获取回复并存入数据库。客户端断开时取消 Agent 执行并删除本轮用户消息。"""
     agent_mode = normalize_agent_mode(payload.agent_mode)
     if agent_mode not in SUPPORTED_AGENT_MODES:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported agent mode")
 
-    conversation = (
-        db.query(Conversation)
-        .filter(Conversation.id == conversation_id, Conversation.user_id == user.id)
-        .first()
-    )
+    conversation = await get_user_conversation(db, user, conversation_id)
     if not conversation:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
 
+    # 先取历史（摘要 + 最近消息，不含本轮消息），再写入本轮用户消息
+    history = await build_context(db, conversation)
+
     user_message = Message(
         conversation_id=conversation_id,
         role="user",
         content=payload.content,
         agent_mode=agent_mode,
+        token_count=count_tokens(payload.content),
     )
-    db.add(user_message)
-    db.flush()
+    async with write_transaction():
+        db.add(user_message)
+        await db.flush()
+        await record_message(db, user_message)
+        await db.commit()
+    user_message_id = user_message.id
 
+    # 回复落库后才置为 True；其余任何退出路径（含请求被取消）都在 finally 中删除本轮用户消息
+    completed = False
     try:
-        answer = await invoke_agent(agent_mode, payload.content, user_id=user.id)
-    except HTTPException:
-        db.rollback()
-        raise
-    except Exception as exc:
-        db.rollback()
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
-
-    agent_message = Message(
-        conversation_id=conversation_id,
-        role="agent",
-        content=answer,
-        agent_mode=agent_mode,
-    )
-    db.add(agent_message)
-    db.commit()
-    db.refresh(agent_message)
+        try:
+            answer = await run_until_disconnected(
+                invoke_agent(agent_mode, payload.content, user_id=user.id, history=history), is_disconnected
+            )
+        except ClientDisconnected:
+            logger.info(f"Client disconnected, agent run cancelled: conversation={conversation_id}")
+            raise HTTPException(status_code=499, detail="Client disconnected")
+        except HTTPException:
+            raise
+        except Exception as exc:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
+
+        agent_message = Message(
+            conversation_id=conversation_id,
+            role="agent",
+            content=answer,
+            agent_mode=agent_mode,
+            token_count=count_tokens(answer),
+        )
+        async with write_transaction():
+            db.add(agent_message)
+            await db.flush()
+            await record_message(db, agent_message)
+            await db.commit()
+        completed = True
+    finally:
+        if not completed:
+            await _discard_message(db, conversation_id, user_message_id)
+    await db.refresh(agent_message)
+    schedule_summary_update(conversation_id)
 
     return MessageResponse(
         message_id=agent_message.id,
@@ -71,74 +114,150 @@ async def send_message(
 
 
 async def stream_message(
-    db: Session,
+    db: AsyncSession,
     user: User,
     conversation_id: str,
     payload: MessageCreate,
+    is_disconnected: Optional[DisconnectCheck] = None,
 ) -> AsyncGenerator[str, None]:
-    """保存用户消息、流式调用 Agent 并最终落库回复内容。"""
+    """保存用户消息、流式调用 Agent 并最终落库回复内容（纯文本片段，错误以 [ERROR] 行返回）。"""
+    # 显式关闭内层生成器，使外层被关闭时本轮用户消息的清理立即执行，而不是等到垃圾回收
+    async with aclosing(_run_message_events(db, user, conversation_id, payload, is_disconnected)) as events:
+        async for event in events:
+            if event["type"] == "token":
+                yield event["content"]
+            elif event["type"] == "error":
+                yield f"\n[ERROR] {event['message']}"
+
+
+async def stream_message_events(
+    db: AsyncSession,
+    user: User,
+    conversation_id: str,
+    payload: MessageCreate,
+    is_disconnected: Optional[DisconnectCheck] = None,
+) -> AsyncGenerator[str, None]:
+    """保存用户消息、以 SSE 事件流执行 Agent 并最终落库回复内容。"""
+    async with aclosing(_run_message_events(db, user, conversation_id, payload, is_disconnected)) as events:
+        async for event in events:
+            yield format_sse(event)
+
+
+async def _run_message_events(
+    db: AsyncSession,
+    user: User,
+    conversation_id: str,
+    payload: MessageCreate,
+    is_disconnected: Optional[DisconnectCheck] = None,
+) -> AsyncGenerator[AgentEvent, None]:
+    """执行一轮对话并产出 Agent 事件，Agent 只执行一次。
+
+    回复内容由 token 事件拼接而成；done 事件在回复落库后产出，附带消息 ID 与本次 token 用量。
+    客户端断开时停止 Agent（包括进行中的模型请求、MCP 调用与沙箱进程）并删除本轮用户消息。
+    """
+    started = time.monotonic()
     agent_mode = normalize_agent_mode(payload.agent_mode)
     if agent_mode not in SUPPORTED_AGENT_MODES:
-        yield "\n[ERROR] Unsupported agent mode"
+        yield agent_event("error", message="Unsupported agent mode")
         return
 
-    conversation = (
-        db.query(Conversation)
-        .filter(Conversation.id == conversation_id, Conversation.user_id == user.id)
-        .first()
-    )
+    conversation = await get_user_conversation(db, user, conversation_id)
     if not conversation:
-        yield "\n[ERROR] Conversation not found"
+        yield agent_event("error", message="Conversation not found")
         return
 
+    # 先取历史（摘要 + 最近消息，不含本轮消息），再写入本轮用户消息
+    history = await build_context(db, conversation)
+
     user_message = Message(
         conversation_id=conversation_id,
         role="user",
         content=payload.content,
         agent_mode=agent_mode,
+        token_count=count_tokens(payload.content),
     )
-    db.add(user_message)
-    db.flush()
+    async with write_transaction():
+        db.add(user_message)
+        await db.flush()
+        await record_message(db, user_message)
+        await db.commit()
+    user_message_id = user_message.id
 
     answer_chunks: list[str] = []
-    received_chunk = False
+    done_event = agent_event("done", usage={})
+    error: Optional[str] = None
+    # 回复落库后才置为 True。客户端断开时 Starlette 会取消响应任务（CancelledError）或
+    # 关闭生成器（GeneratorExit），二者都不会进入下面的 except，因此在 finally 中删除本轮用户消息
+    completed = False
+    events = invoke_agent_events(agent_mode, payload.content, user_id=user.id, history=history)
     try:
-        async for chunk in invoke_agent_stream(agent_mode, payload.content, user_id=user.id):
-            if chunk:
-                received_chunk = True
-                answer_chunks.append(chunk)
-                yield chunk
-    except HTTPException as exc:
-        db.rollback()
-        yield f"\n[ERROR] {exc.detail}"
-        return
-    except Exception as exc:
-        db.rollback()
-        yield f"\n[ERROR] {str(exc)}"
-        return
-
-    if not received_chunk:
         try:
-            answer = await invoke_agent(agent_mode, payload.content, user_id=user.id)
-        except HTTPException as exc:
-            db.rollback()
-            yield f"\n[ERROR] {exc.detail}"
+            async for event in coalesce_events(events, is_disconnected):
+                if event["type"] == "token":
+                    answer_chunks.append(event["content"])
+                elif event["type"] == "done":
+                    # done 在回复落库后产出，携带消息 ID
+                    done_event = event
+                    continue
+                yield event
+        except ClientDisconnected:
+            logger.info(f"Client disconnected, agent run cancelled: conversation={conversation_id}")
             return
+        except HTTPException as exc:
+            error = str(exc.detail)
         except Exception as exc:
-            db.rollback()
-            yield f"\n[ERROR] {str(exc)}"
-            return
-        if answer:
-            answer_chunks.append(answer)
-            yield answer
+            error = str(exc)
 
-    answer = "".join(answer_chunks)
-    agent_message = Message(
-        conversation_id=conversation_id,
-        role="agent",
-        content=answer,
-        agent_mode=agent_mode,
-    )
-    db.add(agent_message)
-    db.commit()
-    db.refresh(agent_message)
+        if error is None:
+            answer = "".join(answer_chunks)
+            agent_message = Message(
+                conversation_id=conversation_id,
+                role="agent",
+                content=answer,
+                agent_mode=agent_mode,
+                token_count=count_tokens(answer),
+            )
+            async with write_transaction():
+                db.add(agent_message)
+                await db.flush()
+                await record_message(db, agent_message)
+                await db.commit()
+            completed = True
+    finally:
+        if not completed:
+            await _discard_message(db, conversation_id, user_message_id)
+
+    if error is not None:
+        yield agent_event("error", message=error)
+        return
+    await db.refresh(agent_message)
+    schedule_summary_update(conversation_id)
+
+    yield {
+        **done_event,
+        "message_id": agent_message.id,
+        "conversation_id": conversation_id,
+        "answer_tokens": agent_message.token_count,
+        "elapsed_ms": round((time.monotonic() - started) * 1000),
+    }
+
+
+async def _discard_message(db: AsyncSession, conversation_id: str, message_id: str) -> None:
+    """删除 Agent 未能回复的本轮用户消息，保持对话中消息成对出现。
+
+    请求被取消时请求会话可能停在未完成的操作上，删除改用独立会话执行，
+    并以 asyncio.shield 保护，不随请求一起被取消。
+    """
+    try:
+        await db.rollback()
+    except Exception as err:
+        logger.warning(f"Rollback before discarding message failed: {err}")
+    await asyncio.shield(_delete_message(conversation_id, message_id))
+
+
+async def _delete_message(conversation_id: str, message_id: str) -> None:
+    async with AsyncSessionLocal() as db:
+        async with write_transaction():
+            await db.execute(delete(Message).where(Message.id == message_id))
+            await refresh_conversation_stats(db, conversation_id)
+            await db.commit()
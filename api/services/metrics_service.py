@@ -0,0 +1,34 @@
+"""运行指标服务层：汇总各组件的运行时统计，便于排查性能问题。"""
+
+from typing import Any, Dict
+
+from agentchat.core.models.cache import llm_cache_stats
+from agentchat.core.tools.index import tool_selection_stats
+from agentchat.core.tools.schema_render import tool_schema_renderer
+from agentchat.services.mcp.catalog import tool_catalog
+from agentchat.services.mcp.pool import get_session_pool_stats
+from agentchat.services.sandbox import get_sandbox_pool_stats
+from api.core.agent_runner import agent_run_stats
+from api.core.database import database_stats
+from api.core.event_stream import event_stream_stats
+from api.core.loop_monitor import loop_monitor
+from api.core.security import token_cache
+from api.services.summary_service import summary_stats
+
+
+def collect_metrics() -> Dict[str, Any]:
+    """返回当前进程内各组件的统计快照。"""
+    return {
+        "mcp_session_pools": get_session_pool_stats(),
+        "mcp_tool_catalog": tool_catalog.stats().as_dict(),
+        "tool_selection": tool_selection_stats.as_dict(),
+        "tool_schemas": tool_schema_renderer.stats().as_dict(),
+        "llm_cache": llm_cache_stats.as_dict(),
+        "sandbox_pools": get_sandbox_pool_stats(),
+        "history_summary": summary_stats.as_dict(),
+        "event_loop": loop_monitor.stats().as_dict(),
+        "event_stream": event_stream_stats.as_dict(),
+        "agent_runs": agent_run_stats.as_dict(),
+        "database": database_stats.as_dict(),
+        "token_cache": token_cache.stats().as_dict(),
+    }
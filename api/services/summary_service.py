@@ -0,0 +1,171 @@
+"""对话摘要服务层：为长对话维护滚动摘要，Agent 上下文 = 摘要 + 最近消息尾部。"""
+
+import asyncio
+import os
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Set
+
+from langchain_core.messages import BaseMessage, HumanMessage
+from loguru import logger
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from agentchat.core.models.manager import ModelManager
+from agentchat.prompts.chat import CONVERSATION_SUMMARY_CONTEXT_PROMPT, CONVERSATION_SUMMARY_PROMPT
+from agentchat.utils.tokens import count_tokens
+from api.core.database import AsyncSessionLocal, write_transaction
+from api.repositories.models import Conversation, Message
+from api.services.history_service import HISTORY_TOKEN_BUDGET, after_message, load_history, message_token_count
+
+SUMMARY_ENABLED = os.getenv("HISTORY_SUMMARY_ENABLED", "true").lower() in ("1", "true", "yes")
+# 最近多少条消息始终保留原文，不并入摘要
+SUMMARY_KEEP_RECENT = int(os.getenv("HISTORY_SUMMARY_KEEP_RECENT", "6"))
+# 保留区之外累计多少条未摘要消息时触发一次摘要更新
+SUMMARY_TRIGGER_MESSAGES = int(os.getenv("HISTORY_SUMMARY_TRIGGER_MESSAGES", "6"))
+# 单次摘要调用最多并入的消息条数，历史很长的老对话分批追平
+SUMMARY_BATCH_MESSAGES = int(os.getenv("HISTORY_SUMMARY_BATCH_MESSAGES", "40"))
+SUMMARY_MAX_WORDS = int(os.getenv("HISTORY_SUMMARY_MAX_WORDS", "300"))
+
+ROLE_LABELS = {"user": "User", "agent": "Assistant"}
+
+
+@dataclass
+class SummaryStats:
+    """摘要缓存的运行统计。"""
+
+    requests: int = 0
+    requests_with_summary: int = 0
+    tokens_saved_total: int = 0  # 摘要替代原始消息后节省的 prompt token 累计值
+    last_tokens_saved: int = 0
+    updates: int = 0
+    update_failures: int = 0
+    messages_summarized: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["avg_tokens_saved"] = self.tokens_saved_total / self.requests if self.requests else 0.0
+        return data
+
+
+summary_stats = SummaryStats()
+_updating: Set[str] = set()
+_tasks: Set[asyncio.Task] = set()
+
+
+async def build_context(db: AsyncSession, conversation: Conversation) -> List[BaseMessage]:
+    """组装本轮的历史上下文：已有摘要时为 [摘要, 摘要之后的最近消息]，否则退化为最近消息。
+
+    摘要占用的 token 从历史预算中扣除，因此上下文总量仍受 HISTORY_TOKEN_BUDGET 约束。
+    """
+    summary_stats.requests += 1
+    if not conversation.summary or not conversation.summary_message_id:
+        summary_stats.last_tokens_saved = 0
+        return await load_history(db, conversation.id)
+
+    summary_tokens = conversation.summary_token_count or count_tokens(conversation.summary)
+    tail = await load_history(
+        db,
+        conversation.id,
+        token_budget=max(HISTORY_TOKEN_BUDGET - summary_tokens, 0),
+        after=conversation.summary_message_id,
+    )
+
+    tokens_saved = max((conversation.summarized_token_count or 0) - summary_tokens, 0)
+    summary_stats.requests_with_summary += 1
+    summary_stats.tokens_saved_total += tokens_saved
+    summary_stats.last_tokens_saved = tokens_saved
+
+    # 以普通用户消息注入摘要：各 Agent 会自行拼接系统提示，额外的 SystemMessage 会与之冲突
+    summary_message = HumanMessage(content=CONVERSATION_SUMMARY_CONTEXT_PROMPT.format(summary=conversation.summary))
+    return [summary_message, *tail]
+
+
+def schedule_summary_update(conversation_id: str) -> None:
+    """在后台更新对话摘要，不阻塞当前请求；同一对话同一时间只运行一个更新任务。"""
+    if not SUMMARY_ENABLED or conversation_id in _updating:
+        return
+    _updating.add(conversation_id)
+    task = asyncio.create_task(update_summary(conversation_id))
+    _tasks.add(task)
+
+    def _on_done(done: asyncio.Task) -> None:
+        _tasks.discard(done)
+        _updating.discard(conversation_id)
+
+    task.add_done_callback(_on_done)
+
+
+async def update_summary(conversation_id: str) -> None:
+    """将保留区之外的未摘要消息分批并入滚动摘要，直到无需再更新。"""
+    async with AsyncSessionLocal() as db:
+        try:
+            while await _summarize_next_batch(db, conversation_id):
+                pass
+        except Exception as err:
+            await db.rollback()
+            summary_stats.update_failures += 1
+            logger.warning(f"Conversation summary update failed for {conversation_id}: {err}")
+
+
+async def _summarize_next_batch(db: AsyncSession, conversation_id: str) -> bool:
+    conversation = await db.get(Conversation, conversation_id)
+    if conversation is None:
+        return False
+
+    query = select(Message).where(Message.conversation_id == conversation_id)
+    if conversation.summary_message_id:
+        query = query.where(after_message(conversation.summary_message_id))
+    result = await db.execute(
+        query.order_by(Message.created_at.asc(), Message.id.asc()).limit(SUMMARY_BATCH_MESSAGES + SUMMARY_KEEP_RECENT)
+    )
+    pending = result.scalars().all()
+    batch = pending[: max(len(pending) - SUMMARY_KEEP_RECENT, 0)]
+    if not batch or len(batch) < SUMMARY_TRIGGER_MESSAGES:
+        return False
+
+    previous_summary = conversation.summary
+    prompt = CONVERSATION_SUMMARY_PROMPT.format(
+        max_words=SUMMARY_MAX_WORDS,
+        summary=previous_summary or "(empty)",
+        messages="\n".join(f"{ROLE_LABELS.get(message.role, message.role)}: {message.content}" for message in batch),
+    )
+    with ModelManager.lease():
+        response = await ModelManager.get_conversation_model().ainvoke(prompt)
+    summary = str(response.content).strip()
+    if not summary:
+        return False
+
+    last = batch[-1]
+    summarized_tokens = (conversation.summarized_token_count or 0) + sum(
+        message_token_count(message) for message in batch
+    )
+    # 仅当摘要游标未被其他进程推进时写入；保持 updated_at 不变，摘要更新不影响对话排序
+    async with write_transaction():
+        result = await db.execute(
+            update(Conversation)
+            .where(
+                Conversation.id == conversation_id,
+                Conversation.summary_message_id.is_(None)
+                if conversation.summary_message_id is None
+                else Conversation.summary_message_id == conversation.summary_message_id,
+            )
+            .values(
+                {
+                    Conversation.summary: summary,
+                    Conversation.summary_message_id: last.id,
+                    Conversation.summary_token_count: count_tokens(summary),
+                    Conversation.summarized_token_count: summarized_tokens,
+                    Conversation.updated_at: Conversation.updated_at,
+                }
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    if not result.rowcount:
+        return False
+
+    db.expire(conversation)
+    summary_stats.updates += 1
+    summary_stats.messages_summarized += len(batch)
+    logger.info(f"Conversation summary updated: {conversation_id}, +{len(batch)} messages")
+    return True
@@ -0,0 +1,132 @@
+"""ReactAgent 工具循环微基准：用假模型与空操作工具跑满 N 轮工具循环，测量每轮的图调度开销。
+
+模型与工具都立即返回，两次模型调用之间的耗时即为一轮的框架开销（状态合并、节点调度等）。
+假模型与 ChatOpenAI 一样为每条回复设置 id，历史消息也带 id，因此会经过 reducer 的 id 查重。
+节点只返回新增消息时，该开销与历史长度无关，末尾几轮与开头几轮应基本持平；
+比值超过 --max-ratio，或 reducer 在写入图输入之后仍回退到 add_messages（按历史全量合并）时
+以非零状态退出。
+
+    python benchmark_react_agent.py --iterations 50 --history 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from typing import Any, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+
+from agentchat.core.agents import react_agent
+from agentchat.core.agents.react_agent import ReactAgent
+
+
+@tool
+async def noop(step: int) -> str:
+    """Return immediately."""
+    return f"step {step} done"
+
+
+class ToolLoopModel(BaseChatModel):
+    """前 iterations 次调用都请求一次 noop 工具，之后直接回答；记录每次调用的时间点。"""
+
+    iterations: int = 50
+    call_times: List[float] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "tool-loop-benchmark"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ToolLoopModel":
+        return self
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        step = len(self.call_times)
+        self.call_times.append(time.perf_counter())
+        if step < self.iterations:
+            message = AIMessage(
+                content="",
+                tool_calls=[{"name": "noop", "args": {"step": step}, "id": f"call_{step}"}],
+                id=f"chatcmpl-{uuid.uuid4().hex}",
+            )
+        else:
+            message = AIMessage(content="done", id=f"chatcmpl-{uuid.uuid4().hex}")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class FallbackCounter:
+    """包装 react_agent.add_messages，统计 reducer 回退到全量合并的次数。"""
+
+    def __init__(self):
+        self.calls = 0
+        self._add_messages = react_agent.add_messages
+
+    def __call__(self, left, right):
+        self.calls += 1
+        return self._add_messages(left, right)
+
+
+async def run(iterations: int, history: int, fallbacks: Optional[FallbackCounter] = None) -> List[float]:
+    model = ToolLoopModel(iterations=iterations, call_times=[])
+    agent = ReactAgent(model=model, tools=[noop])
+    await agent._init_agent()
+
+    messages = [
+        HumanMessage(content=f"history message {i}", id=str(uuid.uuid4()))
+        if i % 2 == 0
+        else AIMessage(content=f"history reply {i}", id=f"chatcmpl-{uuid.uuid4().hex}")
+        for i in range(history)
+    ]
+    messages.append(HumanMessage(content="run the tool loop"))
+    state = {"messages": agent._prepare_messages(messages), "tool_call_count": 0, "model_call_count": 0}
+    # 每轮工具循环经过两个节点
+    if fallbacks is not None:
+        react_agent.add_messages = fallbacks
+    try:
+        result = await agent.graph.ainvoke(state, config={"recursion_limit": iterations * 2 + 10})
+    finally:
+        if fallbacks is not None:
+            react_agent.add_messages = fallbacks._add_messages
+    assert result["tool_call_count"] == iterations, result["tool_call_count"]
+    assert len(result["messages"]) == len(state["messages"]) + iterations * 2 + 1
+
+    times = model.call_times
+    return [(later - earlier) * 1000 for earlier, later in zip(times, times[1:])]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ReactAgent tool-loop overhead benchmark")
+    parser.add_argument("--iterations", type=int, default=50, help="tool loop iterations")
+    parser.add_argument("--history", type=int, default=200, help="history messages before the loop")
+    parser.add_argument("--window", type=int, default=10, help="iterations averaged at each end")
+    parser.add_argument("--max-ratio", type=float, default=2.0, help="allowed last/first overhead ratio")
+    args = parser.parse_args()
+
+    # 先跑一轮预热（导入、图编译等一次性开销）
+    asyncio.run(run(args.window, args.history))
+    fallbacks = FallbackCounter()
+    overheads = asyncio.run(run(args.iterations, args.history, fallbacks))
+
+    first = statistics.median(overheads[: args.window])
+    last = statistics.median(overheads[-args.window:])
+    ratio = last / first if first else float("inf")
+    print(f"iterations={args.iterations} history={args.history}")
+    print(f"per-iteration overhead: first {first:.3f}ms, last {last:.3f}ms, ratio {ratio:.2f}")
+    print(f"add_messages fallbacks: {fallbacks.calls}")
+    if ratio > args.max_ratio:
+        print(f"FAIL: overhead grows with loop length (ratio > {args.max_ratio})")
+        sys.exit(1)
+    # 只有写入图输入的那一次合并（此时历史为空）允许回退
+    if fallbacks.calls > 1:
+        print("FAIL: message merges fall back to add_messages")
+        sys.exit(1)
+    print("OK: per-iteration overhead is flat")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,23 @@
 /** 对话相关 API */
 import request from './request'
-import type { Conversation, MessagesPage, MessageResponse, MessageCreate, ConversationCreate } from '@/types'
+import type {
+  Conversation,
+  ConversationsPage,
+  MessagesPage,
+  MessageResponse,
+  MessageCreate,
+  ConversationCreate
+} from '@/types'
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8080'
 
 export function getConversations() {
   return request.get<Conversation[]>('/api/conversations')
+}
+
+/** 按最近活跃时间分页获取对话列表 */
+export function getConversationsPage(params?: { limit?: number; cursor?: string }) {
+  return request.get<ConversationsPage>('/api/conversations/page', { params })
 }
 
 export function createConversation(data: ConversationCreate) {
@@ -16,8 +28,16 @@ export function deleteConversation(id: string) {
   return request.delete<{ message: string; conversation_id: string }>(`/api/conversations/${id}`)
 }
 
-export function getMessages(conversationId: string, params?: { limit?: number; offset?: number }) {
+export function getMessages(
+  conversationId: string,
+  params?: { limit?: number; offset?: number; before?: string; after?: string; include_total?: boolean }
+) {
   return request.get<MessagesPage>(`/api/conversations/${conversationId}/messages`, { params })
+}
+
+/** 增量同步：获取游标之后的新消息 */
+export function getMessagesSince(conversationId: string, params?: { cursor?: string; limit?: number }) {
+  return request.get<MessagesPage>(`/api/conversations/${conversationId}/messages/since`, { params })
 }
 
 export async function sendMessage(conversationId: string, data: MessageCreate): Promise<MessageResponse> {
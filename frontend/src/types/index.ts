@@ -9,6 +9,16 @@ export interface Conversation {
   id: string
   title: string | null
   created_at: string
+  updated_at?: string | null
+  message_count?: number | null
+  last_message_at?: string | null
+  last_message_preview?: string | null
+}
+
+export interface ConversationsPage {
+  items: Conversation[]
+  next_cursor: string | null
+  has_more: boolean
 }
 
 export interface Message {
@@ -22,7 +32,9 @@ export interface Message {
 
 export interface MessagesPage {
   items: Message[]
-  total: number
+  total: number | null
+  next_cursor: string | null
+  has_more: boolean
 }
 
 export interface AgentInfo {
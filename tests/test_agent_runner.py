@@ -0,0 +1,53 @@
+"""Agent 调度器：共享 Agent 执行时能取得发起本次运行的用户。"""
+
+import asyncio
+
+from agentchat.core.callbacks.events import emit_agent_event, stream_agent_events
+from agentchat.core.context import current_user_id
+from api.core import agent_runner
+
+
+class _UserEchoAgent:
+    """回复发起运行的用户，模拟按用户获取 MCP 配置的共享 Agent。"""
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(0)
+        return current_user_id()
+
+    async def astream_events(self, messages):
+        async def run():
+            await asyncio.sleep(0)
+            emit_agent_event("token", content=current_user_id())
+
+        async for event in stream_agent_events(run):
+            yield event
+
+
+async def _get_shared_agent(agent_mode, mcp_servers=None):
+    return _UserEchoAgent()
+
+
+def test_invoke_agent_passes_user_to_shared_agent(monkeypatch):
+    monkeypatch.setattr(agent_runner.agent_registry, "get_agent", _get_shared_agent)
+
+    async def run():
+        return await asyncio.gather(
+            agent_runner.invoke_agent("react", "hi", user_id="alice"),
+            agent_runner.invoke_agent("react", "hi", user_id="bob"),
+        )
+
+    assert asyncio.run(run()) == ["alice", "bob"]
+    assert current_user_id() is None
+
+
+def test_invoke_agent_events_passes_user_to_shared_agent(monkeypatch):
+    monkeypatch.setattr(agent_runner.agent_registry, "get_agent", _get_shared_agent)
+
+    async def collect(user_id):
+        events = agent_runner.invoke_agent_events("react", "hi", user_id=user_id)
+        return [event["content"] async for event in events if event["type"] == "token"]
+
+    async def run():
+        return await asyncio.gather(collect("alice"), collect("bob"))
+
+    assert asyncio.run(run()) == [["alice"], ["bob"]]
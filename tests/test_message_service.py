@@ -0,0 +1,81 @@
+"""消息服务：Agent 未能完成时删除本轮用户消息（含客户端断开导致的取消）。"""
+
+import asyncio
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+
+from sqlalchemy import func, select  # noqa: E402
+
+from agentchat.core.callbacks.events import agent_event  # noqa: E402
+from api.core.database import AsyncSessionLocal, engine, init_db  # noqa: E402
+from api.repositories.models import Conversation, Message, User  # noqa: E402
+from api.schemas import MessageCreate  # noqa: E402
+from api.services import message_service  # noqa: E402
+
+
+async def _stalled_agent_events(*args, **kwargs):
+    """产出一个 token 后一直等待，模拟仍在执行中的 Agent。"""
+    yield agent_event("token", content="partial")
+    await asyncio.Event().wait()
+
+
+async def _create_conversation():
+    async with AsyncSessionLocal() as db:
+        user = User(username=f"user-{os.urandom(4).hex()}", password_hash="x")
+        db.add(user)
+        await db.flush()
+        conversation = Conversation(user_id=user.id, title="t")
+        db.add(conversation)
+        await db.commit()
+        return user, conversation.id
+
+
+async def _message_count(conversation_id: str) -> int:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(func.count()).select_from(Message).where(Message.conversation_id == conversation_id)
+        )
+        return result.scalar_one()
+
+
+async def _run_cancelled_stream(close_generator: bool) -> int:
+    await init_db()
+    user, conversation_id = await _create_conversation()
+    payload = MessageCreate(content="hello", agent_mode="react")
+
+    async with AsyncSessionLocal() as db:
+        stream = message_service.stream_message_events(db, user, conversation_id, payload)
+        if close_generator:
+            # Starlette 关闭挂起在 yield 处的响应生成器：GeneratorExit
+            await asyncio.wait_for(stream.__anext__(), timeout=5)
+            assert await _message_count(conversation_id) == 1
+            await stream.aclose()
+        else:
+            # 客户端断开时取消正在等待 Agent 的响应任务：CancelledError
+            first_event = asyncio.Event()
+
+            async def consume():
+                async for _ in stream:
+                    first_event.set()
+
+            task = asyncio.create_task(consume())
+            await asyncio.wait_for(first_event.wait(), timeout=5)
+            assert await _message_count(conversation_id) == 1
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    count = await _message_count(conversation_id)
+    await engine.dispose()
+    return count
+
+
+def test_cancelled_stream_discards_user_message(monkeypatch):
+    monkeypatch.setattr(message_service, "invoke_agent_events", _stalled_agent_events)
+    assert asyncio.run(_run_cancelled_stream(close_generator=False)) == 0
+
+
+def test_closed_stream_discards_user_message(monkeypatch):
+    monkeypatch.setattr(message_service, "invoke_agent_events", _stalled_agent_events)
+    assert asyncio.run(_run_cancelled_stream(close_generator=True)) == 0
@@ -0,0 +1,173 @@
+"""PlanExecuteAgent：计划的 DAG 调度与取消。"""
+
+import asyncio
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool, tool
+
+from agentchat.core.agents.plan_execute_agent import PlanExecuteAgent
+from agentchat.core.context import user_scope
+from agentchat.core.models.manager import ModelManager
+
+
+class _StalledModel:
+    """调用后一直等待的工具调用模型，记录开始与被取消的调用次数。"""
+
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+        self.calls = asyncio.Event()
+
+    def bind_tools(self, tools):
+        return self
+
+    async def ainvoke(self, messages):
+        self.started += 1
+        self.calls.set()
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return AIMessage(content="")
+
+
+class _RecordingModel:
+    """记录调用提示与最大并发数的工具调用模型，不产生工具调用。"""
+
+    def __init__(self):
+        self.prompts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def bind_tools(self, tools):
+        return self
+
+    async def ainvoke(self, messages):
+        self.prompts.append(messages[0].content)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.05)
+        finally:
+            self.in_flight -= 1
+        return AIMessage(content="")
+
+
+@tool
+def get_weather(city: str) -> str:
+    """查询城市天气。"""
+    return f"{city}：晴"
+
+
+def _make_agent(monkeypatch, model, tools=None, mcp_tools=(), **kwargs) -> PlanExecuteAgent:
+    monkeypatch.setattr(ModelManager, "get_conversation_model", classmethod(lambda cls, **kwargs: model))
+    monkeypatch.setattr(ModelManager, "get_tool_invocation_model", classmethod(lambda cls, **kwargs: model))
+    agent = PlanExecuteAgent(user_id=None, tools=tools or [], **kwargs)
+    # 与 setup_mcp_tools 相同：本次运行的 MCP 工具只同步到注册表
+    agent._sync_tool_registry(list(mcp_tools))
+    return agent
+
+
+def test_cancelled_run_cancels_plan_steps(monkeypatch):
+    model = _StalledModel()
+    agent = _make_agent(monkeypatch, model)
+    plan = {
+        "root": {
+            "Process 1": [{"tool_name": "search", "tool_args": {}}],
+            "Process 2": [{"tool_name": "search", "tool_args": {}}],
+        },
+        "dependencies": {"Process 1": [], "Process 2": []},
+    }
+
+    async def run():
+        execution = asyncio.create_task(agent._execute_agent_actions(plan))
+        await asyncio.wait_for(model.calls.wait(), timeout=5)
+        await asyncio.sleep(0)
+        execution.cancel()
+        await asyncio.gather(execution, return_exceptions=True)
+        assert execution.cancelled()
+        # 步骤任务须在 _execute_agent_actions 返回前被取消，而不是等到事件循环关闭
+        assert model.cancelled == 2
+
+    asyncio.run(run())
+    assert model.started == 2
+
+
+def test_flat_plan_dependencies_are_not_a_step(monkeypatch):
+    model = _RecordingModel()
+    agent = _make_agent(monkeypatch, model)
+    # PLAN_CALL_TOOL_PROMPT 要求的格式：dependencies 与 "Process X" 并列，没有 root
+    plan = {
+        "Process 1": [{"tool_name": "search", "tool_args": {"query": "东京天气"}}],
+        "Process 2": [{"tool_name": "search", "tool_args": {"query": "大阪天气"}}],
+        "dependencies": {"Process 1": [], "Process 2": []},
+    }
+
+    results = asyncio.run(agent._execute_agent_actions(plan))
+
+    assert len(model.prompts) == 2
+    assert not any("Process 1" in prompt or "dependencies" in prompt for prompt in model.prompts)
+    # 两个步骤互不依赖，应并发执行
+    assert model.max_in_flight == 2
+    assert len(results) == 2
+
+
+def test_direct_dispatch_only_for_steps_without_dependencies(monkeypatch):
+    model = _RecordingModel()
+    agent = _make_agent(monkeypatch, model, tools=[get_weather])
+    plan = {
+        "Process 1": [{"tool_name": "get_weather", "tool_args": {"city": "东京"}}],
+        # 参数完整且能通过校验，但声明了依赖，仍须交给模型结合前序结果生成调用
+        "Process 2": [{"tool_name": "get_weather", "tool_args": {"city": "大阪"}}],
+        "dependencies": {"Process 1": [], "Process 2": ["Process 1"]},
+    }
+
+    results = asyncio.run(agent._execute_agent_actions(plan))
+
+    assert len(model.prompts) == 1
+    assert "大阪" in model.prompts[0]
+    assert results[0].tool_calls[0]["args"] == {"city": "东京"}
+    assert results[1].content == "东京：晴"
+
+
+def test_chinese_step_references_are_not_dispatched_directly(monkeypatch):
+    agent = _make_agent(monkeypatch, _RecordingModel(), tools=[get_weather])
+
+    for city in ("步骤1查询到的城市", "第一步的结果", "上一步返回的城市"):
+        plan_list = [{"tool_name": "get_weather", "tool_args": {"city": city}}]
+        assert agent._build_direct_tool_calls(plan_list, []) is None
+    assert agent._build_direct_tool_calls([{"tool_name": "get_weather", "tool_args": {"city": "东京"}}], [])
+
+
+def test_mcp_user_config_uses_the_running_user(monkeypatch):
+    """注册表中的共享实例 user_id 为 None，个性化配置按发起运行的用户获取。"""
+    requested_users = []
+
+    async def user_config_provider(user_id, mcp_server_id):
+        requested_users.append(user_id)
+        await asyncio.sleep(0.01)
+        return {"token": f"token-{user_id}"}
+
+    async def send_mail(to: str, token: str = ""):
+        return f"sent to {to} with {token}", None
+
+    mcp_tool = StructuredTool.from_function(coroutine=send_mail, name="send_mail", description="发送邮件。")
+    agent = _make_agent(
+        monkeypatch, _RecordingModel(), mcp_tools=[mcp_tool], user_config_provider=user_config_provider
+    )
+
+    async def run_as(user_id):
+        with user_scope(user_id):
+            tool_call = {"name": "send_mail", "args": {"to": "a@example.com"}, "id": f"call_{user_id}"}
+            return await agent._execute_single_tool(tool_call)
+
+    async def run():
+        return await asyncio.gather(run_as("alice"), run_as("bob"))
+
+    alice, bob = asyncio.run(run())
+
+    assert sorted(requested_users) == ["alice", "bob"]
+    assert alice.content == "sent to a@example.com with token-alice"
+    assert bob.content == "sent to a@example.com with token-bob"
+    assert not hasattr(agent, "mcp_tools")
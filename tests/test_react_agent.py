@@ -0,0 +1,37 @@
+"""ReactAgent 的 messages reducer：按随列表维护的 id 索引追加或替换消息。"""
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agentchat.core.agents.react_agent import append_messages
+
+
+def _history():
+    history = append_messages([], [HumanMessage(content="hi", id="h")])
+    return append_messages(history, [AIMessage(content="a", id="a")])
+
+
+def test_merging_twice_from_the_same_base():
+    base = _history()
+    # LangGraph 为条件边读取状态时会在同一状态上再合并一次同一批写入
+    first = append_messages(base, [AIMessage(content="x", id="x")])
+    second = append_messages(base, [AIMessage(content="x", id="x")])
+    assert [m.id for m in first] == [m.id for m in second] == ["h", "a", "x"]
+    assert [m.id for m in append_messages(second, [AIMessage(content="y", id="y")])] == ["h", "a", "x", "y"]
+
+
+def test_merge_into_older_state_keeps_duplicate_detection():
+    base = _history()
+    latest = append_messages(append_messages(base, [AIMessage(content="x", id="x")]), [AIMessage(content="w", id="w")])
+    # 分支或重试的写入合并到较旧的状态上，同一 id 落在不同位置
+    branch = append_messages(base, [AIMessage(content="w (branch)", id="w")])
+    assert [m.content for m in branch] == ["hi", "a", "w (branch)"]
+
+    replaced = append_messages(latest, [AIMessage(content="w (replaced)", id="w")])
+    assert [m.id for m in replaced] == ["h", "a", "x", "w"]
+    assert replaced[-1].content == "w (replaced)"
+
+
+def test_duplicate_ids_within_one_write_are_merged():
+    merged = append_messages(_history(), [AIMessage(content="1", id="d"), AIMessage(content="2", id="d")])
+    assert [m.id for m in merged] == ["h", "a", "d"]
+    assert merged[-1].content == "2"
@@ -0,0 +1,143 @@
+"""Sandbox worker: interpreter state reset between pooled executions, and the one-shot path.
+
+The state reset is the Python prelude of ``pyodide_worker.ts``. It is plain
+Python, so these tests run it under CPython in a child interpreter; the
+end-to-end tests need Deno and are skipped without it.
+"""
+
+import asyncio
+import json
+import shutil
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+from agentchat.services.sandbox.pool import PooledPyodideSandbox, SandboxPoolConfig, close_sandbox_pools
+from agentchat.services.sandbox.pyodide import WORKER_SCRIPT, PyodideSandbox
+
+requires_deno = pytest.mark.skipif(shutil.which("deno") is None, reason="Deno is not installed")
+
+
+def _prelude() -> str:
+    source = Path(WORKER_SCRIPT).read_text(encoding="utf-8")
+    return source.split("const PRELUDE = `", 1)[1].split("`;", 1)[0]
+
+
+def _run_prelude(scratch: Path, script: str) -> dict:
+    """Run ``script`` in a fresh interpreter with the prelude helpers loaded; it sets ``result``."""
+    program = "\n".join(
+        [
+            "import asyncio, json, sys",
+            # Pyodide always has an event loop (the worker inspects its tasks)
+            "asyncio.set_event_loop(asyncio.new_event_loop())",
+            "helpers = {}",
+            f"exec({_prelude()!r}, helpers)",
+            f"helpers['_SANDBOX_SCRATCH_DIRS'] = ({str(scratch)!r},)",
+            "globals().update((name, value) for name, value in helpers.items() if name.startswith('_sandbox'))",
+            "def run(code):",
+            "    _sandbox_preimport(code)",
+            "    snapshot = _sandbox_snapshot()",
+            "    exec(code, {'__name__': '__main__'})",
+            "    return _sandbox_restore(snapshot)",
+            textwrap.dedent(script),
+            "print(json.dumps(result))",
+        ]
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", program], capture_output=True, text=True, cwd=scratch, timeout=60
+    )
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def test_extension_modules_stay_loaded_without_recycling(tmp_path):
+    result = _run_prelude(
+        tmp_path,
+        """
+        clean = run("import decimal, hashlib, sqlite3")
+        decimal_module = sys.modules["decimal"]
+        again = run("import decimal")
+        result = {
+            "clean": [clean, again],
+            "loaded": [name in sys.modules for name in ("_decimal", "_hashlib", "_sqlite3", "decimal")],
+            "same": sys.modules["decimal"] is decimal_module,
+        }
+        """,
+    )
+    assert result == {"clean": [True, True], "loaded": [True, True, True, True], "same": True}
+
+
+def test_snippet_modules_and_attribute_changes_are_undone(tmp_path):
+    result = _run_prelude(
+        tmp_path,
+        """
+        import os
+        code = '''
+        import json, os, sys
+        import xml.dom.minidom
+        json.dumps = None
+        xml.dom.minidom.parseString = None
+        with open("snippet_module.py", "w") as module_file:
+            module_file.write("VALUE = 1")
+        sys.path.insert(0, os.getcwd())
+        import snippet_module
+        '''
+        clean = run(code.replace("\\n        ", "\\n"))
+        import json, xml.dom.minidom
+        result = {
+            "clean": clean,
+            "json": json.dumps is not None,
+            "minidom": xml.dom.minidom.parseString is not None,
+            "snippet_module": "snippet_module" in sys.modules,
+            "file": os.path.exists("snippet_module.py"),
+        }
+        """,
+    )
+    assert result == {"clean": True, "json": True, "minidom": True, "snippet_module": False, "file": False}
+
+
+def test_package_keeps_attribute_of_submodule_imported_by_snippet(tmp_path):
+    result = _run_prelude(
+        tmp_path,
+        """
+        import xml
+        # Not pre-imported: the submodule is imported while the snippet runs.
+        clean = run("__import__('xml.dom.minidom')")
+        import xml.dom.minidom
+        result = {"clean": clean, "attribute": hasattr(xml.dom, "minidom")}
+        """,
+    )
+    assert result == {"clean": True, "attribute": True}
+
+
+@requires_deno
+def test_one_shot_execution_runs_worker_script_with_session():
+    sandbox = PyodideSandbox(stateful=True, allow_net=True)
+
+    async def run():
+        first = await sandbox.execute("x = 21")
+        return await sandbox.execute("print(x * 2)", session_bytes=first.session_bytes)
+
+    result = asyncio.run(run())
+    assert result.status == "success", result.stderr
+    assert result.stdout.strip() == "42"
+
+
+@requires_deno
+def test_pooled_worker_stays_warm_after_extension_imports():
+    sandbox = PooledPyodideSandbox(pool_config=SandboxPoolConfig(size=1), allow_net=True)
+
+    async def run():
+        try:
+            results = [await sandbox.execute("import decimal, hashlib; print(decimal.Decimal(1))") for _ in range(3)]
+            return results, sandbox.get_pool().stats()
+        finally:
+            await close_sandbox_pools()
+
+    results, stats = asyncio.run(run())
+    assert [result.stdout.strip() for result in results] == ["1", "1", "1"]
+    assert stats.workers_started == 1
+    assert stats.state_evictions == 0